@@ -0,0 +1,68 @@
+"""
+Benchmark the scaling of the parallel `area_to_grid3d` and `flux_to_grid` kernels with
+the number of threads on a 10^7 cell grid with a BGT-like number of polygons per cell.
+
+Usage: python benchmarks/benchmark_area_statistics.py [--ny 2500] [--nx 4000]
+
+"""
+
+import argparse
+import time
+
+import numba
+import numpy as np
+
+from lusos.area_statistics import area_to_grid3d, flux_to_grid
+from lusos.geometry.ops import PolygonGridArea
+
+
+def synthetic_area(ny: int, nx: int, nz: int, seed: int = 0) -> PolygonGridArea:
+    rng = np.random.default_rng(seed)
+    ncells = ny * nx
+    nitems = rng.integers(1, 5, ncells)
+    nentries = nitems.sum()
+    return PolygonGridArea(
+        np.arange(ncells),
+        nitems,
+        rng.integers(0, nz, nentries),
+        rng.uniform(0, 625 / 4, nentries),
+    )
+
+
+def best_of(func, *args, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ny", type=int, default=2500)
+    parser.add_argument("--nx", type=int, default=4000)
+    parser.add_argument("--nz", type=int, default=9)
+    args = parser.parse_args()
+
+    area = synthetic_area(args.ny, args.nx, args.nz)
+    area_grid = np.zeros((args.ny, args.nx, args.nz), dtype="float32")
+    flux = np.random.default_rng(1).uniform(0, 1, len(area.area))
+    flux_grid = np.full((args.ny, args.nx), np.nan)
+
+    # Compile before timing
+    small = synthetic_area(2, 2, args.nz)
+    area_to_grid3d(small, np.zeros((2, 2, args.nz), dtype="float32"))
+    flux_to_grid(flux[: len(small.area)], small, np.zeros((2, 2)))
+
+    print(f"{args.ny * args.nx:.1e} cells, {len(area.area):.1e} entries")
+    print(f"{'threads':>8} {'area_to_grid3d':>15} {'flux_to_grid':>13}")
+    for nthreads in range(1, numba.config.NUMBA_NUM_THREADS + 1):
+        numba.set_num_threads(nthreads)
+        t_area = best_of(area_to_grid3d, area, area_grid)
+        t_flux = best_of(flux_to_grid, flux, area, flux_grid)
+        print(f"{nthreads:>8} {t_area:>14.3f}s {t_flux:>12.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,22 @@
 from . import data, io
-from .area_statistics import calc_areal_percentage_in_cells, calculate_model_flux
-from .coverage import bgt_soilmap_coverage
-from .emissions import calculate_somers_emissions
+from .area_statistics import (
+    calc_areal_percentage_in_cells,
+    calculate_model_flux,
+    calculate_model_flux_multiresolution,
+)
+from .coverage import (
+    bgt_soilmap_coverage,
+    bgt_soilmap_coverage_multiresolution,
+    bgt_soilmap_emissions,
+    update_bgt_soilmap_coverage,
+)
+from .emissions import (
+    calculate_somers_emissions,
+    calculate_somers_emissions_multiresolution,
+)
 from .geometry import ops
+from .geometry.session import OverlapSession
 from .lasso import LassoGrid
+from .sparse_grid import SparseLayerGrid
 
 __version__ = "0.2.4"
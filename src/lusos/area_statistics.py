@@ -1,18 +1,31 @@
-from typing import List, TypeVar
+from typing import Iterator, List, TypeVar
 
+import dask.array as darray
 import geopandas as gpd
 import numba
 import numpy as np
+import shapely
 import xarray as xr
 
 from lusos.geometry import ops
+from lusos.geometry.session import _activate, active_session
+from lusos.sparse_grid import SparseLayerGrid
+from lusos.validation import NestedGridValidator
 
 LassoGrid = TypeVar("LassoGrid")
 
 
 def calc_areal_percentage_in_cells(
-    polygons: gpd.GeoDataFrame, lasso_grid: LassoGrid, units: List[str]
-) -> xr.DataArray:
+    polygons: gpd.GeoDataFrame,
+    lasso_grid: LassoGrid,
+    units: List[str],
+    n_workers: int = 1,
+    engine: str = "xugrid",
+    tile_size: int = None,
+    memory_budget: int = None,
+    sparse: bool = False,
+    lazy: bool = False,
+) -> xr.DataArray | SparseLayerGrid:
     """
     Calculate in each grid cell the proportion of the area that is covered by each polygon
     in a GeoDataFrame.
@@ -25,28 +38,189 @@ def calc_areal_percentage_in_cells(
         LassoGrid instance containing the raster grid to calculate the percentages for.
     units : List[str]
         List of unique units to calculate the areal percentages for.
+    n_workers : int, optional
+        Number of threads to use in the polygon triangulation. Use -1 to use all
+        available CPU cores. The default is 1.
+    engine : str, optional
+        Engine to calculate the overlap of the polygons with the grid cells, "xugrid",
+        "clip", "structured" or "hybrid". See
+        :func:`~lusos.geometry.ops.polygon_area_in_grid`. The default is "xugrid".
+    tile_size, memory_budget : int, optional
+        Calculate the overlap per square tile of about `tile_size` rows and columns, or
+        of a size estimated to fit within `memory_budget` bytes, to limit the peak
+        memory. See :func:`~lusos.geometry.ops.iter_polygon_area_in_grid`. The default
+        is None, which processes the whole grid at once.
+    sparse : bool, optional
+        If True, return the percentages as a :class:`~lusos.sparse_grid.SparseLayerGrid`
+        which only stores the units present in each cell instead of a dense 3D array.
+        The default is False.
+    lazy : bool, optional
+        If True, return a Dask-backed DataArray where each chunk of about `tile_size`
+        rows and columns (default 3100) calculates the overlap of the polygons
+        intersecting the chunk when it is computed. This allows to stream large grids to disk with
+        `.to_netcdf()` or `.to_zarr()`. The default is False.
 
     Returns
     -------
-    xr.DataArray
+    xr.DataArray | SparseLayerGrid
         3D DataArray with the areal percentages.
 
+    Raises
+    ------
+    ValueError
+        If both `sparse` and `lazy` are True.
+
     """
+    if sparse and lazy:
+        raise ValueError("The sparse and lazy options cannot be combined.")
+
     # Needs unique polygons, otherwise area calculation goes wrong
-    polygons = polygons.explode()
-    polygon_area = ops.polygon_area_in_grid(polygons, lasso_grid.dataarray())
-    polygon_area.polygon[:] = polygons["idx"].values[polygon_area.polygon]
+    parts, parent = ops.explode_polygons(polygons)
+    unit_idx = polygons["idx"].values[parent]
+    if lazy:
+        return _lazy_areal_percentage(
+            parts,
+            unit_idx,
+            lasso_grid,
+            units,
+            n_workers,
+            engine,
+            tile_size,
+            memory_budget,
+        )
+
+    polygon_areas = ops.iter_polygon_area_in_grid(
+        parts, lasso_grid.dataarray(), tile_size, memory_budget, n_workers, engine
+    )
+
+    if sparse:
+        return _sparse_areal_percentage(unit_idx, polygon_areas, lasso_grid, units)
 
     cellarea = np.abs(lasso_grid.xsize * lasso_grid.ysize)
+
     area_grid = lasso_grid.empty_array(units, False)
-    area_grid.values = area_to_grid3d(polygon_area, area_grid.values)
+    for polygon_area in polygon_areas:
+        polygon_area.polygon[:] = unit_idx[polygon_area.polygon]
+        area_grid.values = area_to_grid3d(polygon_area, area_grid.values)
     area_grid = area_grid / cellarea
     return area_grid
 
 
-def calculate_model_flux(model: gpd.GeoDataFrame, grid: LassoGrid) -> xr.DataArray:
+def _sparse_areal_percentage(
+    unit_idx: np.ndarray,
+    polygon_areas: Iterator[ops.PolygonGridArea],
+    lasso_grid: LassoGrid,
+    units: List[str],
+) -> SparseLayerGrid:
     """
-    Calculate a weighted flux per cell in a 2D grid from Somers emissions data.
+    Helper function to collect the areal percentages per tile in a sparse cell x unit
+    matrix. Each tile is reduced to a single entry per cell and unit before the tiles
+    are combined to limit the peak memory.
+
+    """
+    nunits = len(units)
+    keys, areas = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.float32)]
+    for area in polygon_areas:
+        cells = np.repeat(area.cell_idx.astype(np.int64), area.nitems)
+        key = cells * nunits + unit_idx[area.polygon]
+        key, inverse = np.unique(key, return_inverse=True)
+        keys.append(key)
+        areas.append(np.bincount(inverse, area.area).astype(np.float32))
+
+    keys = np.concatenate(keys)
+    cellarea = np.abs(lasso_grid.xsize * lasso_grid.ysize)
+    return SparseLayerGrid.from_coo(
+        keys // nunits,
+        keys % nunits,
+        np.concatenate(areas) / np.float32(cellarea),
+        lasso_grid,
+        units,
+    )
+
+
+def _lazy_areal_percentage(
+    geometries: np.ndarray,
+    unit_idx: np.ndarray,
+    lasso_grid: LassoGrid,
+    units: List[str],
+    n_workers: int,
+    engine: str,
+    tile_size: int,
+    memory_budget: int,
+) -> xr.DataArray:
+    """
+    Helper function to create a Dask-backed DataArray with the areal percentages where
+    each chunk calculates the overlap of the polygons intersecting the chunk. The
+    polygons for each chunk are selected with a spatial index when the graph is
+    created, the clipping and overlap calculation are deferred until computation. The
+    OverlapSession that is active when the graph is created is used in each chunk.
+
+    """
+    grid = lasso_grid.dataarray()
+    definition = ops._grid_definition(grid)
+    if tile_size is None:
+        tile_size = 3100
+        if memory_budget is not None:
+            tile_size = ops._tile_size_for_budget(geometries, grid.size, memory_budget)
+
+    row_edges = ops._tile_edges(definition.ny, tile_size)
+    col_edges = ops._tile_edges(definition.nx, tile_size)
+    rows = [slice(*e) for e in zip(row_edges[:-1], row_edges[1:])]
+    cols = [slice(*e) for e in zip(col_edges[:-1], col_edges[1:])]
+    boxes = [
+        shapely.box(*ops._tile_bounds(definition, r, c)) for r in rows for c in cols
+    ]
+    tile, polygon = shapely.STRtree(geometries).query(boxes, predicate="intersects")
+    order = np.argsort(tile, kind="stable")
+    tile, polygon = tile[order], polygon[order]
+    selections = np.split(polygon, np.searchsorted(tile, np.arange(1, len(boxes))))
+
+    cellarea = np.abs(lasso_grid.xsize * lasso_grid.ysize)
+    session = active_session()
+
+    def calc_chunk(block_info=None):
+        chunk_row, chunk_col, _ = block_info[None]["chunk-location"]
+        r, c = rows[chunk_row], cols[chunk_col]
+        area_grid = np.zeros(
+            (r.stop - r.start, c.stop - c.start, len(units)), "float32"
+        )
+
+        # Chunks are computed in other threads, use the session the graph was created in
+        with _activate(session):
+            area = ops._tile_area_in_grid(
+                geometries,
+                selections[chunk_row * len(cols) + chunk_col],
+                grid.isel(y=r, x=c),
+                ops._tile_bounds(definition, r, c),
+                n_workers,
+                engine,
+            )
+        if area is None:
+            return area_grid
+
+        area = area._replace(polygon=unit_idx[area.polygon])
+        return area_to_grid3d(area, area_grid) / np.float32(cellarea)
+
+    chunks = (tuple(np.diff(row_edges)), tuple(np.diff(col_edges)), (len(units),))
+    data = darray.map_blocks(
+        calc_chunk, chunks=chunks, dtype="float32", meta=np.array((), "float32")
+    )
+    return lasso_grid.empty_array(units, True).copy(data=data)
+
+
+def calculate_model_flux(
+    model: gpd.GeoDataFrame,
+    grid: LassoGrid,
+    n_workers: int = 1,
+    engine: str = "xugrid",
+    tile_size: int = None,
+    memory_budget: int = None,
+    columns: str | List[str] = "flux_m2",
+) -> xr.DataArray | xr.Dataset:
+    """
+    Calculate a weighted flux per cell in a 2D grid from Somers emissions data. For a
+    list of columns, the overlap and the area weights are calculated once and all
+    columns are gridded in a single pass.
 
     Parameters
     ----------
@@ -54,33 +228,205 @@ def calculate_model_flux(model: gpd.GeoDataFrame, grid: LassoGrid) -> xr.DataArr
         GeoDataFrame containing model emissions per polygon.
     grid : LassoGrid
         2D grid to calculate the emission fluxes for.
+    n_workers : int, optional
+        Number of threads to use in the polygon triangulation. Use -1 to use all
+        available CPU cores. The default is 1.
+    engine : str, optional
+        Engine to calculate the overlap of the polygons with the grid cells, "xugrid",
+        "clip", "structured" or "hybrid". See
+        :func:`~lusos.geometry.ops.polygon_area_in_grid`. The default is "xugrid".
+    tile_size, memory_budget : int, optional
+        Calculate the overlap per square tile of about `tile_size` rows and columns, or
+        of a size estimated to fit within `memory_budget` bytes, to limit the peak
+        memory. See :func:`~lusos.geometry.ops.iter_polygon_area_in_grid`. The default
+        is None, which processes the whole grid at once.
+    columns : str | List[str], optional
+        Column or list of columns in the model with the flux to calculate. The default
+        is "flux_m2".
 
     Returns
     -------
-    xr.DataArray
-        2D grid with weighted emission flux per cell.
+    xr.DataArray | xr.Dataset
+        2D grid with weighted emission flux per cell or a Dataset with a 2D grid for
+        each column if `columns` is a list.
 
     """
+    names = [columns] if isinstance(columns, str) else list(columns)
+
     flux_grid = grid.dataarray(np.nan)
-    model = model.explode()
-    area = ops.polygon_area_in_grid(model, flux_grid)
-    flux = model["flux_m2"].values[area.polygon]
+    parts, parent = ops.explode_polygons(model)
+    values = model[names].to_numpy(dtype=np.float64)[parent]
+    grids = np.full((len(names), *flux_grid.shape), np.nan)
+
+    polygon_areas = ops.iter_polygon_area_in_grid(
+        parts, flux_grid, tile_size, memory_budget, n_workers, engine
+    )
+    for area in polygon_areas:
+        grids = fluxes_to_grid(values, area, grids)
+
+    if isinstance(columns, str):
+        return flux_grid.copy(data=grids[0])
+    return xr.Dataset({name: flux_grid.copy(data=g) for name, g in zip(names, grids)})
+
+
+def calculate_model_flux_multiresolution(
+    model: gpd.GeoDataFrame,
+    grids: List[LassoGrid],
+    n_workers: int = 1,
+    engine: str = "xugrid",
+    tile_size: int = None,
+    memory_budget: int = None,
+) -> List[xr.DataArray]:
+    """
+    Calculate a weighted flux per cell from Somers emissions data for multiple nested
+    grids at once. The overlap of the model polygons is only calculated for the finest
+    grid. The area-weighted flux and the covered area in each cell are summed in blocks
+    for the coarser grids, which gives the same result as separate calculations.
 
-    flux_grid.values = flux_to_grid(flux, area, flux_grid.values)
-    return flux_grid
+    Parameters
+    ----------
+    model : gpd.GeoDataFrame
+        GeoDataFrame containing model emissions per polygon.
+    grids : List[LassoGrid]
+        2D grids to calculate the emission fluxes for. All grids must nest in the grid
+        with the smallest cells.
+    n_workers : int, optional
+        Number of threads to use in the polygon triangulation. Use -1 to use all
+        available CPU cores. The default is 1.
+    engine : str, optional
+        Engine to calculate the overlap of the polygons with the grid cells, "xugrid",
+        "clip", "structured" or "hybrid". See
+        :func:`~lusos.geometry.ops.polygon_area_in_grid`. The default is "xugrid".
+    tile_size, memory_budget : int, optional
+        Calculate the overlap per square tile of about `tile_size` rows and columns, or
+        of a size estimated to fit within `memory_budget` bytes, to limit the peak
+        memory. See :func:`~lusos.geometry.ops.iter_polygon_area_in_grid`. The default
+        is None, which processes the whole grid at once.
 
+    Returns
+    -------
+    List[xr.DataArray]
+        2D grids with weighted emission flux per cell in the same order as `grids`.
 
-@numba.njit
+    Raises
+    ------
+    InvalidNestingError
+        If a grid does not nest in the grid with the smallest cells.
+
+    """
+    fine_grid = _finest_grid(grids)
+    parts, parent = ops.explode_polygons(model)
+    flux_m2 = model["flux_m2"].values[parent]
+
+    ny, nx = fine_grid.dataarray().shape
+    flux_area = np.zeros(ny * nx)
+    total_area = np.zeros(ny * nx)
+    polygon_areas = ops.iter_polygon_area_in_grid(
+        parts, fine_grid.dataarray(), tile_size, memory_budget, n_workers, engine
+    )
+    for area in polygon_areas:
+        cells = np.repeat(area.cell_idx, area.nitems)
+        flux = flux_m2[area.polygon]
+        flux_area += np.bincount(cells, area.area * flux, minlength=ny * nx)
+        total_area += np.bincount(cells, area.area, minlength=ny * nx)
+
+    flux_area = fine_grid.dataarray(np.nan).copy(data=flux_area.reshape(ny, nx))
+    total_area = fine_grid.dataarray(np.nan).copy(data=total_area.reshape(ny, nx))
+
+    flux_grids = []
+    for grid in grids:
+        coarse_total = coarsen_to_grid(total_area, fine_grid, grid)
+        flux_grid = coarsen_to_grid(flux_area, fine_grid, grid) / coarse_total
+        flux_grids.append(flux_grid.where(coarse_total > 0))
+    return flux_grids
+
+
+def coarsen_to_grid(
+    da: xr.DataArray, grid: LassoGrid, coarse_grid: LassoGrid, how: str = "sum"
+) -> xr.DataArray:
+    """
+    Aggregate the cells of a DataArray on a grid to a coarser grid that nests in the
+    grid, for example areas from a 25 m grid to a 100 m grid.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        DataArray with dimensions ("y", "x", ...) on the cells of `grid`.
+    grid : LassoGrid
+        LassoGrid instance of the grid of the DataArray.
+    coarse_grid : LassoGrid
+        LassoGrid instance of the coarse grid. The cellsizes must be multiples of the
+        cellsizes of `grid` and the cells must be aligned with the cells of `grid`.
+    how : str, optional
+        Aggregate the values in each coarse cell by "sum" or "mean". The default is
+        "sum".
+
+    Returns
+    -------
+    xr.DataArray
+        DataArray with the aggregated values on the coarse grid.
+
+    Raises
+    ------
+    InvalidNestingError
+        If the coarse grid does not nest in the grid.
+
+    """
+    if how not in {"sum", "mean"}:
+        raise ValueError(f"Unknown aggregation method: {how!r}")
+
+    NestedGridValidator().validate(grid, coarse_grid)
+
+    xfactor = round(coarse_grid.xsize / grid.xsize)
+    yfactor = round(coarse_grid.ysize / grid.ysize)
+    col = round((coarse_grid.xmin - grid.xmin) / grid.xsize)
+    row = round((coarse_grid.ymax - grid.ymax) / grid.ysize)
+
+    ycoords, xcoords = coarse_grid.ycoordinates(), coarse_grid.xcoordinates()
+    ny, nx = len(ycoords), len(xcoords)
+
+    values = da.transpose("y", "x", ...).values
+    values = values[row : row + ny * yfactor, col : col + nx * xfactor]
+    values = values.reshape(ny, yfactor, nx, xfactor, *values.shape[2:])
+    values = values.sum(axis=(1, 3)) if how == "sum" else values.mean(axis=(1, 3))
+
+    dims = ("y", "x", *[d for d in da.dims if d not in {"y", "x"}])
+    coords = {d: da[d] for d in dims[2:] if d in da.coords}
+    coarse = xr.DataArray(
+        values, coords={"y": ycoords, "x": xcoords, **coords}, dims=dims
+    )
+    return coarse.rio.write_crs(coarse_grid.crs)
+
+
+def _finest_grid(grids: List[LassoGrid]) -> LassoGrid:
+    """
+    Helper function to find the grid with the smallest cells and to validate that all
+    grids nest in it.
+
+    """
+    if not grids:
+        raise ValueError("At least one grid must be given.")
+
+    fine_grid = min(grids, key=lambda g: abs(g.xsize * g.ysize))
+    validator = NestedGridValidator()
+    for grid in grids:
+        validator.validate(fine_grid, grid)
+    return fine_grid
+
+
+@numba.njit(parallel=True)
 def area_to_grid3d(
     polygon_area: ops.PolygonGridArea, area_grid: np.ndarray
 ) -> np.ndarray:
     """
-    Translate calculated areas for polygons per grid cell into a 3D grid.
+    Translate calculated areas for polygons per grid cell into a 3D grid. The cells are
+    processed in parallel with the number of threads set by `numba.set_num_threads`.
 
     Parameters
     ----------
     polygon_area : ops.PolygonGridArea
-        _description_
+        Area of the polygons per grid cell. Also accepts the compact representation
+        from :meth:`~lusos.geometry.ops.PolygonGridArea.compact`.
     area_grid : np.ndarray
         _description_
 
@@ -90,39 +436,39 @@ def area_to_grid3d(
         _description_
     """
     _, nx, nz = area_grid.shape
+    offsets = _cell_offsets(polygon_area.nitems)
 
-    min_idx = 0
-    for i in range(len(polygon_area.cell_idx)):
-        cell_idx = polygon_area.cell_idx[i]
-        nitems = polygon_area.nitems[i]
-        max_idx = min_idx + nitems
+    # Accumulate in a float64 row per thread and store once in the (float32) output
+    scratch = np.zeros((numba.get_num_threads(), nz), dtype=np.float64)
 
-        polygons = polygon_area.polygon[min_idx:max_idx]
-        area = polygon_area.area[min_idx:max_idx]
+    for i in numba.prange(len(polygon_area.cell_idx)):
+        row, col = np.divmod(polygon_area.cell_idx[i], nx)
 
-        area = np.bincount(polygons, weights=area, minlength=nz)
-        row, col = np.divmod(cell_idx, nx)
-
-        area_grid[row, col, :] = area
-        min_idx += nitems
+        cell_area = scratch[numba.get_thread_id()]
+        cell_area[:] = 0.0
+        for j in range(offsets[i], offsets[i + 1]):
+            cell_area[polygon_area.polygon[j]] += polygon_area.area[j]
+        area_grid[row, col, :] = cell_area
 
     return area_grid
 
 
-@numba.njit
+@numba.njit(parallel=True)
 def flux_to_grid(
     flux: np.ndarray, area: ops.PolygonGridArea, grid: np.ndarray
 ) -> np.ndarray:
     """
     Translate Somers emissions for polygons to a 2D grid containing a weighted flux by
-    area based on the calculated area of each polygon in a cell.
+    area based on the calculated area of each polygon in a cell. The cells are processed
+    in parallel with the number of threads set by `numba.set_num_threads`.
 
     Parameters
     ----------
     flux : np.ndarray
         _description_
     area : ops.PolygonGridArea
-        _description_
+        Area of the polygons per grid cell. Also accepts the compact representation
+        from :meth:`~lusos.geometry.ops.PolygonGridArea.compact`.
     grid : np.ndarray
         _description_
 
@@ -132,22 +478,76 @@ def flux_to_grid(
         _description_
     """
     _, nx = grid.shape
-    min_idx = 0
-    for i in range(len(area.cell_idx)):
-        cell_idx = area.cell_idx[i]
-        nitems = area.nitems[i]
-        max_idx = min_idx + nitems
+    offsets = _cell_offsets(area.nitems)
 
-        f = flux[min_idx:max_idx]
-        a = area.area[min_idx:max_idx]
+    for i in numba.prange(len(area.cell_idx)):
+        row, col = np.divmod(area.cell_idx[i], nx)
 
-        row, col = np.divmod(cell_idx, nx)
-        grid[row, col] = _weighted_average(f, a)
-        min_idx += nitems
+        weighted_flux = 0.0
+        total_area = 0.0
+        for j in range(offsets[i], offsets[i + 1]):
+            weighted_flux += flux[j] * area.area[j]
+            total_area += area.area[j]
+        grid[row, col] = weighted_flux / total_area
 
     return grid
 
 
+@numba.njit(parallel=True)
+def fluxes_to_grid(
+    values: np.ndarray, area: ops.PolygonGridArea, grids: np.ndarray
+) -> np.ndarray:
+    """
+    Translate multiple Somers emission values for polygons to 2D grids containing the
+    area-weighted value in each cell in a single pass over the cells. The total area in
+    each cell is calculated once for all values.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Array of shape (npolygons, nvalues) with the values of each polygon.
+    area : ops.PolygonGridArea
+        Area of the polygons per grid cell.
+    grids : np.ndarray
+        Array of shape (nvalues, ny, nx) to write the weighted values to.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (nvalues, ny, nx) with the weighted values.
+
+    """
+    nvalues, _, nx = grids.shape
+    offsets = _cell_offsets(area.nitems)
+
+    for i in numba.prange(len(area.cell_idx)):
+        row, col = np.divmod(area.cell_idx[i], nx)
+
+        total_area = 0.0
+        for j in range(offsets[i], offsets[i + 1]):
+            total_area += area.area[j]
+
+        for k in range(nvalues):
+            weighted_value = 0.0
+            for j in range(offsets[i], offsets[i + 1]):
+                weighted_value += values[area.polygon[j], k] * area.area[j]
+            grids[k, row, col] = weighted_value / total_area
+
+    return grids
+
+
+@numba.njit
+def _cell_offsets(nitems: np.ndarray) -> np.ndarray:
+    """
+    Helper function to get the offsets of the entries of each cell from the number of
+    entries per cell.
+
+    """
+    offsets = np.zeros(len(nitems) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(nitems)
+    return offsets
+
+
 @numba.njit
 def _weighted_average(flux: np.ndarray, area: np.ndarray) -> np.ndarray:
     """
@@ -1,17 +1,41 @@
 import itertools
+from pathlib import Path
 
 import geopandas as gpd
+import netCDF4
+import numba
+import numpy as np
+import pandas as pd
+import shapely
 import xarray as xr
 
-from lusos.area_statistics import calc_areal_percentage_in_cells
+from lusos.area_statistics import (
+    _cell_offsets,
+    _finest_grid,
+    area_to_grid3d,
+    calc_areal_percentage_in_cells,
+    coarsen_to_grid,
+)
 from lusos.constants import MAIN_BGT_UNITS, MAIN_SOILMAP_UNITS
+from lusos.geometry import ops
+from lusos.geometry.cache import polygon_fingerprints
 from lusos.lasso import LassoGrid
 from lusos.preprocessing import group_bgt_units, group_soilmap_units
-from lusos.utils import _add_layer_idx_column
+
+# Default memory budget in bytes per tile when the coverage is written to a file.
+COVERAGE_MEMORY_BUDGET = 256 * 1024**2
 
 
 def bgt_soilmap_coverage(
-    bgt: gpd.GeoDataFrame, soilmap: gpd.GeoDataFrame, grid: LassoGrid
+    bgt: gpd.GeoDataFrame,
+    soilmap: gpd.GeoDataFrame,
+    grid: LassoGrid,
+    n_workers: int = 1,
+    engine: str = "xugrid",
+    tile_size: int = None,
+    memory_budget: int = None,
+    out: str | Path = None,
+    method: str = "product",
 ) -> xr.DataArray:
     """
     Calculate per cell in a grid for each combination of BGT and Soil Map polygons what
@@ -27,19 +51,755 @@ def bgt_soilmap_coverage(
         GeoDataFrame containing the BGT data polygons.
     soilmap : gpd.GeoDataFrame
         GeoDataFrame containing the BGT data polygons.
+    n_workers : int, optional
+        Number of threads to use in the polygon triangulation. Use -1 to use all
+        available CPU cores. The default is 1.
+    engine : str, optional
+        Engine to calculate the overlap of the polygons with the grid cells, "xugrid",
+        "clip", "structured" or "hybrid". See
+        :func:`~lusos.geometry.ops.polygon_area_in_grid`. The default is "xugrid".
+    tile_size, memory_budget : int, optional
+        Calculate the overlap per square tile of about `tile_size` rows and columns, or
+        of a size estimated to fit within `memory_budget` bytes, to limit the peak
+        memory. See :func:`~lusos.geometry.ops.iter_polygon_area_in_grid`. The default
+        is None, which processes the whole grid at once.
+    out : str | Path, optional
+        Path to a NetCDF file to write the coverage to per square tile instead of
+        calculating it in memory. Each tile is calculated from the polygons
+        intersecting the tile, so the peak memory of the calculation does not depend on the size of the
+        grid. The tile has about `tile_size` rows and columns, or a size estimated to
+        fit the overlap and the coverage of all combinations within `memory_budget`
+        bytes (default 256 MB). Written tiles are registered in the file and skipped
+        when the calculation is restarted with the same file, grid, tile size, engine
+        and method. Fingerprints of the BGT are stored next to the file to update the
+        coverage for a new BGT release with :func:`update_bgt_soilmap_coverage`. The
+        default is None.
+    method : str, optional
+        Method to calculate the coverage of the combinations. The default "product"
+        multiplies the percentages of the BGT and Soil Map units in a cell, which is
+        only exact if a cell is homogeneous in one of the two. "exact" intersects the
+        BGT and Soil Map polygons that share a grid cell and calculates the area of the
+        intersections in each cell.
+
+    Returns
+    -------
+    xr.DataArray
+        3D DataArray with the areal percentages. If `out` is given, the DataArray is
+        read from the file into memory and the file is closed.
+
+    """
+    bgt = _prepare_bgt(bgt, MAIN_BGT_UNITS)
+    soilmap = _prepare_soilmap(soilmap, MAIN_SOILMAP_UNITS)
+
+    if out is not None:
+        _write_coverage_tiles(
+            bgt, soilmap, grid, out, n_workers, engine, tile_size, memory_budget, method
+        )
+        _save_bgt_fingerprints(bgt, out)
+        return _read_coverage(out)
+
+    return _calc_coverage(
+        bgt, soilmap, grid, n_workers, engine, tile_size, memory_budget, method
+    )
+
+
+def _calc_coverage(
+    bgt: gpd.GeoDataFrame,
+    soilmap: gpd.GeoDataFrame,
+    grid: LassoGrid,
+    n_workers: int,
+    engine: str,
+    tile_size: int,
+    memory_budget: int,
+    method: str,
+) -> xr.DataArray:
+    """
+    Helper function to calculate the coverage of BGT-Soilmap combinations from the
+    prepared BGT and Soil Map with the product or exact method.
+
+    """
+    if method == "exact":
+        return _exact_coverage(
+            bgt, soilmap, grid, n_workers, engine, tile_size, memory_budget
+        )
+    elif method != "product":
+        raise ValueError(f"Unknown coverage method: {method!r}")
+
+    bgt_area = calc_areal_percentage_in_cells(
+        bgt, grid, MAIN_BGT_UNITS, n_workers, engine, tile_size, memory_budget
+    )
+    soilmap_area = calc_areal_percentage_in_cells(
+        soilmap, grid, MAIN_SOILMAP_UNITS, n_workers, engine, tile_size, memory_budget
+    )
+    return _combine_coverage(bgt_area, soilmap_area, grid)
+
+
+def _exact_coverage(
+    bgt: gpd.GeoDataFrame,
+    soilmap: gpd.GeoDataFrame,
+    grid: LassoGrid,
+    n_workers: int,
+    engine: str,
+    tile_size: int,
+    memory_budget: int,
+) -> xr.DataArray:
+    """
+    Helper function to calculate the exact coverage of BGT-Soilmap combinations. The
+    overlap of both datasets with the grid is used to find the pairs of BGT and Soil
+    Map polygons that share a cell. Only these pairs are intersected and the area of
+    the intersections in each cell is assigned to the layer of the combination.
+
+    """
+    da = grid.dataarray()
+    bgt_parts, bgt_parent = ops.explode_polygons(bgt)
+    soilmap_parts, soilmap_parent = ops.explode_polygons(soilmap)
+
+    bgt_area = ops.polygon_area_in_grid(
+        bgt_parts, da, n_workers, engine, tile_size, memory_budget
+    )
+    soilmap_area = ops.polygon_area_in_grid(
+        soilmap_parts, da, n_workers, engine, tile_size, memory_budget
+    )
+    bgt_pair, soilmap_pair = _cell_pairs(bgt_area, soilmap_area)
+
+    key = np.unique(bgt_pair * len(soilmap_parts) + soilmap_pair)
+    bgt_pair, soilmap_pair = np.divmod(key, len(soilmap_parts))
+
+    def intersect_range(start, stop):
+        return shapely.intersection(
+            bgt_parts[bgt_pair[start:stop]], soilmap_parts[soilmap_pair[start:stop]]
+        )
+
+    weights = shapely.get_num_coordinates(bgt_parts[bgt_pair])
+    intersections = np.concatenate(
+        ops._run_partitioned(intersect_range, weights, n_workers)
+    )
+
+    parts, parent = ops.explode_polygons(intersections)
+    is_polygon = (shapely.get_type_id(parts) == 3) & (shapely.area(parts) > 0)
+    parts, parent = parts[is_polygon], parent[is_polygon]
+
+    bgt_idx = bgt["idx"].to_numpy(dtype=np.int64)[bgt_parent[bgt_pair[parent]]]
+    soilmap_idx = soilmap["idx"].to_numpy(dtype=np.int64)[
+        soilmap_parent[soilmap_pair[parent]]
+    ]
+    layer_idx = soilmap_idx * len(MAIN_BGT_UNITS) + bgt_idx
+
+    layers = _combine_bgt_soilmap_names(MAIN_BGT_UNITS, MAIN_SOILMAP_UNITS)
+    coverage = grid.empty_array(layers, False)
+    if len(parts) > 0:
+        area = ops.polygon_area_in_grid(
+            parts, da, n_workers, engine, tile_size, memory_budget
+        )
+        area = area._replace(polygon=layer_idx[area.polygon])
+        coverage.values = area_to_grid3d(area, coverage.values)
+
+    return coverage / np.abs(grid.xsize * grid.ysize)
+
+
+def _cell_pairs(a: ops.PolygonGridArea, b: ops.PolygonGridArea) -> tuple:
+    """
+    Helper function to find all pairs of polygons in two overlaps with the same grid
+    that share a cell. Returns the polygon indices of each pair, pairs sharing multiple
+    cells are repeated.
+
+    """
+    if len(a.cell_idx) == 0 or len(b.cell_idx) == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty
+
+    a_cells, b_cells = a.cell_idx.astype(np.int64), b.cell_idx.astype(np.int64)
+    pos = np.minimum(np.searchsorted(b_cells, a_cells), len(b_cells) - 1)
+    shared = b_cells[pos] == a_cells
+
+    npairs = np.where(shared, a.nitems * b.nitems[pos], 0)
+    return _fill_cell_pairs(
+        _cell_offsets(a.nitems),
+        a.polygon.astype(np.int64),
+        _cell_offsets(b.nitems),
+        b.polygon.astype(np.int64),
+        pos,
+        shared,
+        _cell_offsets(npairs),
+    )
+
+
+@numba.njit(parallel=True)
+def _fill_cell_pairs(
+    a_offsets: np.ndarray,
+    a_polygon: np.ndarray,
+    b_offsets: np.ndarray,
+    b_polygon: np.ndarray,
+    pos: np.ndarray,
+    shared: np.ndarray,
+    offsets: np.ndarray,
+) -> tuple:
+    """
+    Helper function to fill the pairs of polygons of a and b for each cell of a that is
+    shared with cell pos of b, starting at the pair offsets of each cell.
+
+    """
+    a_pair = np.empty(offsets[-1], dtype=np.int64)
+    b_pair = np.empty(offsets[-1], dtype=np.int64)
+    for i in numba.prange(len(shared)):
+        if not shared[i]:
+            continue
+        n = offsets[i]
+        for j in range(a_offsets[i], a_offsets[i + 1]):
+            for k in range(b_offsets[pos[i]], b_offsets[pos[i] + 1]):
+                a_pair[n] = a_polygon[j]
+                b_pair[n] = b_polygon[k]
+                n += 1
+    return a_pair, b_pair
+
+
+def bgt_soilmap_coverage_multiresolution(
+    bgt: gpd.GeoDataFrame,
+    soilmap: gpd.GeoDataFrame,
+    grids: list[LassoGrid],
+    n_workers: int = 1,
+    engine: str = "xugrid",
+    tile_size: int = None,
+    memory_budget: int = None,
+) -> list[xr.DataArray]:
+    """
+    Calculate the coverage of BGT-Soilmap combinations like `bgt_soilmap_coverage` for
+    multiple nested grids at once, e.g. at 25 m, 100 m and 250 m resolution. The overlap
+    of the polygons is only calculated for the grid with the smallest cells. The areas
+    of the BGT and Soil Map units are summed in blocks for the coarser grids, which gives
+    the same result as separate calculations for each grid.
+
+    Parameters
+    ----------
+    bgt : gpd.GeoDataFrame
+        GeoDataFrame containing the BGT data polygons.
+    soilmap : gpd.GeoDataFrame
+        GeoDataFrame containing the BGT data polygons.
+    grids : list[LassoGrid]
+        LassoGrid instances to calculate the coverage for. All grids must nest in the
+        grid with the smallest cells.
+    n_workers : int, optional
+        Number of threads to use in the polygon triangulation. Use -1 to use all
+        available CPU cores. The default is 1.
+    engine : str, optional
+        Engine to calculate the overlap of the polygons with the grid cells, "xugrid",
+        "clip", "structured" or "hybrid". See
+        :func:`~lusos.geometry.ops.polygon_area_in_grid`. The default is "xugrid".
+    tile_size, memory_budget : int, optional
+        Calculate the overlap per square tile of about `tile_size` rows and columns, or
+        of a size estimated to fit within `memory_budget` bytes, to limit the peak
+        memory. See :func:`~lusos.geometry.ops.iter_polygon_area_in_grid`. The default
+        is None, which processes the whole grid at once.
+
+    Returns
+    -------
+    list[xr.DataArray]
+        3D DataArrays with the areal percentages in the same order as `grids`.
+
+    Raises
+    ------
+    InvalidNestingError
+        If a grid does not nest in the grid with the smallest cells.
+
+    """
+    fine_grid = _finest_grid(grids)
+
+    bgt = _prepare_bgt(bgt, MAIN_BGT_UNITS)
+    soilmap = _prepare_soilmap(soilmap, MAIN_SOILMAP_UNITS)
+
+    bgt_area = calc_areal_percentage_in_cells(
+        bgt, fine_grid, MAIN_BGT_UNITS, n_workers, engine, tile_size, memory_budget
+    )
+    soilmap_area = calc_areal_percentage_in_cells(
+        soilmap,
+        fine_grid,
+        MAIN_SOILMAP_UNITS,
+        n_workers,
+        engine,
+        tile_size,
+        memory_budget,
+    )
+
+    coverage = []
+    for grid in grids:
+        coarse_bgt = coarsen_to_grid(bgt_area, fine_grid, grid, how="mean")
+        coarse_soilmap = coarsen_to_grid(soilmap_area, fine_grid, grid, how="mean")
+        coverage.append(_combine_coverage(coarse_bgt, coarse_soilmap, grid))
+    return coverage
+
+
+def bgt_soilmap_emissions(
+    bgt: gpd.GeoDataFrame,
+    soilmap: gpd.GeoDataFrame,
+    grid: LassoGrid,
+    ef: pd.DataFrame,
+    n_workers: int = 1,
+    engine: str = "xugrid",
+    tile_size: int = None,
+    memory_budget: int = None,
+) -> xr.Dataset:
+    """
+    Calculate the emission in each cell of a grid from the coverage of BGT-Soilmap
+    combinations and emission factors per combination. This gives the same result as
+    multiplying the result of `bgt_soilmap_coverage` with the emission factors and
+    summing over the layers, but the BGT and Soil Map percentages are contracted with
+    the emission factors per cell without creating the 3D coverage array.
+
+    Parameters
+    ----------
+    bgt : gpd.GeoDataFrame
+        GeoDataFrame containing the BGT data polygons.
+    soilmap : gpd.GeoDataFrame
+        GeoDataFrame containing the Soil Map data polygons.
+    grid : :class:`~lusos.LassoGrid`
+        LassoGrid instance containing the raster grid to calculate the emissions for.
+    ef : pd.DataFrame
+        Emission factors with an index of BGT-Soilmap combinations (e.g. "percelen_peat")
+        and a column per greenhouse gas, such as the result of
+        :func:`~lusos.data.ef_low_netherlands`.
+    n_workers : int, optional
+        Number of threads to use in the polygon triangulation. Use -1 to use all
+        available CPU cores. The default is 1.
+    engine : str, optional
+        Engine to calculate the overlap of the polygons with the grid cells, "xugrid",
+        "clip", "structured" or "hybrid". See
+        :func:`~lusos.geometry.ops.polygon_area_in_grid`. The default is "xugrid".
+    tile_size, memory_budget : int, optional
+        Calculate the overlap per square tile of about `tile_size` rows and columns, or
+        of a size estimated to fit within `memory_budget` bytes, to limit the peak
+        memory. See :func:`~lusos.geometry.ops.iter_polygon_area_in_grid`. The default
+        is None, which processes the whole grid at once.
+
+    Returns
+    -------
+    xr.Dataset
+        Dataset with a 2D grid of the emission in each cell for each column in `ef`.
+
+    """
+    bgt = _prepare_bgt(bgt, MAIN_BGT_UNITS)
+    soilmap = _prepare_soilmap(soilmap, MAIN_SOILMAP_UNITS)
+
+    bgt_area = calc_areal_percentage_in_cells(
+        bgt,
+        grid,
+        MAIN_BGT_UNITS,
+        n_workers,
+        engine,
+        tile_size,
+        memory_budget,
+        sparse=True,
+    )
+    soilmap_area = calc_areal_percentage_in_cells(
+        soilmap,
+        grid,
+        MAIN_SOILMAP_UNITS,
+        n_workers,
+        engine,
+        tile_size,
+        memory_budget,
+        sparse=True,
+    )
+
+    layers = _combine_bgt_soilmap_names(MAIN_BGT_UNITS, MAIN_SOILMAP_UNITS)
+    factors = ef.loc[layers].to_numpy(dtype=np.float64)
+
+    bgt_matrix, soilmap_matrix = bgt_area.matrix, soilmap_area.matrix
+    emissions = _contract_coverage(
+        bgt_matrix.indptr,
+        bgt_matrix.indices,
+        bgt_matrix.data.astype(np.float64),
+        soilmap_matrix.indptr,
+        soilmap_matrix.indices,
+        soilmap_matrix.data.astype(np.float64),
+        factors,
+        len(MAIN_BGT_UNITS),
+    )
+
+    da = grid.dataarray(np.nan)
+    return xr.Dataset(
+        {
+            gas: da.copy(data=emission.reshape(da.shape))
+            for gas, emission in zip(ef.columns, emissions)
+        }
+    )
+
+
+@numba.njit(parallel=True)
+def _contract_coverage(
+    bgt_indptr: np.ndarray,
+    bgt_indices: np.ndarray,
+    bgt_data: np.ndarray,
+    soilmap_indptr: np.ndarray,
+    soilmap_indices: np.ndarray,
+    soilmap_data: np.ndarray,
+    factors: np.ndarray,
+    nbgt: int,
+) -> np.ndarray:
+    """
+    Helper function to sum the product of the BGT and Soil Map percentages and the
+    emission factors of each combination in a cell, using the CSR cell x unit matrices
+    of the percentages. Returns an array of shape (ngases, ncells).
+
+    """
+    ncells = len(bgt_indptr) - 1
+    ngases = factors.shape[1]
+    emissions = np.zeros((ngases, ncells))
+
+    for cell in numba.prange(ncells):
+        for i in range(soilmap_indptr[cell], soilmap_indptr[cell + 1]):
+            for j in range(bgt_indptr[cell], bgt_indptr[cell + 1]):
+                layer = soilmap_indices[i] * nbgt + bgt_indices[j]
+                coverage = soilmap_data[i] * bgt_data[j]
+                for gas in range(ngases):
+                    emissions[gas, cell] += coverage * factors[layer, gas]
+
+    return emissions
+
+
+def update_bgt_soilmap_coverage(
+    bgt: gpd.GeoDataFrame,
+    soilmap: gpd.GeoDataFrame,
+    grid: LassoGrid,
+    out: str | Path,
+    n_workers: int = 1,
+    engine: str = None,
+    method: str = None,
+) -> xr.DataArray:
+    """
+    Update a coverage file written by `bgt_soilmap_coverage` with `out` for a new
+    release of the BGT. The new BGT is compared with the fingerprints (geometry and
+    grouped BGT unit) of the BGT of the previous run to find the added, removed and
+    changed objects. Only the tiles that intersect the previous or new extent of these
+    objects are recalculated and written to the file.
+
+    Parameters
+    ----------
+    bgt : gpd.GeoDataFrame
+        GeoDataFrame containing the new BGT data polygons.
+    soilmap : gpd.GeoDataFrame
+        GeoDataFrame containing the Soil Map data polygons. This must be the same as
+        in the previous run, changes in the Soil Map are not detected.
+    grid : :class:`~lusos.LassoGrid`
+        LassoGrid instance of the grid the coverage file was written for.
+    out : str | Path
+        Path to the coverage NetCDF file to update.
+    n_workers : int, optional
+        Number of threads to use in the polygon triangulation. Use -1 to use all
+        available CPU cores. The default is 1.
+    engine : str, optional
+        Engine to calculate the overlap of the polygons with the grid cells, "xugrid",
+        "clip", "structured" or "hybrid". See
+        :func:`~lusos.geometry.ops.polygon_area_in_grid`. The default is None, which
+        uses the engine the file was written with.
+    method : str, optional
+        Method to calculate the coverage of the combinations, "product" or "exact". See
+        :func:`bgt_soilmap_coverage`. The default is None, which uses the method the
+        file was written with.
 
     Returns
     -------
     xr.DataArray
-        3D DataArray with the areal percentages.
+        3D DataArray with the updated areal percentages read from the file into memory.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the coverage file or the stored BGT fingerprints do not exist.
+    ValueError
+        If `engine` or `method` differ from the engine or method of the file.
 
     """
+    fingerprints_path = _fingerprints_path(out)
+    if not Path(out).exists() or not fingerprints_path.exists():
+        raise FileNotFoundError(
+            f"No coverage file with BGT fingerprints found at {out}. Create it with "
+            "bgt_soilmap_coverage(..., out=path) first."
+        )
+
     bgt = _prepare_bgt(bgt, MAIN_BGT_UNITS)
     soilmap = _prepare_soilmap(soilmap, MAIN_SOILMAP_UNITS)
 
-    bgt_area = calc_areal_percentage_in_cells(bgt, grid, MAIN_BGT_UNITS)
-    soilmap_area = calc_areal_percentage_in_cells(soilmap, grid, MAIN_SOILMAP_UNITS)
+    previous = pd.read_parquet(fingerprints_path)
+    previous_fingerprints = previous["fingerprint"].to_numpy().astype("S16")
+    fingerprints = _bgt_fingerprints(bgt)
+
+    changed_fingerprints = _changed_fingerprints(previous_fingerprints, fingerprints)
+    removed = np.isin(previous_fingerprints, changed_fingerprints)
+    added = np.isin(fingerprints, changed_fingerprints)
+    removed_bounds = previous.loc[removed, ["xmin", "ymin", "xmax", "ymax"]].to_numpy()
+    changed = np.concatenate(
+        [shapely.box(*removed_bounds.T), bgt.geometry.values[added]]
+    )
+
+    with netCDF4.Dataset(out, "a") as nc:
+        tile_size = int(nc.tile_size)
+        engine = engine or nc.engine
+        method = method or nc.method
+        if (engine, method) != (nc.engine, nc.method):
+            raise ValueError(
+                f"Coverage file {out} was written with engine {nc.engine!r} and method "
+                f"{nc.method!r}, got engine {engine!r} and method {method!r}."
+            )
+        definition = ops._grid_definition(grid.dataarray())
+        row_edges = ops._tile_edges(definition.ny, tile_size)
+        col_edges = ops._tile_edges(definition.nx, tile_size)
+        tiles = [
+            shapely.box(*ops._tile_bounds(definition, slice(*rows), slice(*cols)))
+            for rows in zip(row_edges[:-1], row_edges[1:])
+            for cols in zip(col_edges[:-1], col_edges[1:])
+        ]
+        touched, _ = shapely.STRtree(changed).query(tiles, "intersects")
+
+        tile_done = nc["tile_done"][:].reshape(-1)
+        tile_done[touched] = 0
+        nc["tile_done"][:] = tile_done.reshape(nc["tile_done"].shape)
+
+    _write_coverage_tiles(
+        bgt, soilmap, grid, out, n_workers, engine, tile_size, None, method
+    )
+    _save_bgt_fingerprints(bgt, out)
+    return _read_coverage(out)
+
+
+def _read_coverage(out: str | Path) -> xr.DataArray:
+    """
+    Helper function to read the coverage from a coverage file into memory and close
+    the file, so it can be opened again to resume or update the coverage.
+
+    """
+    with xr.open_dataset(out) as ds:
+        return ds["coverage"].load()
+
+
+def _fingerprints_path(out: str | Path) -> Path:
+    """
+    Helper function to get the path of the BGT fingerprints stored next to a coverage
+    file.
+
+    """
+    return Path(out).with_suffix(".bgt.parquet")
+
+
+def _bgt_fingerprints(bgt: gpd.GeoDataFrame) -> np.ndarray:
+    """
+    Helper function to calculate a fingerprint of the geometry and grouped BGT unit of
+    each BGT object.
+
+    """
+    return polygon_fingerprints(bgt, extra=bgt["idx"].to_numpy())
+
+
+def _changed_fingerprints(previous: np.ndarray, current: np.ndarray) -> np.ndarray:
+    """
+    Helper function to find the fingerprints that occur a different number of times in
+    the previous and current fingerprints, so duplicate BGT objects are compared as a
+    multiset.
+
+    """
+    previous, previous_counts = np.unique(previous, return_counts=True)
+    current, current_counts = np.unique(current, return_counts=True)
+    fingerprints = np.union1d(previous, current)
+
+    counts = np.zeros((2, len(fingerprints)), dtype=np.int64)
+    counts[0, np.searchsorted(fingerprints, previous)] = previous_counts
+    counts[1, np.searchsorted(fingerprints, current)] = current_counts
+    return fingerprints[counts[0] != counts[1]]
+
 
+def _save_bgt_fingerprints(bgt: gpd.GeoDataFrame, out: str | Path):
+    """
+    Helper function to store the fingerprints and bounds of the BGT objects next to a
+    coverage file.
+
+    """
+    fingerprints = pd.DataFrame(
+        bgt.geometry.bounds.to_numpy(), columns=["xmin", "ymin", "xmax", "ymax"]
+    )
+    fingerprints.insert(0, "fingerprint", _bgt_fingerprints(bgt).tolist())
+    fingerprints.to_parquet(_fingerprints_path(out), index=False)
+
+
+def _write_coverage_tiles(
+    bgt: gpd.GeoDataFrame,
+    soilmap: gpd.GeoDataFrame,
+    grid: LassoGrid,
+    out: str | Path,
+    n_workers: int,
+    engine: str,
+    tile_size: int,
+    memory_budget: int = None,
+    method: str = "product",
+):
+    """
+    Helper function for bgt_soilmap_coverage to calculate the coverage per tile of the
+    grid and write each tile to a NetCDF file. Tiles that are registered as written in
+    an existing file are skipped. Without a tile size, the tile size of an existing
+    file is used or a tile size is estimated from the memory budget.
+
+    """
+    if method not in {"product", "exact"}:
+        raise ValueError(f"Unknown coverage method: {method!r}")
+    if tile_size is None:
+        tile_size = _stored_tile_size(out) or _coverage_tile_size(
+            bgt, soilmap, grid, memory_budget
+        )
+    definition = ops._grid_definition(grid.dataarray())
+    row_edges = ops._tile_edges(definition.ny, tile_size)
+    col_edges = ops._tile_edges(definition.nx, tile_size)
+
+    bgt_tree = shapely.STRtree(bgt.geometry.values)
+    soilmap_tree = shapely.STRtree(soilmap.geometry.values)
+
+    with _open_coverage_file(
+        out, grid, tile_size, engine, method, row_edges, col_edges
+    ) as nc:
+        tile_done = nc["tile_done"][:]
+        for i, (row, row_end) in enumerate(zip(row_edges[:-1], row_edges[1:])):
+            for j, (col, col_end) in enumerate(zip(col_edges[:-1], col_edges[1:])):
+                if tile_done[i, j]:
+                    continue
+
+                rows, cols = slice(row, row_end), slice(col, col_end)
+                bounds = ops._tile_bounds(definition, rows, cols)
+                tile_grid = LassoGrid(*bounds, grid.xsize, grid.ysize, grid.crs)
+
+                tile_box = shapely.box(*bounds)
+                tile_bgt = bgt.iloc[np.sort(bgt_tree.query(tile_box, "intersects"))]
+                tile_soilmap = soilmap.iloc[
+                    np.sort(soilmap_tree.query(tile_box, "intersects"))
+                ]
+
+                # Coverage of combinations is zero if either dataset is missing
+                if len(tile_bgt) == 0 or len(tile_soilmap) == 0:
+                    nc["coverage"][rows, cols, :] = 0
+                else:
+                    coverage = _calc_coverage(
+                        tile_bgt,
+                        tile_soilmap,
+                        tile_grid,
+                        n_workers,
+                        engine,
+                        None,
+                        None,
+                        method,
+                    )
+                    nc["coverage"][rows, cols, :] = coverage.values
+
+                nc["tile_done"][i, j] = 1
+                nc.sync()
+
+
+def _stored_tile_size(out: str | Path) -> int | None:
+    """
+    Helper function to get the tile size of an existing coverage file, or None if the
+    file does not exist.
+
+    """
+    if not Path(out).exists():
+        return None
+    with netCDF4.Dataset(out) as nc:
+        return int(nc.tile_size)
+
+
+def _coverage_tile_size(
+    bgt: gpd.GeoDataFrame,
+    soilmap: gpd.GeoDataFrame,
+    grid: LassoGrid,
+    memory_budget: int = None,
+) -> int:
+    """
+    Helper function to estimate the number of rows and columns of a tile for which the
+    overlap of the polygons, the areal percentages of the BGT and Soil Map units and
+    the coverage of all combinations fit within a memory budget.
+
+    """
+    nbgt, nsoilmap = len(MAIN_BGT_UNITS), len(MAIN_SOILMAP_UNITS)
+    nlayers = nbgt * nsoilmap + nbgt + nsoilmap
+    geometries = np.concatenate([bgt.geometry.values, soilmap.geometry.values])
+    ncells = len(grid.ycoordinates()) * len(grid.xcoordinates())
+    return ops._tile_size_for_budget(
+        geometries,
+        ncells,
+        memory_budget or COVERAGE_MEMORY_BUDGET,
+        cell_nbytes=nlayers * np.dtype("float64").itemsize,
+    )
+
+
+def _open_coverage_file(
+    out: str | Path,
+    grid: LassoGrid,
+    tile_size: int,
+    engine: str,
+    method: str,
+    row_edges: np.ndarray,
+    col_edges: np.ndarray,
+) -> netCDF4.Dataset:
+    """
+    Helper function to open an existing coverage NetCDF file to resume writing, or to
+    create a new file with a variable chunked per tile and a register of written tiles.
+
+    """
+    layers = _combine_bgt_soilmap_names(MAIN_BGT_UNITS, MAIN_SOILMAP_UNITS)
+    ycoords, xcoords = grid.ycoordinates(), grid.xcoordinates()
+    shape = (len(ycoords), len(xcoords), len(layers))
+    tiles = (len(row_edges) - 1, len(col_edges) - 1)
+
+    if Path(out).exists():
+        nc = netCDF4.Dataset(out, "a")
+        if (
+            nc["coverage"].shape != shape
+            or nc["tile_done"].shape != tiles
+            or int(nc.tile_size) != tile_size
+        ):
+            mismatch = "grid and tile size"
+        elif not (
+            np.allclose(nc["y"][:], ycoords) and np.allclose(nc["x"][:], xcoords)
+        ):
+            mismatch = "grid coordinates"
+        elif nc.__dict__.get("engine") != engine:
+            mismatch = f"engine {engine!r}"
+        elif nc.__dict__.get("method") != method:
+            mismatch = f"method {method!r}"
+        else:
+            return nc
+
+        nc.close()
+        raise ValueError(
+            f"Existing file {out} does not match the {mismatch}. Remove the file or "
+            "use a different path."
+        )
+
+    nc = netCDF4.Dataset(out, "w")
+    nc.tile_size = tile_size
+    nc.engine = engine
+    nc.method = method
+    for dim, size in zip(("y", "x", "layer", "tile_row", "tile_col"), shape + tiles):
+        nc.createDimension(dim, size)
+
+    nc.createVariable("y", "f8", ("y",))[:] = ycoords
+    nc.createVariable("x", "f8", ("x",))[:] = xcoords
+    layer = nc.createVariable("layer", str, ("layer",))
+    for i, name in enumerate(layers):
+        layer[i] = name
+
+    chunks = (np.diff(row_edges).max(), np.diff(col_edges).max(), len(layers))
+    coverage = nc.createVariable(
+        "coverage", "f4", ("y", "x", "layer"), chunksizes=chunks, fill_value=np.nan
+    )
+    coverage.crs = grid.crs.to_wkt()
+    nc.createVariable("tile_done", "u1", ("tile_row", "tile_col"), fill_value=0)
+    nc["tile_done"][:] = 0
+    return nc
+
+
+def _combine_coverage(
+    bgt_area: xr.DataArray, soilmap_area: xr.DataArray, grid: LassoGrid
+) -> xr.DataArray:
+    """
+    Helper function to combine the areal percentages of BGT and Soil Map units into
+    the coverage of each BGT-Soilmap combination.
+
+    """
     area = soilmap_area.values[:, :, :, None] * bgt_area.values[:, :, None, :]
 
     layers_area = _combine_bgt_soilmap_names(MAIN_BGT_UNITS, MAIN_SOILMAP_UNITS)
@@ -59,13 +819,22 @@ def _combine_bgt_soilmap_names(bgt_layers, soilmap_layers):
 
 
 def _prepare_bgt(bgt: gpd.GeoDataFrame, main_bgt_units: list):
-    bgt = group_bgt_units(bgt)
-    bgt = _add_layer_idx_column(bgt, main_bgt_units)
-    return bgt
+    bgt = group_bgt_units(bgt, main_bgt_units)
+    return bgt[bgt["idx"] >= 0].reset_index(drop=True)
 
 
 def _prepare_soilmap(soilmap: gpd.GeoDataFrame, main_soilmap_units: list):
-    soilmap = group_soilmap_units(soilmap)
-    soilmap = _add_layer_idx_column(soilmap, main_soilmap_units)
-    soilmap.sort_values(by=["maparea_id", "soilunit_sequencenumber"], inplace=True)
-    return soilmap.drop_duplicates(subset="maparea_id")
+    soilmap = group_soilmap_units(soilmap, main_soilmap_units)
+    first = _first_soil_unit(soilmap["maparea_id"], soilmap["soilunit_sequencenumber"])
+    return soilmap.iloc[first]
+
+
+def _first_soil_unit(maparea_id: pd.Series, sequencenumber: pd.Series) -> np.ndarray:
+    """
+    Helper function for _prepare_soilmap to find the position of the soil unit with the
+    lowest sequence number in each map area. The positions are ordered by map area.
+
+    """
+    sequencenumber = sequencenumber.to_numpy(dtype=float, na_value=np.inf)
+    positions = pd.Series(sequencenumber).groupby(maparea_id.to_numpy()).idxmin()
+    return positions.to_numpy()
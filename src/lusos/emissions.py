@@ -1,6 +1,11 @@
+from typing import List
+
 import geopandas as gpd
 
-from lusos.area_statistics import calculate_model_flux
+from lusos.area_statistics import (
+    calculate_model_flux,
+    calculate_model_flux_multiresolution,
+)
 from lusos.lasso import LassoGrid
 from lusos.preprocessing import calc_somers_emission_per_m2
 
@@ -8,6 +13,11 @@ from lusos.preprocessing import calc_somers_emission_per_m2
 def calculate_somers_emissions(
     somers: gpd.GeoDataFrame,
     grid: LassoGrid,
+    n_workers: int = 1,
+    engine: str = "xugrid",
+    tile_size: int = None,
+    memory_budget: int = None,
+    columns: List[str] = None,
 ):
     """
     Calculate a weighted greenhouse gas flux per cell in a 2D grid from Somers emission
@@ -16,15 +26,95 @@ def calculate_somers_emissions(
     Parameters
     ----------
     somers : gpd.GeoDataFrame
-        _description_
+        GeoDataFrame containing the Somers emission data per parcel. The GeoDataFrame
+        is not modified.
     grid : LassoGrid
         _description_
+    n_workers : int, optional
+        Number of threads to use in the polygon triangulation. Use -1 to use all
+        available CPU cores. The default is 1.
+    engine : str, optional
+        Engine to calculate the overlap of the polygons with the grid cells, "xugrid",
+        "clip", "structured" or "hybrid". See
+        :func:`~lusos.geometry.ops.polygon_area_in_grid`. The default is "xugrid".
+    tile_size, memory_budget : int, optional
+        Calculate the overlap per square tile of about `tile_size` rows and columns, or
+        of a size estimated to fit within `memory_budget` bytes, to limit the peak
+        memory. See :func:`~lusos.geometry.ops.iter_polygon_area_in_grid`. The default
+        is None, which processes the whole grid at once.
+    columns : List[str], optional
+        List of columns with emission factors in ton/ha to calculate the flux for, e.g.
+        the median and percentiles of CO2, CH4 and N2O emissions. All columns are
+        gridded in a single pass and returned as a Dataset. The default is None, which
+        calculates the flux for the "median" column only.
 
     Returns
     -------
-    _type_
-        _description_
+    xr.DataArray | xr.Dataset
+        2D grid with the flux per m2 in each cell, or a Dataset with a 2D grid for each
+        column if `columns` is given.
     """
-    somers["flux_m2"] = calc_somers_emission_per_m2(somers)
-    flux_per_m2 = calculate_model_flux(somers, grid)
+    if columns is not None:
+        fluxes = calc_somers_emission_per_m2(somers, list(columns))
+        return calculate_model_flux(
+            somers.assign(**fluxes),
+            grid,
+            n_workers,
+            engine,
+            tile_size,
+            memory_budget,
+            columns=list(columns),
+        )
+
+    somers = somers.assign(flux_m2=calc_somers_emission_per_m2(somers))
+    flux_per_m2 = calculate_model_flux(
+        somers, grid, n_workers, engine, tile_size, memory_budget
+    )
     return flux_per_m2
+
+
+def calculate_somers_emissions_multiresolution(
+    somers: gpd.GeoDataFrame,
+    grids: list[LassoGrid],
+    n_workers: int = 1,
+    engine: str = "xugrid",
+    tile_size: int = None,
+    memory_budget: int = None,
+):
+    """
+    Calculate a weighted greenhouse gas flux per cell from Somers emission data for
+    multiple nested grids at once. The overlap is only calculated for the grid with the
+    smallest cells. See
+    :func:`~lusos.area_statistics.calculate_model_flux_multiresolution`.
+
+    Parameters
+    ----------
+    somers : gpd.GeoDataFrame
+        GeoDataFrame containing the Somers emission data per parcel. The GeoDataFrame
+        is not modified.
+    grids : list[LassoGrid]
+        LassoGrid instances to calculate the fluxes for. All grids must nest in the grid
+        with the smallest cells.
+    n_workers : int, optional
+        Number of threads to use in the polygon triangulation. Use -1 to use all
+        available CPU cores. The default is 1.
+    engine : str, optional
+        Engine to calculate the overlap of the polygons with the grid cells, "xugrid",
+        "clip", "structured" or "hybrid". See
+        :func:`~lusos.geometry.ops.polygon_area_in_grid`. The default is "xugrid".
+    tile_size, memory_budget : int, optional
+        Calculate the overlap per square tile of about `tile_size` rows and columns, or
+        of a size estimated to fit within `memory_budget` bytes, to limit the peak
+        memory. See :func:`~lusos.geometry.ops.iter_polygon_area_in_grid`. The default
+        is None, which processes the whole grid at once.
+
+    Returns
+    -------
+    list[xr.DataArray]
+        2D grids with the weighted flux per cell in the same order as `grids`.
+
+    """
+    somers = somers.assign(flux_m2=calc_somers_emission_per_m2(somers))
+    return calculate_model_flux_multiresolution(
+        somers, grids, n_workers, engine, tile_size, memory_budget
+    )
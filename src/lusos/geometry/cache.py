@@ -0,0 +1,302 @@
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import NamedTuple
+
+import geopandas as gpd
+import numba
+import numpy as np
+import pooch
+import shapely
+
+
+class CacheInfo(NamedTuple):
+    """
+    Summary of the contents of a :class:`TriangulationCache`.
+
+    Parameters
+    ----------
+    path : Path
+        Directory of the cache.
+    nentries : int
+        Number of cached entries.
+    size : int
+        Total size of the cached entries in bytes.
+    max_size : int
+        Maximum size of the cache in bytes.
+
+    """
+
+    path: Path
+    nentries: int
+    size: int
+    max_size: int
+
+
+def geometry_hash(polygons: gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray) -> str:
+    """
+    Content hash of a geometry column based on the WKB representation of each geometry
+    and the number of geometries. The WKB of all geometries is hashed as a single
+    buffer together with the length of each WKB.
+
+    Parameters
+    ----------
+    polygons : gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray
+        Geometries to hash.
+
+    Returns
+    -------
+    str
+        Hexadecimal digest of the geometries.
+
+    """
+    if isinstance(polygons, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        polygons = polygons.geometry.values
+    polygons = np.asarray(polygons)
+
+    buffer, lengths = _wkb_buffer(polygons)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(np.int64(len(polygons)).tobytes())
+    digest.update(lengths.tobytes())
+    digest.update(buffer)
+    return digest.hexdigest()
+
+
+def polygon_fingerprints(
+    polygons: gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray,
+    extra: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Content hash of each geometry based on its geometry type, number of parts and 2D
+    coordinates. Equal geometries have equal fingerprints, which allows to match
+    geometries between datasets. The coordinates of all geometries are hashed in
+    parallel with a fast 128-bit non-cryptographic hash.
+
+    Parameters
+    ----------
+    polygons : gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray
+        Geometries to hash.
+    extra : np.ndarray, optional
+        Integer value per geometry that is hashed together with the geometry, such as
+        the code of a category the geometry belongs to. The default is None.
+
+    Returns
+    -------
+    np.ndarray
+        Array of 16 byte digests with dtype "S16".
+
+    """
+    if isinstance(polygons, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        polygons = polygons.geometry.values
+    polygons = np.asarray(polygons)
+
+    ncoords = shapely.get_num_coordinates(polygons).astype(np.int64)
+    columns = [
+        shapely.get_type_id(polygons),
+        shapely.get_num_geometries(polygons),
+        ncoords,
+    ]
+    if extra is not None:
+        columns.append(np.asarray(extra))
+    header = np.column_stack([c.astype(np.int64) for c in columns])
+    words = shapely.get_coordinates(polygons).view(np.uint64).ravel()
+    offsets = np.concatenate([[0], np.cumsum(2 * ncoords)])
+
+    with np.errstate(over="ignore"):  # Only relevant when the JIT is disabled
+        digests = _hash_segments(words, offsets, header.view(np.uint64))
+    return digests.view("S16").ravel()
+
+
+def _wkb_buffer(polygons: np.ndarray) -> tuple[bytes, np.ndarray]:
+    """
+    Helper function to get the concatenated WKB representation of geometries and the
+    length of the WKB of each geometry.
+
+    """
+    wkbs = shapely.to_wkb(polygons, hex=False, output_dimension=2)
+    lengths = np.fromiter(map(len, wkbs), dtype=np.int64, count=len(wkbs))
+    return b"".join(wkbs), lengths
+
+
+@numba.njit(cache=True)
+def _mix(h: np.uint64) -> np.uint64:
+    """
+    Helper function to finalize a 64-bit hash with the splitmix64 mixing function.
+
+    """
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+@numba.njit(parallel=True, cache=True)
+def _hash_segments(
+    words: np.ndarray, offsets: np.ndarray, header: np.ndarray
+) -> np.ndarray:
+    """
+    Helper function for polygon_fingerprints to calculate a 128-bit hash of the header
+    row and the segment words[offsets[i]:offsets[i + 1]] of each geometry from two
+    independent 64-bit lanes.
+
+    """
+    nsegments = len(offsets) - 1
+    digests = np.empty((nsegments, 2), dtype=np.uint64)
+    for i in numba.prange(nsegments):
+        h1 = np.uint64(0xCBF29CE484222325)
+        h2 = np.uint64(0x9E3779B97F4A7C15)
+        for k in range(header.shape[1]):
+            h1 = _mix(h1 ^ header[i, k])
+            h2 = _mix(h2 + header[i, k])
+
+        for j in range(offsets[i], offsets[i + 1]):
+            h1 = (h1 ^ words[j]) * np.uint64(0x100000001B3)
+            h2 = (h2 + words[j]) * np.uint64(0xFF51AFD7ED558CCD)
+            h2 = (h2 << np.uint64(31)) | (h2 >> np.uint64(33))
+
+        digests[i, 0] = _mix(h1)
+        digests[i, 1] = _mix(h2 ^ digests[i, 0])
+    return digests
+
+
+class TriangulationCache:
+    """
+    Persistent on-disk cache for triangulation results. Each entry is stored as a
+    directory with uncompressed `.npy` files which are loaded as read-only memory maps,
+    so cached arrays are not copied into memory until they are used. The least recently
+    used entries are removed when the total size of the cache exceeds `max_size`.
+
+    Parameters
+    ----------
+    path : str | Path, optional
+        Directory to store the cache in. The default is a "triangles" folder in the
+        lusos cache directory of the operating system.
+    max_size : int, optional
+        Maximum total size of the cache in bytes. The default is 2 GB.
+
+    Examples
+    --------
+    Cache the triangulation of BGT polygons between runs:
+
+    >>> cache = TriangulationCache()
+    >>> tri = triangulate(bgt, cache=cache)
+    >>> cache.info()
+    CacheInfo(path=..., nentries=1, size=..., max_size=2147483648)
+
+    """
+
+    def __init__(self, path: str | Path = None, max_size: int = 2 * 1024**3):
+        if path is None:
+            path = pooch.os_cache("lusos") / "triangles"
+        self.path = Path(path)
+        self.max_size = max_size
+
+    def __repr__(self):
+        name = self.__class__.__name__
+        return f"{name}(path={str(self.path)!r}, max_size={self.max_size})"
+
+    def __contains__(self, key: str) -> bool:
+        return (self.path / key).is_dir()
+
+    def load(self, key: str) -> dict | None:
+        """
+        Load the arrays of a cache entry as read-only memory maps.
+
+        Parameters
+        ----------
+        key : str
+            Key of the cache entry.
+
+        Returns
+        -------
+        dict | None
+            Dictionary with the cached arrays or None if the key is not in the cache.
+
+        """
+        entry = self.path / key
+        if not entry.is_dir():
+            return None
+
+        arrays = {f.stem: np.load(f, mmap_mode="r") for f in entry.glob("*.npy")}
+        os.utime(entry)
+        return arrays
+
+    def save(self, key: str, **arrays: np.ndarray):
+        """
+        Store arrays in the cache under a key and evict the least recently used entries
+        if the cache exceeds its maximum size.
+
+        Parameters
+        ----------
+        key : str
+            Key of the cache entry.
+        **arrays : np.ndarray
+            Arrays to store in the cache entry.
+
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary directory first so partial entries are never loaded.
+        tmp = self.path / f".{key}.{uuid.uuid4().hex}"
+        tmp.mkdir()
+        for name, array in arrays.items():
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(array))
+
+        try:
+            tmp.rename(self.path / key)
+        except OSError:  # Stored concurrently by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self._evict()
+
+    def info(self) -> CacheInfo:
+        """
+        Summary of the number of entries and total size of the cache.
+
+        Returns
+        -------
+        CacheInfo
+
+        """
+        entries = self._entries()
+        size = sum(s for _, _, s in entries)
+        return CacheInfo(self.path, len(entries), size, self.max_size)
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+
+        """
+        for entry, _, _ in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def _entries(self) -> list[tuple[Path, float, int]]:
+        """
+        Helper function to list the path, last access time and size of each entry.
+
+        """
+        if not self.path.is_dir():
+            return []
+
+        entries = []
+        for entry in self.path.iterdir():
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir())
+            entries.append((entry, entry.stat().st_mtime, size))
+        return entries
+
+    def _evict(self):
+        """
+        Helper function to remove the least recently used entries until the cache no
+        longer exceeds its maximum size.
+
+        """
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        size = sum(s for _, _, s in entries)
+        for entry, _, entry_size in entries:
+            if size <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            size -= entry_size
@@ -0,0 +1,484 @@
+"""
+Numba kernels to calculate the exact area of polygons in the cells of a regular,
+axis-aligned grid by clipping the polygon rings against the grid rows and columns with
+the Sutherland-Hodgman algorithm.
+
+Each ring is swept from the top to the bottom row: in every step the remaining part of
+the ring is split into the part inside the current row and the part below it. The row
+part is swept from the left to the right column in the same way, after which the area
+of the clipped ring in each cell follows from the shoelace formula. Holes contribute a
+negative area so the results of the rings of a polygon can be summed per cell.
+
+"""
+
+import numba
+import numpy as np
+
+# Relative tolerance (of the cell area) below which clipped areas are considered zero.
+AREA_TOLERANCE = 1e-12
+
+
+@numba.njit(inline="always", cache=True)
+def _intersection(ax, ay, bx, by, axis, value):
+    """
+    Intersection of the segment a-b with the line where the coordinate along the axis
+    (0 for x, 1 for y) equals value. The intersection is always calculated from the
+    lowest endpoint so both sides of a split get exactly the same point.
+
+    """
+    if (ay > by) if axis == 1 else (ax > bx):
+        ax, ay, bx, by = bx, by, ax, ay
+
+    if axis == 1:
+        t = (value - ay) / (by - ay)
+        return ax + t * (bx - ax), value
+    else:
+        t = (value - ax) / (bx - ax)
+        return value, ay + t * (by - ay)
+
+
+@numba.njit(cache=True)
+def _clip_half_plane(xs, ys, n, out_x, out_y, axis, value, keep_below):
+    """
+    Clip a ring with n vertices to the half plane where the coordinate along the axis
+    is below (keep_below=True) or above the value. Returns the number of vertices of the
+    clipped ring written to out_x and out_y.
+
+    """
+    if n == 0:
+        return 0
+
+    m = 0
+    px = xs[n - 1]
+    py = ys[n - 1]
+    pv = py if axis == 1 else px
+    p_inside = pv <= value if keep_below else pv >= value
+
+    for i in range(n):
+        cx = xs[i]
+        cy = ys[i]
+        cv = cy if axis == 1 else cx
+        c_inside = cv <= value if keep_below else cv >= value
+
+        if c_inside != p_inside:
+            out_x[m], out_y[m] = _intersection(px, py, cx, cy, axis, value)
+            m += 1
+        if c_inside:
+            out_x[m] = cx
+            out_y[m] = cy
+            m += 1
+
+        px = cx
+        py = cy
+        p_inside = c_inside
+
+    return m
+
+
+@numba.njit(inline="always", cache=True)
+def _signed_area(xs, ys, n):
+    area = 0.0
+    if n < 3:
+        return area
+    x0 = xs[0]
+    y0 = ys[0]
+    for i in range(1, n - 1):
+        area += (xs[i] - x0) * (ys[i + 1] - y0) - (xs[i + 1] - x0) * (ys[i] - y0)
+    return 0.5 * area
+
+
+@numba.njit(inline="always", cache=True)
+def _append(cells, areas, n, cell, area):
+    """
+    Append an entry to growable output arrays.
+
+    """
+    if n == len(cells):
+        new_cells = np.empty(2 * len(cells), dtype=cells.dtype)
+        new_areas = np.empty(2 * len(areas), dtype=areas.dtype)
+        new_cells[:n] = cells[:n]
+        new_areas[:n] = areas[:n]
+        cells = new_cells
+        areas = new_areas
+    cells[n] = cell
+    areas[n] = area
+    return cells, areas, n + 1
+
+
+@numba.njit(cache=True)
+def _clip_ring(
+    coords, start, end, sign, xmin, ymax, dx, dy, nx, ny, skip, work, cells, areas, n
+):
+    """
+    Clip a single ring against the grid and append the (signed) area of the ring in each
+    cell it overlaps to the output arrays. Cells marked in the skip mask are not clipped
+    and not added to the output, unless the mask is empty.
+
+    """
+    xs = coords[start:end, 0]
+    ys = coords[start:end, 1]
+    nvertices = end - start
+    if nvertices > 1 and xs[0] == xs[-1] and ys[0] == ys[-1]:
+        nvertices -= 1  # drop closing coordinate
+
+    ring_area = _signed_area(xs, ys, nvertices)
+    if ring_area == 0.0:
+        return cells, areas, n
+
+    minx = xs[:nvertices].min()
+    maxx = xs[:nvertices].max()
+    miny = ys[:nvertices].min()
+    maxy = ys[:nvertices].max()
+
+    row_min = max(int(np.floor((ymax - maxy) / dy)), 0)
+    row_max = min(int(np.floor((ymax - miny) / dy)), ny - 1)
+    col_min = max(int(np.floor((minx - xmin) / dx)), 0)
+    col_max = min(int(np.floor((maxx - xmin) / dx)), nx - 1)
+    if row_min > row_max or col_min > col_max:
+        return cells, areas, n
+
+    tolerance = AREA_TOLERANCE * dx * dy
+
+    # Ring within a single cell, no clipping needed.
+    if (
+        row_min == row_max
+        and col_min == col_max
+        and maxy <= ymax - row_min * dy
+        and miny >= ymax - (row_min + 1) * dy
+        and minx >= xmin + col_min * dx
+        and maxx <= xmin + (col_min + 1) * dx
+    ):
+        cell = row_min * nx + col_min
+        if len(skip) > 0 and skip[cell]:
+            return cells, areas, n
+        return _append(cells, areas, n, cell, sign * abs(ring_area))
+
+    rem_x, rem_y, tmp_x, tmp_y, row_x, row_y, col_x, col_y = work
+
+    # Remaining part of the ring below the top of the first row.
+    nrem = _clip_half_plane(
+        xs, ys, nvertices, rem_x, rem_y, 1, ymax - row_min * dy, True
+    )
+
+    for row in range(row_min, row_max + 1):
+        if nrem < 3:
+            break
+
+        ylow = ymax - (row + 1) * dy
+        nrow = _clip_half_plane(rem_x, rem_y, nrem, row_x, row_y, 1, ylow, False)
+        if row < row_max:
+            ntmp = _clip_half_plane(rem_x, rem_y, nrem, tmp_x, tmp_y, 1, ylow, True)
+            rem_x, tmp_x = tmp_x, rem_x
+            rem_y, tmp_y = tmp_y, rem_y
+            nrem = ntmp
+
+        if nrow < 3:
+            continue
+
+        row_minx = row_x[:nrow].min()
+        row_maxx = row_x[:nrow].max()
+        first_col = max(int(np.floor((row_minx - xmin) / dx)), col_min)
+        last_col = min(int(np.floor((row_maxx - xmin) / dx)), col_max)
+
+        # Remaining part of the row right of the left edge of the first column.
+        ncol_rem = _clip_half_plane(
+            row_x, row_y, nrow, tmp_x, tmp_y, 0, xmin + first_col * dx, False
+        )
+        row_x[:ncol_rem] = tmp_x[:ncol_rem]
+        row_y[:ncol_rem] = tmp_y[:ncol_rem]
+
+        col = first_col
+        while col <= last_col and ncol_rem >= 3:
+            if len(skip) > 0 and skip[row * nx + col]:
+                # Jump over the run of skipped cells in a single clip.
+                run_end = col
+                while run_end < last_col and skip[row * nx + run_end + 1]:
+                    run_end += 1
+                if run_end == last_col:
+                    break
+
+                xhigh = xmin + (run_end + 1) * dx
+                ntmp = _clip_half_plane(
+                    row_x, row_y, ncol_rem, tmp_x, tmp_y, 0, xhigh, False
+                )
+                row_x[:ntmp] = tmp_x[:ntmp]
+                row_y[:ntmp] = tmp_y[:ntmp]
+                ncol_rem = ntmp
+                col = run_end + 1
+                continue
+
+            xhigh = xmin + (col + 1) * dx
+            ncell = _clip_half_plane(
+                row_x, row_y, ncol_rem, col_x, col_y, 0, xhigh, True
+            )
+            if col < last_col:
+                ntmp = _clip_half_plane(
+                    row_x, row_y, ncol_rem, tmp_x, tmp_y, 0, xhigh, False
+                )
+                row_x[:ntmp] = tmp_x[:ntmp]
+                row_y[:ntmp] = tmp_y[:ntmp]
+                ncol_rem = ntmp
+
+            area = abs(_signed_area(col_x, col_y, ncell))
+            if area > tolerance:
+                cells, areas, n = _append(cells, areas, n, row * nx + col, sign * area)
+            col += 1
+
+    return cells, areas, n
+
+
+@numba.njit(nogil=True, cache=True)
+def clip_polygons(
+    coords,
+    ring_offsets,
+    polygon_offsets,
+    start,
+    stop,
+    xmin,
+    ymax,
+    dx,
+    dy,
+    nx,
+    ny,
+    skip,
+):
+    """
+    Calculate the area of the polygons start to stop of a ragged array of polygons in
+    the cells of a regular grid. Releases the GIL so ranges of polygons can be processed
+    concurrently.
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        Array of shape (n, 2) with the coordinates of all polygon rings.
+    ring_offsets : np.ndarray
+        Offsets of each ring in `coords`.
+    polygon_offsets : np.ndarray
+        Offsets of the rings of each polygon in `ring_offsets`.
+    start, stop : int
+        Range of polygons to calculate the areas for.
+    xmin, ymax : float
+        Coordinates of the upper left corner of the grid.
+    dx, dy : float
+        Absolute cell size of the grid in x- and y-direction.
+    nx, ny : int
+        Number of columns and rows in the grid.
+    skip : np.ndarray
+        Boolean mask of size nx * ny with cells to skip, for example because their area
+        is already known. Use an empty array to skip no cells.
+
+    Returns
+    -------
+    cells, polygons, areas : np.ndarray
+        Flat index of the grid cell, polygon number and area of each polygon-cell
+        overlap. The entries are ordered by polygon and by cell within each polygon.
+
+    """
+    max_vertices = 0
+    for ii in range(start, stop):
+        for ring in range(polygon_offsets[ii], polygon_offsets[ii + 1]):
+            max_vertices = max(
+                max_vertices, ring_offsets[ring + 1] - ring_offsets[ring]
+            )
+
+    # Each clip adds at most one vertex per crossing of the ring with a grid line.
+    size = 8 * max_vertices + 16
+    work = (
+        np.empty(size),
+        np.empty(size),
+        np.empty(size),
+        np.empty(size),
+        np.empty(size),
+        np.empty(size),
+        np.empty(size),
+        np.empty(size),
+    )
+    tolerance = AREA_TOLERANCE * dx * dy
+
+    out_cells = np.empty(max(stop - start, 16), dtype=np.int64)
+    out_polygons = np.empty(max(stop - start, 16), dtype=np.int64)
+    out_areas = np.empty(max(stop - start, 16), dtype=np.float64)
+    nout = 0
+
+    ring_cells = np.empty(64, dtype=np.int64)
+    ring_areas = np.empty(64, dtype=np.float64)
+    for ii in range(start, stop):
+        nring = 0
+        ring_start = polygon_offsets[ii]
+        ring_end = polygon_offsets[ii + 1]
+        for ring in range(ring_start, ring_end):
+            sign = 1.0 if ring == ring_start else -1.0
+            ring_cells, ring_areas, nring = _clip_ring(
+                coords,
+                ring_offsets[ring],
+                ring_offsets[ring + 1],
+                sign,
+                xmin,
+                ymax,
+                dx,
+                dy,
+                nx,
+                ny,
+                skip,
+                work,
+                ring_cells,
+                ring_areas,
+                nring,
+            )
+
+        if nring == 0:
+            continue
+
+        cells = ring_cells[:nring]
+        areas = ring_areas[:nring]
+        if ring_end - ring_start > 1:  # Merge exterior and holes per cell
+            order = np.argsort(cells, kind="mergesort")
+            cells = cells[order]
+            areas = areas[order]
+
+        current_cell = cells[0]
+        current_area = areas[0]
+        for jj in range(1, nring + 1):
+            if jj < nring and cells[jj] == current_cell:
+                current_area += areas[jj]
+                continue
+
+            if current_area > tolerance:
+                if nout == len(out_polygons):
+                    out_polygons = np.concatenate((out_polygons, out_polygons))
+                out_polygons[nout] = ii
+                out_cells, out_areas, nout = _append(
+                    out_cells, out_areas, nout, current_cell, current_area
+                )
+
+            if jj < nring:
+                current_cell = cells[jj]
+                current_area = areas[jj]
+
+    return out_cells[:nout], out_polygons[:nout], out_areas[:nout]
+
+
+@numba.njit(nogil=True, cache=True)
+def clip_triangles(coords, triangles, start, stop, xmin, ymax, dx, dy, nx, ny):
+    """
+    Calculate the area of the triangles start to stop in the cells of a regular grid.
+    Candidate cells follow from the bounding box of each triangle so no spatial tree is
+    needed. Releases the GIL so ranges of triangles can be processed concurrently.
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        Array of shape (n, 2) with the coordinates of the triangle vertices.
+    triangles : np.ndarray
+        Array of shape (m, 3) with the indices of the vertices of each triangle.
+    start, stop : int
+        Range of triangles to calculate the areas for.
+    xmin, ymax : float
+        Coordinates of the upper left corner of the grid.
+    dx, dy : float
+        Absolute cell size of the grid in x- and y-direction.
+    nx, ny : int
+        Number of columns and rows in the grid.
+
+    Returns
+    -------
+    cells, triangles, areas : np.ndarray
+        Flat index of the grid cell, triangle number and area of each triangle-cell
+        overlap. The entries are ordered by triangle.
+
+    """
+    size = 8 * 3 + 16
+    work = (
+        np.empty(size),
+        np.empty(size),
+        np.empty(size),
+        np.empty(size),
+        np.empty(size),
+        np.empty(size),
+        np.empty(size),
+        np.empty(size),
+    )
+    vertices = np.empty((3, 2))
+    skip = np.empty(0, dtype=np.bool_)
+
+    out_cells = np.empty(max(stop - start, 16), dtype=np.int64)
+    out_triangles = np.empty(max(stop - start, 16), dtype=np.int64)
+    out_areas = np.empty(max(stop - start, 16), dtype=np.float64)
+    nout = 0
+    for ii in range(start, stop):
+        for jj in range(3):
+            vertices[jj, 0] = coords[triangles[ii, jj], 0]
+            vertices[jj, 1] = coords[triangles[ii, jj], 1]
+
+        n = nout
+        out_cells, out_areas, nout = _clip_ring(
+            vertices,
+            0,
+            3,
+            1.0,
+            xmin,
+            ymax,
+            dx,
+            dy,
+            nx,
+            ny,
+            skip,
+            work,
+            out_cells,
+            out_areas,
+            nout,
+        )
+        if nout > len(out_triangles):
+            new_triangles = np.empty(len(out_cells), dtype=np.int64)
+            new_triangles[:n] = out_triangles[:n]
+            out_triangles = new_triangles
+        out_triangles[n:nout] = ii
+
+    return out_cells[:nout], out_triangles[:nout], out_areas[:nout]
+
+
+@numba.njit(cache=True)
+def cell_csr(cells, ncells):
+    """
+    Stable counting sort of polygon-cell entries by cell.
+
+    Parameters
+    ----------
+    cells : np.ndarray
+        Flat cell index of each entry.
+    ncells : int
+        Number of cells in the grid.
+
+    Returns
+    -------
+    cell_idx, nitems, order : np.ndarray
+        Unique cells with entries, number of entries in each of these cells and the
+        order that sorts the entries by cell.
+
+    """
+    counts = np.zeros(ncells + 1, dtype=np.int64)
+    for cell in cells:
+        counts[cell + 1] += 1
+
+    ncells_with_items = 0
+    for ii in range(1, ncells + 1):
+        if counts[ii] > 0:
+            ncells_with_items += 1
+
+    cell_idx = np.empty(ncells_with_items, dtype=np.int64)
+    nitems = np.empty(ncells_with_items, dtype=np.int64)
+    jj = 0
+    for ii in range(ncells):
+        if counts[ii + 1] > 0:
+            cell_idx[jj] = ii
+            nitems[jj] = counts[ii + 1]
+            jj += 1
+        counts[ii + 1] += counts[ii]
+
+    order = np.empty(len(cells), dtype=np.int64)
+    for ii in range(len(cells)):
+        cell = cells[ii]
+        order[counts[cell]] = ii
+        counts[cell] += 1
+
+    return cell_idx, nitems, order
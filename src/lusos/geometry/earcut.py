@@ -0,0 +1,915 @@
+"""
+Numba implementation of the mapbox earcut polygon triangulation algorithm
+(https://github.com/mapbox/earcut.hpp) to triangulate many polygons stored as a ragged
+array in a single compiled loop. The implementation follows earcut.hpp so the resulting
+triangles are the same as the ones returned by `mapbox_earcut.triangulate_float64`.
+
+The linked lists of polygon nodes are stored in preallocated arrays where a node is
+referred to by its position in the arrays and -1 is used as null pointer.
+
+"""
+
+from typing import NamedTuple
+
+import numba
+import numpy as np
+
+NULL = -1
+
+
+class _Nodes(NamedTuple):
+    i: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+    prev: np.ndarray
+    next: np.ndarray
+    prev_z: np.ndarray
+    next_z: np.ndarray
+    steiner: np.ndarray
+    size: np.ndarray
+
+
+@numba.njit(cache=True)
+def _allocate_nodes(capacity: int) -> _Nodes:
+    return _Nodes(
+        np.empty(capacity, dtype=np.int64),
+        np.empty(capacity, dtype=np.float64),
+        np.empty(capacity, dtype=np.float64),
+        np.empty(capacity, dtype=np.int64),
+        np.empty(capacity, dtype=np.int64),
+        np.empty(capacity, dtype=np.int64),
+        np.empty(capacity, dtype=np.int64),
+        np.empty(capacity, dtype=np.int64),
+        np.empty(capacity, dtype=np.bool_),
+        np.zeros(1, dtype=np.int64),
+    )
+
+
+@numba.njit(inline="always", cache=True)
+def _new_node(nodes, i, x, y):
+    p = nodes.size[0]
+    nodes.size[0] += 1
+    nodes.i[p] = i
+    nodes.x[p] = x
+    nodes.y[p] = y
+    nodes.z[p] = 0
+    nodes.prev[p] = NULL
+    nodes.next[p] = NULL
+    nodes.prev_z[p] = NULL
+    nodes.next_z[p] = NULL
+    nodes.steiner[p] = False
+    return p
+
+
+@numba.njit(inline="always", cache=True)
+def _insert_node(nodes, i, x, y, last):
+    p = _new_node(nodes, i, x, y)
+    if last == NULL:
+        nodes.prev[p] = p
+        nodes.next[p] = p
+    else:
+        nodes.next[p] = nodes.next[last]
+        nodes.prev[p] = last
+        nodes.prev[nodes.next[last]] = p
+        nodes.next[last] = p
+    return p
+
+
+@numba.njit(inline="always", cache=True)
+def _remove_node(nodes, p):
+    nodes.prev[nodes.next[p]] = nodes.prev[p]
+    nodes.next[nodes.prev[p]] = nodes.next[p]
+    if nodes.prev_z[p] != NULL:
+        nodes.next_z[nodes.prev_z[p]] = nodes.next_z[p]
+    if nodes.next_z[p] != NULL:
+        nodes.prev_z[nodes.next_z[p]] = nodes.prev_z[p]
+
+
+@numba.njit(inline="always", cache=True)
+def _area(nodes, p, q, r):
+    """
+    Signed area of the triangle of nodes p, q and r.
+
+    """
+    return (nodes.y[q] - nodes.y[p]) * (nodes.x[r] - nodes.x[q]) - (
+        nodes.x[q] - nodes.x[p]
+    ) * (nodes.y[r] - nodes.y[q])
+
+
+@numba.njit(inline="always", cache=True)
+def _equals(nodes, a, b):
+    return nodes.x[a] == nodes.x[b] and nodes.y[a] == nodes.y[b]
+
+
+@numba.njit(inline="always", cache=True)
+def _sign(value):
+    if value > 0:
+        return 1
+    elif value < 0:
+        return -1
+    return 0
+
+
+@numba.njit(inline="always", cache=True)
+def _point_in_triangle(ax, ay, bx, by, cx, cy, px, py):
+    return (
+        (cx - px) * (ay - py) >= (ax - px) * (cy - py)
+        and (ax - px) * (by - py) >= (bx - px) * (ay - py)
+        and (bx - px) * (cy - py) >= (cx - px) * (by - py)
+    )
+
+
+@numba.njit(cache=True)
+def _linked_list(nodes, coords, start, end, clockwise):
+    """
+    Create a circular doubly linked list from the ring coordinates between start and end
+    in the specified winding order.
+
+    """
+    signed_area = 0.0
+    j = end - 1
+    for i in range(start, end):
+        signed_area += (coords[j, 0] - coords[i, 0]) * (coords[i, 1] + coords[j, 1])
+        j = i
+
+    last = NULL
+    if clockwise == (signed_area > 0):
+        for i in range(start, end):
+            last = _insert_node(nodes, i, coords[i, 0], coords[i, 1], last)
+    else:
+        for i in range(end - 1, start - 1, -1):
+            last = _insert_node(nodes, i, coords[i, 0], coords[i, 1], last)
+
+    if last != NULL and _equals(nodes, last, nodes.next[last]):
+        _remove_node(nodes, last)
+        last = nodes.next[last]
+
+    return last
+
+
+@numba.njit(cache=True)
+def _filter_points(nodes, start, end):
+    """
+    Eliminate collinear or duplicate points.
+
+    """
+    if start == NULL:
+        return start
+    if end == NULL:
+        end = start
+
+    p = start
+    while True:
+        again = False
+        if not nodes.steiner[p] and (
+            _equals(nodes, p, nodes.next[p])
+            or _area(nodes, nodes.prev[p], p, nodes.next[p]) == 0
+        ):
+            _remove_node(nodes, p)
+            p = end = nodes.prev[p]
+            if p == nodes.next[p]:
+                break
+            again = True
+        else:
+            p = nodes.next[p]
+
+        if not (again or p != end):
+            break
+
+    return end
+
+
+@numba.njit(cache=True)
+def _z_order(x, y, minx, miny, inv_size):
+    """
+    Z-order of a point given the coordinates and inverse of the longer side of the
+    polygon bounding box.
+
+    """
+    ix = np.int64((x - minx) * inv_size)
+    iy = np.int64((y - miny) * inv_size)
+
+    ix = (ix | (ix << 8)) & 0x00FF00FF
+    ix = (ix | (ix << 4)) & 0x0F0F0F0F
+    ix = (ix | (ix << 2)) & 0x33333333
+    ix = (ix | (ix << 1)) & 0x55555555
+
+    iy = (iy | (iy << 8)) & 0x00FF00FF
+    iy = (iy | (iy << 4)) & 0x0F0F0F0F
+    iy = (iy | (iy << 2)) & 0x33333333
+    iy = (iy | (iy << 1)) & 0x55555555
+
+    return ix | (iy << 1)
+
+
+@numba.njit(cache=True)
+def _sort_linked(nodes, start):
+    """
+    Simon Tatham's linked list merge sort algorithm to sort nodes on z-order.
+
+    """
+    in_size = 1
+    linked = start
+    while True:
+        p = linked
+        linked = NULL
+        tail = NULL
+        n_merges = 0
+
+        while p != NULL:
+            n_merges += 1
+            q = p
+            p_size = 0
+            for _ in range(in_size):
+                p_size += 1
+                q = nodes.next_z[q]
+                if q == NULL:
+                    break
+
+            q_size = in_size
+            while p_size > 0 or (q_size > 0 and q != NULL):
+                if p_size != 0 and (
+                    q_size == 0 or q == NULL or nodes.z[p] <= nodes.z[q]
+                ):
+                    e = p
+                    p = nodes.next_z[p]
+                    p_size -= 1
+                else:
+                    e = q
+                    q = nodes.next_z[q]
+                    q_size -= 1
+
+                if tail != NULL:
+                    nodes.next_z[tail] = e
+                else:
+                    linked = e
+
+                nodes.prev_z[e] = tail
+                tail = e
+
+            p = q
+
+        nodes.next_z[tail] = NULL
+        in_size *= 2
+
+        if n_merges <= 1:
+            break
+
+    return linked
+
+
+@numba.njit(cache=True)
+def _index_curve(nodes, start, minx, miny, inv_size):
+    """
+    Interlink polygon nodes in z-order.
+
+    """
+    p = start
+    while True:
+        if nodes.z[p] == 0:
+            nodes.z[p] = _z_order(nodes.x[p], nodes.y[p], minx, miny, inv_size)
+        nodes.prev_z[p] = nodes.prev[p]
+        nodes.next_z[p] = nodes.next[p]
+        p = nodes.next[p]
+        if p == start:
+            break
+
+    nodes.next_z[nodes.prev_z[p]] = NULL
+    nodes.prev_z[p] = NULL
+    _sort_linked(nodes, p)
+
+
+@numba.njit(cache=True)
+def _is_ear(nodes, ear):
+    a = nodes.prev[ear]
+    b = ear
+    c = nodes.next[ear]
+
+    if _area(nodes, a, b, c) >= 0:  # reflex, can't be an ear
+        return False
+
+    ax, ay = nodes.x[a], nodes.y[a]
+    bx, by = nodes.x[b], nodes.y[b]
+    cx, cy = nodes.x[c], nodes.y[c]
+
+    p = nodes.next[c]
+    while p != a:
+        if _point_in_triangle(ax, ay, bx, by, cx, cy, nodes.x[p], nodes.y[p]) and (
+            _area(nodes, nodes.prev[p], p, nodes.next[p]) >= 0
+        ):
+            return False
+        p = nodes.next[p]
+
+    return True
+
+
+@numba.njit(cache=True)
+def _is_ear_hashed(nodes, ear, minx, miny, inv_size):
+    a = nodes.prev[ear]
+    b = ear
+    c = nodes.next[ear]
+
+    if _area(nodes, a, b, c) >= 0:  # reflex, can't be an ear
+        return False
+
+    ax, ay = nodes.x[a], nodes.y[a]
+    bx, by = nodes.x[b], nodes.y[b]
+    cx, cy = nodes.x[c], nodes.y[c]
+
+    min_z = _z_order(min(ax, bx, cx), min(ay, by, cy), minx, miny, inv_size)
+    max_z = _z_order(max(ax, bx, cx), max(ay, by, cy), minx, miny, inv_size)
+
+    # First look for points inside the triangle in increasing z-order
+    p = nodes.next_z[ear]
+    while p != NULL and nodes.z[p] <= max_z:
+        if (
+            p != a
+            and p != c
+            and _point_in_triangle(ax, ay, bx, by, cx, cy, nodes.x[p], nodes.y[p])
+            and _area(nodes, nodes.prev[p], p, nodes.next[p]) >= 0
+        ):
+            return False
+        p = nodes.next_z[p]
+
+    # Then look for points in decreasing z-order
+    p = nodes.prev_z[ear]
+    while p != NULL and nodes.z[p] >= min_z:
+        if (
+            p != a
+            and p != c
+            and _point_in_triangle(ax, ay, bx, by, cx, cy, nodes.x[p], nodes.y[p])
+            and _area(nodes, nodes.prev[p], p, nodes.next[p]) >= 0
+        ):
+            return False
+        p = nodes.prev_z[p]
+
+    return True
+
+
+@numba.njit(cache=True)
+def _on_segment(nodes, p, q, r):
+    """
+    For collinear points p, q and r, check if point q lies on segment pr.
+
+    """
+    return (
+        nodes.x[q] <= max(nodes.x[p], nodes.x[r])
+        and nodes.x[q] >= min(nodes.x[p], nodes.x[r])
+        and nodes.y[q] <= max(nodes.y[p], nodes.y[r])
+        and nodes.y[q] >= min(nodes.y[p], nodes.y[r])
+    )
+
+
+@numba.njit(cache=True)
+def _intersects(nodes, p1, q1, p2, q2):
+    """
+    Check if the segments p1-q1 and p2-q2 intersect.
+
+    """
+    o1 = _sign(_area(nodes, p1, q1, p2))
+    o2 = _sign(_area(nodes, p1, q1, q2))
+    o3 = _sign(_area(nodes, p2, q2, p1))
+    o4 = _sign(_area(nodes, p2, q2, q1))
+
+    if o1 != o2 and o3 != o4:
+        return True
+    if o1 == 0 and _on_segment(nodes, p1, p2, q1):
+        return True
+    if o2 == 0 and _on_segment(nodes, p1, q2, q1):
+        return True
+    if o3 == 0 and _on_segment(nodes, p2, p1, q2):
+        return True
+    if o4 == 0 and _on_segment(nodes, p2, q1, q2):
+        return True
+    return False
+
+
+@numba.njit(cache=True)
+def _intersects_polygon(nodes, a, b):
+    """
+    Check if a polygon diagonal intersects any polygon segments.
+
+    """
+    ia = nodes.i[a]
+    ib = nodes.i[b]
+    p = a
+    while True:
+        pn = nodes.next[p]
+        if (
+            nodes.i[p] != ia
+            and nodes.i[pn] != ia
+            and nodes.i[p] != ib
+            and nodes.i[pn] != ib
+            and _intersects(nodes, p, pn, a, b)
+        ):
+            return True
+        p = pn
+        if p == a:
+            break
+    return False
+
+
+@numba.njit(cache=True)
+def _locally_inside(nodes, a, b):
+    """
+    Check if a polygon diagonal is locally inside the polygon.
+
+    """
+    if _area(nodes, nodes.prev[a], a, nodes.next[a]) < 0:
+        return (
+            _area(nodes, a, b, nodes.next[a]) >= 0
+            and _area(nodes, a, nodes.prev[a], b) >= 0
+        )
+    return (
+        _area(nodes, a, b, nodes.prev[a]) < 0 or _area(nodes, a, nodes.next[a], b) < 0
+    )
+
+
+@numba.njit(cache=True)
+def _middle_inside(nodes, a, b):
+    """
+    Check if the middle point of a polygon diagonal is inside the polygon.
+
+    """
+    p = a
+    inside = False
+    px = (nodes.x[a] + nodes.x[b]) / 2
+    py = (nodes.y[a] + nodes.y[b]) / 2
+    while True:
+        pn = nodes.next[p]
+        if (
+            (nodes.y[p] > py) != (nodes.y[pn] > py)
+            and nodes.y[pn] != nodes.y[p]
+            and (
+                px
+                < (nodes.x[pn] - nodes.x[p])
+                * (py - nodes.y[p])
+                / (nodes.y[pn] - nodes.y[p])
+                + nodes.x[p]
+            )
+        ):
+            inside = not inside
+        p = pn
+        if p == a:
+            break
+    return inside
+
+
+@numba.njit(cache=True)
+def _is_valid_diagonal(nodes, a, b):
+    """
+    Check if a diagonal between two polygon nodes is valid (i.e. lies in the polygon
+    interior).
+
+    """
+    if nodes.i[nodes.next[a]] == nodes.i[b] or nodes.i[nodes.prev[a]] == nodes.i[b]:
+        return False
+    if _intersects_polygon(nodes, a, b):
+        return False
+
+    locally_visible = (
+        _locally_inside(nodes, a, b)
+        and _locally_inside(nodes, b, a)
+        and _middle_inside(nodes, a, b)
+        and (
+            _area(nodes, nodes.prev[a], a, nodes.prev[b]) != 0.0
+            or _area(nodes, a, nodes.prev[b], b) != 0.0
+        )
+    )
+    zero_length = (
+        _equals(nodes, a, b)
+        and _area(nodes, nodes.prev[a], a, nodes.next[a]) > 0
+        and _area(nodes, nodes.prev[b], b, nodes.next[b]) > 0
+    )
+    return locally_visible or zero_length
+
+
+@numba.njit(cache=True)
+def _split_polygon(nodes, a, b):
+    """
+    Link two polygon vertices with a bridge. If the vertices belong to the same ring, the
+    polygon is split into two. If one belongs to the outer ring and another to a hole, it
+    merges it into a single ring.
+
+    """
+    a2 = _new_node(nodes, nodes.i[a], nodes.x[a], nodes.y[a])
+    b2 = _new_node(nodes, nodes.i[b], nodes.x[b], nodes.y[b])
+    an = nodes.next[a]
+    bp = nodes.prev[b]
+
+    nodes.next[a] = b
+    nodes.prev[b] = a
+
+    nodes.next[a2] = an
+    nodes.prev[an] = a2
+
+    nodes.next[b2] = a2
+    nodes.prev[a2] = b2
+
+    nodes.next[bp] = b2
+    nodes.prev[b2] = bp
+
+    return b2
+
+
+@numba.njit(cache=True)
+def _get_leftmost(nodes, start):
+    p = start
+    leftmost = start
+    while True:
+        if nodes.x[p] < nodes.x[leftmost] or (
+            nodes.x[p] == nodes.x[leftmost] and nodes.y[p] < nodes.y[leftmost]
+        ):
+            leftmost = p
+        p = nodes.next[p]
+        if p == start:
+            break
+    return leftmost
+
+
+@numba.njit(cache=True)
+def _sector_contains_sector(nodes, m, p):
+    """
+    Check whether the sector in vertex m contains the sector in vertex p in the same
+    coordinates.
+
+    """
+    return (
+        _area(nodes, nodes.prev[m], m, nodes.prev[p]) < 0
+        and _area(nodes, nodes.next[p], m, nodes.next[m]) < 0
+    )
+
+
+@numba.njit(cache=True)
+def _find_hole_bridge(nodes, hole, outer):
+    """
+    David Eberly's algorithm for finding a bridge between a hole and the outer polygon.
+
+    """
+    p = outer
+    hx = nodes.x[hole]
+    hy = nodes.y[hole]
+    qx = -np.inf
+    m = NULL
+
+    # Find a segment intersected by a ray from the hole's leftmost point to the left.
+    # The segment's endpoint with lesser x will be the potential connection point.
+    while True:
+        pn = nodes.next[p]
+        if hy <= nodes.y[p] and hy >= nodes.y[pn] and nodes.y[pn] != nodes.y[p]:
+            x = nodes.x[p] + (hy - nodes.y[p]) * (nodes.x[pn] - nodes.x[p]) / (
+                nodes.y[pn] - nodes.y[p]
+            )
+            if x <= hx and x > qx:
+                qx = x
+                m = p if nodes.x[p] < nodes.x[pn] else pn
+                if x == hx:
+                    return m  # hole touches outer segment; pick leftmost endpoint
+        p = pn
+        if p == outer:
+            break
+
+    if m == NULL:
+        return NULL
+
+    # Look for points inside the triangle of the hole point, segment intersection and
+    # endpoint. If there are no points found, there is a valid connection. Otherwise,
+    # choose the point of the minimum angle with the ray as the connection point.
+    stop = m
+    mx = nodes.x[m]
+    my = nodes.y[m]
+    tan_min = np.inf
+    p = m
+    while True:
+        px = nodes.x[p]
+        py = nodes.y[p]
+        if (
+            hx >= px
+            and px >= mx
+            and hx != px
+            and _point_in_triangle(
+                hx if hy < my else qx, hy, mx, my, qx if hy < my else hx, hy, px, py
+            )
+        ):
+            tan = np.abs(hy - py) / (hx - px)
+            if _locally_inside(nodes, p, hole) and (
+                tan < tan_min
+                or (
+                    tan == tan_min
+                    and (px > nodes.x[m] or _sector_contains_sector(nodes, m, p))
+                )
+            ):
+                m = p
+                tan_min = tan
+        p = nodes.next[p]
+        if p == stop:
+            break
+
+    return m
+
+
+@numba.njit(cache=True)
+def _eliminate_hole(nodes, hole, outer):
+    bridge = _find_hole_bridge(nodes, hole, outer)
+    if bridge == NULL:
+        return outer
+
+    bridge_reverse = _split_polygon(nodes, bridge, hole)
+    _filter_points(nodes, bridge_reverse, nodes.next[bridge_reverse])
+    return _filter_points(nodes, bridge, nodes.next[bridge])
+
+
+@numba.njit(cache=True)
+def _eliminate_holes(nodes, coords, ring_offsets, ring_start, ring_end, outer):
+    """
+    Link every hole into the outer ring, producing a single-ring polygon without holes.
+
+    """
+    queue = np.empty(ring_end - ring_start - 1, dtype=np.int64)
+    n_queue = 0
+    for ring in range(ring_start + 1, ring_end):
+        hole = _linked_list(
+            nodes, coords, ring_offsets[ring], ring_offsets[ring + 1], False
+        )
+        if hole != NULL:
+            if hole == nodes.next[hole]:
+                nodes.steiner[hole] = True
+            queue[n_queue] = _get_leftmost(nodes, hole)
+            n_queue += 1
+
+    queue = queue[:n_queue]
+    order = np.argsort(nodes.x[queue], kind="mergesort")
+    for ii in order:
+        outer = _eliminate_hole(nodes, queue[ii], outer)
+
+    return outer
+
+
+@numba.njit(cache=True)
+def _cure_local_intersections(nodes, start, triangles, ntri):
+    """
+    Go through all polygon nodes and cure small local self-intersections.
+
+    """
+    p = start
+    while True:
+        a = nodes.prev[p]
+        b = nodes.next[nodes.next[p]]
+
+        if (
+            not _equals(nodes, a, b)
+            and _intersects(nodes, a, p, nodes.next[p], b)
+            and _locally_inside(nodes, a, b)
+            and _locally_inside(nodes, b, a)
+        ):
+            triangles[ntri, 0] = nodes.i[a]
+            triangles[ntri, 1] = nodes.i[p]
+            triangles[ntri, 2] = nodes.i[b]
+            ntri += 1
+
+            # Remove two nodes involved
+            _remove_node(nodes, p)
+            _remove_node(nodes, nodes.next[p])
+
+            p = start = b
+
+        p = nodes.next[p]
+        if p == start:
+            break
+
+    return _filter_points(nodes, p, NULL), ntri
+
+
+@numba.njit(cache=True)
+def _split_earcut(nodes, start):
+    """
+    Look for a valid diagonal that divides the polygon into two and return the start
+    nodes of both halves.
+
+    """
+    a = start
+    while True:
+        b = nodes.next[nodes.next[a]]
+        while b != nodes.prev[a]:
+            if nodes.i[a] != nodes.i[b] and _is_valid_diagonal(nodes, a, b):
+                c = _split_polygon(nodes, a, b)
+                # Filter collinear points around the cuts
+                a = _filter_points(nodes, a, nodes.next[a])
+                c = _filter_points(nodes, c, nodes.next[c])
+                return a, c
+            b = nodes.next[b]
+        a = nodes.next[a]
+        if a == start:
+            break
+    return NULL, NULL
+
+
+@numba.njit(cache=True)
+def _earcut_linked(nodes, ear, triangles, stack, hashing, minx, miny, inv_size):
+    """
+    Main ear slicing loop which triangulates a polygon given as a linked list. The
+    recursion of the reference implementation is replaced by a stack of (node, pass)
+    tasks which are processed in the same order.
+
+    """
+    ntri = 0
+    stack[0, 0] = ear
+    stack[0, 1] = 0
+    nstack = 1
+
+    while nstack > 0:
+        nstack -= 1
+        ear = stack[nstack, 0]
+        pass_ = stack[nstack, 1]
+
+        if ear == NULL:
+            continue
+
+        if pass_ == 0 and hashing:
+            _index_curve(nodes, ear, minx, miny, inv_size)
+
+        stop = ear
+        while nodes.prev[ear] != nodes.next[ear]:
+            prev = nodes.prev[ear]
+            next_ = nodes.next[ear]
+
+            if hashing:
+                is_ear = _is_ear_hashed(nodes, ear, minx, miny, inv_size)
+            else:
+                is_ear = _is_ear(nodes, ear)
+
+            if is_ear:
+                triangles[ntri, 0] = nodes.i[prev]
+                triangles[ntri, 1] = nodes.i[ear]
+                triangles[ntri, 2] = nodes.i[next_]
+                ntri += 1
+
+                _remove_node(nodes, ear)
+
+                # Skipping the next vertex leads to less sliver triangles
+                ear = nodes.next[next_]
+                stop = nodes.next[next_]
+                continue
+
+            ear = next_
+
+            # Looped through the whole remaining polygon and can't find any more ears
+            if ear == stop:
+                if pass_ == 0:
+                    # Try filtering points and slicing again
+                    stack[nstack, 0] = _filter_points(nodes, ear, NULL)
+                    stack[nstack, 1] = 1
+                    nstack += 1
+                elif pass_ == 1:
+                    # Try curing all small self-intersections locally
+                    ear, ntri = _cure_local_intersections(
+                        nodes, _filter_points(nodes, ear, NULL), triangles, ntri
+                    )
+                    stack[nstack, 0] = ear
+                    stack[nstack, 1] = 2
+                    nstack += 1
+                else:
+                    # As a last resort, try splitting the remaining polygon into two
+                    a, c = _split_earcut(nodes, ear)
+                    if a != NULL:
+                        stack[nstack, 0] = c
+                        stack[nstack, 1] = 0
+                        stack[nstack + 1, 0] = a
+                        stack[nstack + 1, 1] = 0
+                        nstack += 2
+                break
+
+    return ntri
+
+
+@numba.njit(cache=True)
+def earcut_polygon(coords, ring_offsets, ring_start, ring_end, nodes, stack, triangles):
+    """
+    Triangulate a single polygon in a ragged array of polygon coordinates.
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        Array of shape (n, 2) with the coordinates of all polygon rings.
+    ring_offsets : np.ndarray
+        Offsets of each ring in `coords`.
+    ring_start, ring_end : int
+        Index of the first and the last + 1 ring of the polygon in `ring_offsets`. The
+        first ring is the exterior, the remaining rings are holes.
+    nodes : _Nodes
+        Preallocated node workspace, see `triangle_capacity`.
+    stack : np.ndarray
+        Preallocated (capacity, 2) workspace for pending triangulation tasks.
+    triangles : np.ndarray
+        Output array of shape (m, 3) where the indices in `coords` of the triangle
+        corners are written to.
+
+    Returns
+    -------
+    int
+        The number of triangles written to `triangles`.
+
+    """
+    nodes.size[0] = 0
+
+    outer = _linked_list(
+        nodes, coords, ring_offsets[ring_start], ring_offsets[ring_start + 1], True
+    )
+    if outer == NULL or nodes.prev[outer] == nodes.next[outer]:
+        return 0
+
+    if ring_end - ring_start > 1:
+        outer = _eliminate_holes(
+            nodes, coords, ring_offsets, ring_start, ring_end, outer
+        )
+
+    # If the shape is not too simple, use a z-order curve hash for the ear checks
+    hashing = ring_offsets[ring_end] - ring_offsets[ring_start] > 80
+    minx = miny = inv_size = 0.0
+    if hashing:
+        minx = maxx = nodes.x[outer]
+        miny = maxy = nodes.y[outer]
+        p = nodes.next[outer]
+        while p != outer:
+            minx = min(minx, nodes.x[p])
+            miny = min(miny, nodes.y[p])
+            maxx = max(maxx, nodes.x[p])
+            maxy = max(maxy, nodes.y[p])
+            p = nodes.next[p]
+
+        inv_size = max(maxx - minx, maxy - miny)
+        inv_size = 32767.0 / inv_size if inv_size != 0.0 else 0.0
+
+    return _earcut_linked(nodes, outer, triangles, stack, hashing, minx, miny, inv_size)
+
+
+@numba.njit(cache=True)
+def triangle_capacity(ring_offsets, polygon_offsets):
+    """
+    Upper bound of the number of triangles that earcut returns for each polygon in a
+    ragged array. A (simple) polygon of n vertices and h holes results in n + 2h - 2
+    triangles. The number of coordinates per polygon includes the closing coordinate of
+    each ring, so n + 2h is a safe bound.
+
+    """
+    npolygons = len(polygon_offsets) - 1
+    capacity = np.zeros(npolygons, dtype=np.int64)
+    for ii in range(npolygons):
+        ring_start = polygon_offsets[ii]
+        ring_end = polygon_offsets[ii + 1]
+        if ring_end > ring_start:
+            ncoords = ring_offsets[ring_end] - ring_offsets[ring_start]
+            nholes = ring_end - ring_start - 1
+            capacity[ii] = ncoords + 2 * nholes
+    return capacity
+
+
+@numba.njit(nogil=True, cache=True)
+def earcut_polygons(
+    coords, ring_offsets, polygon_offsets, start, stop, triangle_offsets, triangles
+):
+    """
+    Triangulate the polygons start to stop in a ragged array of polygons and write the
+    triangles to preallocated output at precomputed offsets. Releases the GIL so ranges
+    of polygons can be processed concurrently.
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        Array of shape (n, 2) with the coordinates of all polygon rings.
+    ring_offsets : np.ndarray
+        Offsets of each ring in `coords`.
+    polygon_offsets : np.ndarray
+        Offsets of the rings of each polygon in `ring_offsets`.
+    start, stop : int
+        Range of polygons to triangulate.
+    triangle_offsets : np.ndarray
+        Offsets in `triangles` to write the result of each polygon to. The space for
+        each polygon must be at least the `triangle_capacity` of the polygon.
+    triangles : np.ndarray
+        Output array of shape (m, 3) for the indices in `coords` of triangle corners.
+
+    Returns
+    -------
+    np.ndarray
+        Number of triangles written for each polygon in the range.
+
+    """
+    capacity = triangle_capacity(ring_offsets, polygon_offsets[start : stop + 1])
+    node_capacity = 3 * (capacity.max() if len(capacity) > 0 else 0) + 3
+
+    nodes = _allocate_nodes(node_capacity)
+    stack = np.empty((node_capacity, 2), dtype=np.int64)
+
+    ntriangles = np.zeros(stop - start, dtype=np.int64)
+    for ii in range(start, stop):
+        ring_start = polygon_offsets[ii]
+        ring_end = polygon_offsets[ii + 1]
+        if ring_end == ring_start:
+            continue
+        out = triangles[triangle_offsets[ii] : triangle_offsets[ii + 1]]
+        ntriangles[ii - start] = earcut_polygon(
+            coords, ring_offsets, ring_start, ring_end, nodes, stack, out
+        )
+    return ntriangles
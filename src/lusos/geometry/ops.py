@@ -1,11 +1,30 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import NamedTuple
 
 import geopandas as gpd
-import mapbox_earcut as earcut
+import mapbox_earcut
 import numpy as np
 import shapely
 import xarray as xr
 import xugrid as xu
+from rasterio import features
+
+from lusos.geometry import clip, earcut
+from lusos.geometry.cache import (
+    TriangulationCache,
+    geometry_hash,
+    polygon_fingerprints,
+)
+from lusos.geometry.session import OverlapSession, active_session
+from lusos.lasso import LassoGrid
+
+# Approximate memory in bytes needed per polygon-cell overlap in tiled calculations.
+# Estimated from the arrays held per overlap at the peak of a tile: the result (cell
+# index, polygon index and area, 24 bytes), the triangle vertices and triangle index
+# (56 bytes), the rings of the clipped triangles (about 7 vertices of 16 bytes) and
+# the sort indices (16 bytes). The sum of about 210 bytes is rounded up to 256.
+OVERLAP_NBYTES = 256
 
 
 class PolygonGridArea(NamedTuple):
@@ -32,20 +51,496 @@ class PolygonGridArea(NamedTuple):
     polygon: np.ndarray
     area: np.ndarray
 
+    def compact(self) -> "PolygonGridArea":
+        """
+        Return a copy with int32 indices where the values fit and float32 areas, which
+        halves the memory use. The relative precision of float32 areas is about 6e-8,
+        e.g. about 4e-5 m2 (37.5 mm2) for a 25x25 m cell.
+
+        Returns
+        -------
+        PolygonGridArea
+
+        """
+        return PolygonGridArea(
+            _compact_index(self.cell_idx),
+            _compact_index(self.nitems),
+            _compact_index(self.polygon),
+            np.asarray(self.area, dtype=np.float32),
+        )
+
+
+class GridDefinition(NamedTuple):
+    """
+    Definition of a regular, axis-aligned grid with increasing x-coordinates and
+    decreasing y-coordinates. Cells are numbered row by row from the upper left corner.
+
+    Parameters
+    ----------
+    xmin, ymax : float
+        Coordinates of the upper left corner of the grid.
+    dx, dy : float
+        Absolute cellsize in x- and y-direction.
+    nx, ny : int
+        Number of columns and rows.
+
+    """
+
+    xmin: float
+    ymax: float
+    dx: float
+    dy: float
+    nx: int
+    ny: int
+
 
 class Triangles(NamedTuple):
+    """
+    Triangulation of polygons containing the indices of the triangle corners, the index
+    of the polygon each triangle belongs to and the coordinates of the polygon vertices.
+
+    Parameters
+    ----------
+    triangles : np.ndarray
+        Array of shape (n, 3) with the indices of the corners of each triangle in
+        `coords`.
+    index : np.ndarray
+        Positional index of the polygon each triangle belongs to.
+    coords : np.ndarray
+        Array of shape (m, 2) with the x and y coordinates of the polygon vertices.
+    """
+
+    triangles: np.ndarray
+    index: np.ndarray
+    coords: np.ndarray
+
+    def compact(self, grid: LassoGrid) -> "CompactTriangles":
+        """
+        Return a compact copy with int32 indices where the values fit and float32
+        coordinates relative to the lower left corner of a LassoGrid. Relative
+        coordinates are rounded to a float32 spacing of at most 2**-23 times the
+        distance to the origin: below 0.5 cm within 65 km, below 1 cm within 130 km and
+        below 4 cm for the full extent of the Netherlands. Use a grid of a smaller area
+        (e.g. a tile) for centimetre precision.
+
+        Parameters
+        ----------
+        grid : LassoGrid
+            LassoGrid instance with the origin to store the coordinates relative to.
+
+        Returns
+        -------
+        CompactTriangles
+
+        """
+        origin = np.array([grid.xmin, grid.ymin], dtype=np.float64)
+        return CompactTriangles(
+            _compact_index(self.triangles),
+            _compact_index(self.index),
+            (self.coords - origin).astype(np.float32),
+            origin,
+        )
+
+
+class CompactTriangles(NamedTuple):
+    """
+    Compact representation of :class:`Triangles` with int32 indices and float32
+    coordinates relative to an origin. See :meth:`Triangles.compact`.
+
+    Parameters
+    ----------
+    triangles : np.ndarray
+        Array of shape (n, 3) with the indices of the corners of each triangle in
+        `coords`.
+    index : np.ndarray
+        Positional index of the polygon each triangle belongs to.
+    coords : np.ndarray
+        Array of shape (m, 2) with the float32 x and y coordinates of the polygon
+        vertices relative to the origin.
+    origin : np.ndarray
+        Array with the x and y coordinate of the origin.
+
+    """
+
     triangles: np.ndarray
     index: np.ndarray
     coords: np.ndarray
+    origin: np.ndarray
+
+    def expand(self) -> Triangles:
+        """
+        Return the triangles with int64 indices and float64 absolute coordinates.
+
+        Returns
+        -------
+        Triangles
+
+        """
+        return Triangles(
+            self.triangles.astype(np.int64),
+            self.index.astype(np.int64),
+            self.coords.astype(np.float64) + self.origin,
+        )
+
+
+def _compact_index(array: np.ndarray) -> np.ndarray:
+    """
+    Helper function to downcast an integer array to int32 if all values fit.
+
+    """
+    array = np.asarray(array)
+    info = np.iinfo(np.int32)
+    if array.size == 0 or (array.min() >= info.min and array.max() <= info.max):
+        return array.astype(np.int32)
+    return array
+
+
+class SimplifiedPolygons(NamedTuple):
+    """
+    Result of `simplify_for_grid` containing the simplified polygons and the area error
+    introduced by the simplification.
+
+    Parameters
+    ----------
+    polygons : gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray
+        Simplified polygons of the same type as the input.
+    area_error : np.ndarray
+        Area of the symmetric difference between each input and simplified polygon.
+    max_area_error : float
+        Maximum area error of a single polygon.
+    total_area_error : float
+        Total area error of all polygons.
+
+    """
+
+    polygons: gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray
+    area_error: np.ndarray
+    max_area_error: float
+    total_area_error: float
+
+
+class RaggedPolygons(NamedTuple):
+    """
+    Polygons stored as a ragged array of coordinates and offsets, see
+    `shapely.to_ragged_array`.
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        Array of shape (n, 2) with the coordinates of all polygon rings.
+    ring_offsets : np.ndarray
+        Offsets of each ring in `coords`.
+    polygon_offsets : np.ndarray
+        Offsets of the rings of each polygon in `ring_offsets`.
+    parent : np.ndarray
+        Positional index of the input geometry each polygon belongs to. This differs from
+        the polygon number when the input contains MultiPolygons.
+    """
+
+    coords: np.ndarray
+    ring_offsets: np.ndarray
+    polygon_offsets: np.ndarray
+    parent: np.ndarray
+
+
+def _geometry_array(polygons: gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray):
+    """
+    Helper function to get the array of shapely geometries from GeoPandas objects.
+
+    """
+    if isinstance(polygons, gpd.GeoDataFrame):
+        polygons = polygons.geometry
+    if isinstance(polygons, gpd.GeoSeries):
+        polygons = polygons.values
+    return np.asarray(polygons)
+
+
+def explode_polygons(
+    polygons: gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Split multipart geometries into single part geometries without copying attribute
+    columns. Attributes can be mapped to the parts with the returned parent index, for
+    example `polygons["idx"].values[parent]`.
 
+    Parameters
+    ----------
+    polygons : gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray
+        Polygons to explode.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        Array with the single part geometries and an array with the position of the
+        input geometry of each part.
+
+    """
+    return shapely.get_parts(_geometry_array(polygons), return_index=True)
+
+
+def to_ragged_polygons(
+    polygons: gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray,
+) -> RaggedPolygons:
+    """
+    Convert (Multi)Polygon geometries to a ragged array of coordinates and offsets.
+    MultiPolygons are split into their parts, the `parent` array maps each part to the
+    position of its input geometry.
+
+    Parameters
+    ----------
+    polygons : gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray
+        Polygons to convert.
+
+    Returns
+    -------
+    RaggedPolygons
+
+    """
+    geometries = _geometry_array(polygons)
+    geom_type, coords, offsets = shapely.to_ragged_array(geometries)
+
+    if geom_type == shapely.GeometryType.POLYGON:
+        ring_offsets, polygon_offsets = offsets
+        parent = np.arange(len(polygon_offsets) - 1)
+    elif geom_type == shapely.GeometryType.MULTIPOLYGON:
+        ring_offsets, polygon_offsets, multipolygon_offsets = offsets
+        parent = np.repeat(np.arange(len(geometries)), np.diff(multipolygon_offsets))
+    else:
+        raise TypeError(f"Expected (Multi)Polygon geometries, got: {geom_type!r}")
+
+    return RaggedPolygons(
+        np.ascontiguousarray(coords, dtype=np.float64),
+        ring_offsets.astype(np.int64),
+        polygon_offsets.astype(np.int64),
+        parent,
+    )
+
+
+def simplify_for_grid(
+    polygons: gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray,
+    grid: LassoGrid,
+    fraction: float = 0.01,
+    coverage: bool = True,
+) -> SimplifiedPolygons:
+    """
+    Simplify polygons before calculating the overlap with a grid to reduce the number of
+    vertices, and thus triangles, in the overlap calculation. The tolerance of the
+    simplification is a fraction of the cellsize of the grid. By default, the polygons
+    are simplified as a coverage with `shapely.coverage_simplify`, so boundaries shared
+    by adjacent polygons are simplified identically and no gaps or overlaps between the
+    polygons are introduced.
+
+    Parameters
+    ----------
+    polygons : gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray
+        Polygons to simplify.
+    grid : LassoGrid
+        LassoGrid instance of the target grid to derive the tolerance from.
+    fraction : float, optional
+        Tolerance of the simplification as a fraction of the smallest cellsize of the
+        grid. The default is 0.01.
+    coverage : bool, optional
+        If True, simplify the polygons as a coverage which preserves the boundaries
+        shared by adjacent polygons, such as BGT objects or Soil Map areas. Overlapping
+        polygons are not a valid coverage and may not be simplified. If False, each
+        polygon is simplified independently with the Douglas-Peucker algorithm, which
+        keeps each polygon valid but can cause small gaps or overlaps between adjacent
+        polygons. The default is True.
+
+    Returns
+    -------
+    SimplifiedPolygons
+
+    """
+    if fraction < 0:
+        raise ValueError(f"fraction must be 0 or larger, got: {fraction}")
+
+    tolerance = fraction * min(abs(grid.xsize), abs(grid.ysize))
+    geometries = _geometry_array(polygons)
+    if coverage:
+        simplified = geometries.copy()
+        is_present = ~shapely.is_missing(geometries)
+        simplified[is_present] = shapely.coverage_simplify(
+            geometries[is_present], tolerance
+        )
+    else:
+        simplified = shapely.simplify(geometries, tolerance, preserve_topology=True)
+    area_error = shapely.area(shapely.symmetric_difference(geometries, simplified))
+
+    if isinstance(polygons, gpd.GeoDataFrame):
+        polygons = polygons.copy()
+        polygons[polygons.geometry.name] = simplified
+    elif isinstance(polygons, gpd.GeoSeries):
+        polygons = gpd.GeoSeries(simplified, index=polygons.index, crs=polygons.crs)
+    else:
+        polygons = simplified
+
+    max_error = area_error.max() if len(area_error) else 0.0
+    return SimplifiedPolygons(polygons, area_error, max_error, area_error.sum())
+
+
+def triangulate(
+    polygons: gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray,
+    engine: str = "batch",
+    n_workers: int = 1,
+    cache: TriangulationCache | bool = None,
+) -> Triangles:
+    """
+    Triangulate polygons with the earcut algorithm.
+
+    Parameters
+    ----------
+    polygons : gpd.GeoDataFrame | gpd.GeoSeries | np.ndarray
+        Polygons to triangulate.
+    engine : str, optional
+        Triangulation engine to use. The default is "batch" which triangulates all
+        polygons from a ragged array in a single compiled loop and also supports
+        MultiPolygons. Its first use compiles the loop, which is cached on disk for
+        later runs. The alternative "mapbox" triangulates each polygon separately with
+        `mapbox_earcut`. Both engines return the same triangles.
+    n_workers : int, optional
+        Number of threads to triangulate with when using the "batch" engine. The polygons
+        are partitioned over the threads which write the triangles into a single shared
+        output. Use -1 to use all available CPU cores. The default is 1.
+    cache : TriangulationCache | bool, optional
+        Cache to load the triangulation from if the same geometries were triangulated
+        before with the same engine, or to store the result in otherwise. Cached
+        arrays are returned as read-only memory maps. Use True for a cache in the
+        default location. The default is None, which does not use a cache.
 
-def triangulate(polygons: gpd.GeoDataFrame) -> Triangles:
+    Returns
+    -------
+    Triangles
+
+    """
+    if engine not in {"batch", "mapbox"}:
+        raise ValueError(f"Unknown triangulation engine: {engine!r}")
+
+    if cache is True:
+        cache = TriangulationCache()
+    if cache:
+        key = f"{engine}-{geometry_hash(polygons)}"
+        cached = cache.load(key)
+        if cached is not None:
+            return Triangles(**cached)
+
+    if engine == "batch":
+        tri = _triangulate_batch(polygons, n_workers)
+    else:
+        tri = _triangulate_mapbox(polygons)
+
+    if cache:
+        cache.save(key, **tri._asdict())
+    return tri
+
+
+def _triangulate_batch(polygons: gpd.GeoDataFrame, n_workers: int = 1) -> Triangles:
+    """
+    Helper function for triangulate to triangulate all polygons from a ragged array. With
+    multiple workers, each thread triangulates a contiguous range of polygons into the
+    preallocated output so the result is identical to a single thread.
+
+    """
+    ragged = to_ragged_polygons(polygons)
+
+    capacity = earcut.triangle_capacity(ragged.ring_offsets, ragged.polygon_offsets)
+    triangle_offsets = np.zeros(len(capacity) + 1, dtype=np.int64)
+    np.cumsum(capacity, out=triangle_offsets[1:])
+
+    triangles = np.empty((triangle_offsets[-1], 3), dtype=np.int64)
+
+    def triangulate_range(start, stop):
+        return earcut.earcut_polygons(
+            ragged.coords,
+            ragged.ring_offsets,
+            ragged.polygon_offsets,
+            start,
+            stop,
+            triangle_offsets,
+            triangles,
+        )
+
+    ntriangles = _run_partitioned(triangulate_range, capacity, n_workers)
+    ntriangles = np.concatenate(ntriangles)
+    return _compact_triangles(triangles, triangle_offsets, ntriangles, ragged)
+
+
+def _run_partitioned(func, weights: np.ndarray, n_workers: int) -> list:
+    """
+    Helper function to call func(start, stop) for contiguous ranges of items with an
+    equal amount of work in a thread pool. Returns the results in the order of the
+    ranges.
+
+    """
+    bounds = _partition_work(weights, n_workers)
+    if len(bounds) > 2:
+        with ThreadPoolExecutor(len(bounds) - 1) as pool:
+            return list(pool.map(func, bounds[:-1], bounds[1:]))
+    return [func(0, len(weights))]
+
+
+def _partition_work(weights: np.ndarray, n_workers: int) -> np.ndarray:
+    """
+    Partition items with an amount of work per item into contiguous ranges with an
+    approximately equal amount of work for each worker.
+
+    Parameters
+    ----------
+    weights : np.ndarray
+        Amount of work for each item (e.g. the number of coordinates per polygon).
+    n_workers : int
+        Number of workers to partition the work over. Use -1 for the number of
+        available CPU cores.
+
+    Returns
+    -------
+    np.ndarray
+        Bounds of the ranges where range i runs from bounds[i] to bounds[i + 1].
+
+    """
+    if n_workers == -1:
+        n_workers = os.cpu_count() or 1
+    if n_workers < 1:
+        raise ValueError(f"n_workers must be -1 or larger than 0, got: {n_workers}")
+
+    nitems = len(weights)
+    cumulative_work = np.cumsum(weights)
+    total_work = cumulative_work[-1] if nitems > 0 else 0
+    targets = total_work * np.arange(1, n_workers) / n_workers
+    bounds = np.searchsorted(cumulative_work, targets, side="right")
+    return np.unique(np.concatenate([[0], bounds, [nitems]]))
+
+
+def _compact_triangles(
+    triangles: np.ndarray,
+    triangle_offsets: np.ndarray,
+    ntriangles: np.ndarray,
+    ragged: RaggedPolygons,
+) -> Triangles:
+    """
+    Helper function to remove the unused space for each polygon from preallocated
+    triangle output.
+
+    """
+    polygon = np.repeat(np.arange(len(ntriangles)), ntriangles)
+    first = np.repeat(
+        triangle_offsets[:-1] - np.cumsum(ntriangles) + ntriangles, ntriangles
+    )
+    position = first + np.arange(len(polygon))
+    return Triangles(triangles[position], ragged.parent[polygon], ragged.coords)
+
+
+def _triangulate_mapbox(polygons: gpd.GeoDataFrame) -> Triangles:
+    """
+    Helper function for triangulate to triangulate each polygon with mapbox_earcut.
+
+    """
     triangles = []
     index = []
     coords = []
 
     increment = 0
-    for ii, polygon in enumerate(polygons["geometry"]):
+    for ii, polygon in enumerate(_geometry_array(polygons)):
         vertices = shapely.get_coordinates(polygon)
         n_vertices = len(vertices)
         interior_verts = shapely.get_num_coordinates(polygon.interiors)
@@ -58,7 +553,7 @@ def triangulate(polygons: gpd.GeoDataFrame) -> Triangles:
         else:
             vert_indices = [n_vertices]
 
-        connectivity = earcut.triangulate_float64(vertices, vert_indices)
+        connectivity = mapbox_earcut.triangulate_float64(vertices, vert_indices)
 
         triangles.append(connectivity + increment)
         coords.append(vertices)
@@ -72,9 +567,375 @@ def triangulate(polygons: gpd.GeoDataFrame) -> Triangles:
 
 
 def polygon_area_in_grid(
-    polygons: gpd.GeoDataFrame, grid: xr.DataArray
+    polygons: gpd.GeoDataFrame,
+    grid: xr.DataArray,
+    n_workers: int = 1,
+    engine: str = "xugrid",
+    tile_size: int = None,
+    memory_budget: int = None,
+    fast_path: bool = False,
+) -> PolygonGridArea:
+    """
+    Calculate the area of polygons in each cell of a regular grid.
+
+    Parameters
+    ----------
+    polygons : gpd.GeoDataFrame
+        Polygons to calculate the area for.
+    grid : xr.DataArray
+        2D DataArray of the target grid with dimensions ("y", "x").
+    n_workers : int, optional
+        Number of threads to use. Use -1 to use all available CPU cores. The default
+        is 1.
+    engine : str, optional
+        Engine to calculate the overlap with. The default is "xugrid" which triangulates
+        the polygons and calculates the overlap of the triangles with the grid using
+        `xugrid.OverlapRegridder`. The alternative "clip" calculates the exact area of
+        each polygon in each cell by clipping the polygons against the grid rows and
+        columns without triangulation. This results in a single entry per polygon in
+        each cell. The "structured" engine triangulates the polygons like "xugrid" but
+        clips each triangle directly against the cells in its bounding box, which avoids
+        building a celltree and an intermediate regridding Dataset. The "hybrid" engine
+        gives the same result as "clip" for polygons that do not overlap each other,
+        such as the BGT and soil map. Cells that are not crossed by any polygon boundary
+        get their full area assigned to the polygon rasterized in the cell and only the
+        cells crossed by boundaries are clipped. This reduces the work for large
+        polygons from their area to their perimeter.
+    tile_size, memory_budget : int, optional
+        Calculate the overlap per square tile of about `tile_size` rows and columns, or
+        of a size estimated to fit within `memory_budget` bytes, to limit the peak
+        memory of intermediate results such as triangles. The results of the tiles are stitched
+        together. See :func:`iter_polygon_area_in_grid` to process the results per tile
+        instead. The default is None, which processes the whole grid at once.
+    fast_path : bool, optional
+        If True, polygons with a bounding box within a single grid cell are assigned
+        their full area in that cell directly and only the remaining polygons are passed
+        to the overlap engine. This results in a single entry for each of these polygons.
+        The default is False.
+
+    Returns
+    -------
+    PolygonGridArea
+
+    Notes
+    -----
+    Within an active :class:`~lusos.geometry.session.OverlapSession`, the overlap of
+    polygons that were calculated before for the same grid, engine and `fast_path` is
+    reused and only the remaining polygons are passed to the engine.
+
+    """
+    if tile_size is not None or memory_budget is not None:
+        tiles = iter_polygon_area_in_grid(
+            polygons, grid, tile_size, memory_budget, n_workers, engine, fast_path
+        )
+        return _concat_areas(list(tiles), grid.size)
+
+    session = active_session()
+    if session is not None:
+        return _session_area_in_grid(
+            session, polygons, grid, n_workers, engine, fast_path
+        )
+    return _engine_area_in_grid(polygons, grid, n_workers, engine, fast_path)
+
+
+def _engine_area_in_grid(
+    polygons: gpd.GeoDataFrame,
+    grid: xr.DataArray,
+    n_workers: int,
+    engine: str,
+    fast_path: bool,
+) -> PolygonGridArea:
+    """
+    Helper function for polygon_area_in_grid to calculate the overlap with an engine.
+
+    """
+    if fast_path:
+        return _fast_path_area_in_grid(polygons, grid, n_workers, engine)
+
+    if engine == "xugrid":
+        return _xugrid_area_in_grid(polygons, grid, n_workers)
+    elif engine == "clip":
+        return _clip_area_in_grid(polygons, grid, n_workers)
+    elif engine == "structured":
+        return _structured_area_in_grid(polygons, grid, n_workers)
+    elif engine == "hybrid":
+        return _hybrid_area_in_grid(polygons, grid, n_workers)
+    else:
+        raise ValueError(f"Unknown overlap engine: {engine!r}")
+
+
+def iter_polygon_area_in_grid(
+    polygons: gpd.GeoDataFrame,
+    grid: xr.DataArray,
+    tile_size: int = None,
+    memory_budget: int = None,
+    n_workers: int = 1,
+    engine: str = "xugrid",
+    fast_path: bool = False,
+):
+    """
+    Calculate the area of polygons in each cell of a regular grid per tile of the grid.
+    For each tile, the polygons intersecting the tile are selected with a spatial index
+    and clipped to the tile before calculating the overlap, so only the results of a
+    single tile are held in memory at a time.
+
+    Parameters
+    ----------
+    polygons : gpd.GeoDataFrame
+        Polygons to calculate the area for.
+    grid : xr.DataArray
+        2D DataArray of the target grid with dimensions ("y", "x").
+    tile_size : int, optional
+        Approximate number of rows and columns of each tile. The grid is split into
+        tiles of balanced size of at least 2 rows and columns. If neither `tile_size`
+        nor `memory_budget` is given, the whole grid is processed as a single tile.
+    memory_budget : int, optional
+        Approximate memory in bytes available for the calculation of a single tile. The
+        tile size is estimated from the number of polygon vertices per cell. Ignored if
+        `tile_size` is given.
+    n_workers : int, optional
+        Number of threads to use. Use -1 to use all available CPU cores. The default
+        is 1.
+    engine : str, optional
+        Engine to calculate the overlap with. See :func:`polygon_area_in_grid`. The
+        default is "xugrid".
+    fast_path : bool, optional
+        Assign polygons within a single grid cell directly. See
+        :func:`polygon_area_in_grid`. The default is False.
+
+    Yields
+    ------
+    PolygonGridArea
+        Areas in the cells of a tile. Cell indices refer to the full grid and polygon
+        indices to the input polygons. Tiles without any polygons are skipped.
+
+    """
+    if engine not in {"xugrid", "clip", "structured", "hybrid"}:
+        raise ValueError(f"Unknown overlap engine: {engine!r}")
+
+    if tile_size is None and memory_budget is None:
+        yield polygon_area_in_grid(
+            polygons, grid, n_workers, engine, fast_path=fast_path
+        )
+        return
+
+    geometries = _geometry_array(polygons)
+    if tile_size is None:
+        tile_size = _tile_size_for_budget(geometries, grid.size, memory_budget)
+    elif tile_size < 1:
+        raise ValueError(f"tile_size must be larger than 0, got: {tile_size}")
+
+    definition = _grid_definition(grid)
+    tree = shapely.STRtree(geometries)
+    row_edges = _tile_edges(definition.ny, tile_size)
+    col_edges = _tile_edges(definition.nx, tile_size)
+    for row, row_end in zip(row_edges[:-1], row_edges[1:]):
+        for col, col_end in zip(col_edges[:-1], col_edges[1:]):
+            rows, cols = slice(row, row_end), slice(col, col_end)
+            bounds = _tile_bounds(definition, rows, cols)
+            selection = tree.query(shapely.box(*bounds), predicate="intersects")
+            area = _tile_area_in_grid(
+                geometries,
+                selection,
+                grid.isel(y=rows, x=cols),
+                bounds,
+                n_workers,
+                engine,
+                fast_path,
+            )
+            if area is None:
+                continue
+
+            tile_row, tile_col = np.divmod(area.cell_idx, col_end - col)
+            cell_idx = (row + tile_row) * definition.nx + col + tile_col
+            yield area._replace(cell_idx=cell_idx)
+
+
+def _tile_area_in_grid(
+    geometries: np.ndarray,
+    selection: np.ndarray,
+    tile: xr.DataArray,
+    bounds: tuple,
+    n_workers: int = 1,
+    engine: str = "xugrid",
+    fast_path: bool = False,
+) -> PolygonGridArea | None:
+    """
+    Helper function to calculate the area of the selected polygons in a tile of a grid.
+    Cell indices refer to the tile and polygon indices to the input geometries. Returns
+    None if none of the polygons intersect the tile.
+
+    """
+    selection = np.sort(selection)
+    parts, parent = _clip_to_tile(geometries[selection], bounds)
+    if len(parts) == 0:
+        return None
+
+    area = polygon_area_in_grid(parts, tile, n_workers, engine, fast_path=fast_path)
+    return area._replace(polygon=selection[parent[area.polygon]])
+
+
+def _tile_bounds(grid: GridDefinition, rows: slice, cols: slice) -> tuple:
+    """
+    Helper function to calculate the bounds (xmin, ymin, xmax, ymax) of a tile of rows
+    and columns in a grid.
+
+    """
+    return (
+        grid.xmin + cols.start * grid.dx,
+        grid.ymax - rows.stop * grid.dy,
+        grid.xmin + cols.stop * grid.dx,
+        grid.ymax - rows.start * grid.dy,
+    )
+
+
+def _session_area_in_grid(
+    session: OverlapSession,
+    polygons: gpd.GeoDataFrame,
+    grid: xr.DataArray,
+    n_workers: int,
+    engine: str,
+    fast_path: bool,
 ) -> PolygonGridArea:
-    tri = triangulate(polygons)
+    """
+    Helper function for polygon_area_in_grid to reuse the overlaps stored in a session
+    and calculate and store the overlap of polygons that are not in the session yet.
+
+    """
+    geometries = _geometry_array(polygons)
+    fingerprints = polygon_fingerprints(geometries)
+    key = (_grid_definition(grid), engine, fast_path)
+    found, cells, polygon, area = session.lookup(key, fingerprints)
+
+    missing = np.flatnonzero(~found)
+    if len(missing) > 0:
+        result = _engine_area_in_grid(
+            geometries[missing], grid, n_workers, engine, fast_path
+        )
+        result_cells = np.repeat(result.cell_idx, result.nitems)
+        session.store(
+            key, fingerprints[missing], result_cells, result.polygon, result.area
+        )
+        cells = np.concatenate([cells, result_cells])
+        polygon = np.concatenate([polygon, missing[result.polygon]])
+        area = np.concatenate([area, result.area])
+
+    return _sort_by_cell(cells, polygon, area, grid.size)
+
+
+def _fast_path_area_in_grid(
+    polygons: gpd.GeoDataFrame, grid: xr.DataArray, n_workers: int, engine: str
+) -> PolygonGridArea:
+    """
+    Helper function for polygon_area_in_grid to assign polygons within a single grid
+    cell directly and calculate the overlap of the remaining polygons with the engine.
+
+    """
+    geometries = _geometry_array(polygons)
+    contained, cells = _single_cell_polygons(geometries, _grid_definition(grid))
+    contained_area = PolygonGridArea(
+        cells,
+        np.ones(len(cells), dtype=np.int64),
+        contained,
+        shapely.area(geometries)[contained],
+    )
+
+    remaining = np.setdiff1d(np.arange(len(geometries)), contained)
+    if len(remaining) == 0:
+        return _concat_areas([contained_area], grid.size)
+
+    area = _engine_area_in_grid(geometries[remaining], grid, n_workers, engine, False)
+    area = area._replace(polygon=remaining[area.polygon])
+    return _concat_areas([contained_area, area], grid.size)
+
+
+def _single_cell_polygons(geometries: np.ndarray, grid: GridDefinition) -> tuple:
+    """
+    Helper function to find the polygons with a bounding box within a single grid cell.
+    Returns the indices of these polygons and the cells they are in.
+
+    """
+    xmin, ymin, xmax, ymax = shapely.bounds(geometries).T
+    col = np.floor((xmin - grid.xmin) / grid.dx)
+    row = np.floor((grid.ymax - ymax) / grid.dy)
+    contained = (
+        (col >= 0)
+        & (col < grid.nx)
+        & (row >= 0)
+        & (row < grid.ny)
+        & (xmax <= grid.xmin + (col + 1) * grid.dx)
+        & (ymin >= grid.ymax - (row + 1) * grid.dy)
+    )
+    cells = row[contained] * grid.nx + col[contained]
+    return np.flatnonzero(contained), cells.astype(np.int64)
+
+
+def _concat_areas(areas: list[PolygonGridArea], ncells: int) -> PolygonGridArea:
+    """
+    Helper function to combine PolygonGridArea results for the same grid into a single
+    PolygonGridArea ordered by cell.
+
+    """
+    if not areas:
+        empty = np.array([], dtype=np.int64)
+        return PolygonGridArea(empty, empty, empty, np.array([], dtype=np.float64))
+
+    cells = np.concatenate([np.repeat(a.cell_idx, a.nitems) for a in areas])
+    polygon = np.concatenate([a.polygon for a in areas])
+    area = np.concatenate([a.area for a in areas])
+    return _sort_by_cell(cells, polygon, area, ncells)
+
+
+def _tile_edges(ncells: int, tile_size: int) -> np.ndarray:
+    """
+    Helper function to split an axis of ncells into tiles of about tile_size cells, so
+    the tiles of a grid have about tile_size rows and columns. The tiles have a balanced
+    size of at least 2 cells so the cellsize of each tile can be derived from its
+    coordinates.
+
+    """
+    ntiles = max(min(-(-ncells // tile_size), ncells // 2), 1)
+    return np.linspace(0, ncells, ntiles + 1).round().astype(int)
+
+
+def _clip_to_tile(geometries: np.ndarray, bounds: tuple) -> tuple:
+    """
+    Helper function to clip polygons to the bounds of a tile. Returns the polygonal parts
+    of the clipped geometries and the index of the input geometry of each part.
+
+    """
+    clipped = shapely.clip_by_rect(geometries, *bounds)
+    parts, parent = shapely.get_parts(clipped, return_index=True)
+    is_polygon = (shapely.get_type_id(parts) == 3) & (shapely.area(parts) > 0)
+    return parts[is_polygon], parent[is_polygon]
+
+
+def _tile_size_for_budget(
+    geometries: np.ndarray, ncells: int, memory_budget: int, cell_nbytes: int = 0
+) -> int:
+    """
+    Helper function to estimate the number of rows and columns of a square tile for
+    which the overlap calculation fits within a memory budget. Each polygon vertex
+    adds roughly one polygon-cell overlap, which takes about OVERLAP_NBYTES including
+    the intermediate triangles and clipped rings. cell_nbytes is the memory of the
+    results of each cell, for example of a dense array with a value for each layer.
+
+    """
+    ncoords = shapely.get_num_coordinates(geometries).sum()
+    overlaps_per_cell = 1 + ncoords / max(ncells, 1)
+    tile_cells = memory_budget / (OVERLAP_NBYTES * overlaps_per_cell + cell_nbytes)
+    return max(int(np.sqrt(tile_cells)), 1)
+
+
+def _xugrid_area_in_grid(
+    polygons: gpd.GeoDataFrame, grid: xr.DataArray, n_workers: int
+) -> PolygonGridArea:
+    """
+    Helper function for polygon_area_in_grid to calculate the overlap of triangulated
+    polygons with the grid with `xugrid.OverlapRegridder`.
+
+    """
+    tri = triangulate(polygons, n_workers=n_workers)
 
     ugrid = xu.Ugrid2d(*tri.coords.T, -1, tri.triangles)
     regridder = xu.OverlapRegridder(source=ugrid, target=grid)
@@ -91,6 +952,155 @@ def polygon_area_in_grid(
     return PolygonGridArea(cell_idx, nitems, tri.index[polygon_idx], area)
 
 
+def _clip_area_in_grid(
+    polygons: gpd.GeoDataFrame,
+    grid: xr.DataArray,
+    n_workers: int,
+    skip: np.ndarray = None,
+) -> PolygonGridArea:
+    """
+    Helper function for polygon_area_in_grid to calculate the overlap by clipping the
+    polygons against the grid rows and columns, except for the cells in the skip mask.
+
+    """
+    if skip is None:
+        skip = np.empty(0, dtype=bool)
+
+    ragged = to_ragged_polygons(polygons)
+    xmin, ymax, dx, dy, nx, ny = _grid_definition(grid)
+
+    def clip_range(start, stop):
+        return clip.clip_polygons(
+            ragged.coords,
+            ragged.ring_offsets,
+            ragged.polygon_offsets,
+            start,
+            stop,
+            xmin,
+            ymax,
+            dx,
+            dy,
+            nx,
+            ny,
+            skip,
+        )
+
+    ncoords = np.diff(ragged.ring_offsets[ragged.polygon_offsets])
+    cells, polygon, area = zip(*_run_partitioned(clip_range, ncoords, n_workers))
+    cells, polygon, area = map(np.concatenate, (cells, polygon, area))
+    return _sort_by_cell(cells, ragged.parent[polygon], area, nx * ny)
+
+
+def _hybrid_area_in_grid(
+    polygons: gpd.GeoDataFrame, grid: xr.DataArray, n_workers: int
+) -> PolygonGridArea:
+    """
+    Helper function for polygon_area_in_grid to assign the full cell area to cells that
+    are not crossed by any polygon boundary by rasterizing the polygons and to clip the
+    polygons only in the cells crossed by boundaries. Cells covered by more than one
+    overlapping polygon are also clipped, because the rasterized polygon ids only hold
+    one polygon per cell.
+
+    """
+    geometries = _geometry_array(polygons)
+    is_valid = ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+    valid = np.flatnonzero(is_valid)
+    transform = grid.rio.transform()
+
+    polygon_ids = features.rasterize(
+        shapes=zip(geometries[valid], valid),
+        out_shape=grid.shape,
+        transform=transform,
+        fill=-1,
+        dtype="int32",
+    )
+    npolygons = features.rasterize(
+        shapes=geometries[valid],
+        out_shape=grid.shape,
+        transform=transform,
+        default_value=1,
+        fill=0,
+        merge_alg=features.MergeAlg.add,
+        dtype="int32",
+    )
+    boundary = features.rasterize(
+        shapes=shapely.boundary(geometries[valid]),
+        out_shape=grid.shape,
+        transform=transform,
+        default_value=1,
+        all_touched=True,
+        dtype="uint8",
+    )
+    interior = ((npolygons == 1) & (boundary == 0)).ravel()
+
+    boundary_area = _clip_area_in_grid(polygons, grid, n_workers, skip=interior)
+
+    cells = np.flatnonzero(interior)
+    dx, dy = grid.rio.resolution()
+    interior_area = PolygonGridArea(
+        cells,
+        np.ones(len(cells), dtype=np.int64),
+        polygon_ids.ravel()[cells].astype(np.int64),
+        np.full(len(cells), abs(dx * dy)),
+    )
+    return _concat_areas([boundary_area, interior_area], grid.size)
+
+
+def _structured_area_in_grid(
+    polygons: gpd.GeoDataFrame, grid: xr.DataArray, n_workers: int
+) -> PolygonGridArea:
+    """
+    Helper function for polygon_area_in_grid to calculate the overlap of triangulated
+    polygons with the grid by clipping each triangle against the cells in its bounding
+    box.
+
+    """
+    tri = triangulate(polygons, n_workers=n_workers)
+    xmin, ymax, dx, dy, nx, ny = _grid_definition(grid)
+
+    def clip_range(start, stop):
+        return clip.clip_triangles(
+            tri.coords, tri.triangles, start, stop, xmin, ymax, dx, dy, nx, ny
+        )
+
+    weights = np.ones(len(tri.triangles))
+    cells, triangle, area = zip(*_run_partitioned(clip_range, weights, n_workers))
+    cells, triangle, area = map(np.concatenate, (cells, triangle, area))
+    return _sort_by_cell(cells, tri.index[triangle], area, nx * ny)
+
+
+def _grid_definition(grid: xr.DataArray) -> GridDefinition:
+    """
+    Helper function to get the GridDefinition of a DataArray grid.
+
+    """
+    xmin, _, _, ymax = grid.rio.bounds()
+    dx, dy = grid.rio.resolution()
+    if dx < 0 or dy > 0:
+        raise ValueError(
+            "Grid must have increasing x-coordinates and decreasing y-coordinates."
+        )
+    return GridDefinition(
+        float(xmin),
+        float(ymax),
+        float(dx),
+        float(-dy),
+        grid.sizes["x"],
+        grid.sizes["y"],
+    )
+
+
+def _sort_by_cell(
+    cells: np.ndarray, polygon: np.ndarray, area: np.ndarray, ncells: int
+) -> PolygonGridArea:
+    """
+    Helper function to create a PolygonGridArea from unordered polygon-cell entries.
+
+    """
+    cell_idx, nitems, order = clip.cell_csr(cells, ncells)
+    return PolygonGridArea(cell_idx, nitems, polygon[order], area[order])
+
+
 def triangles_to_geodataframe(triangles: Triangles) -> gpd.GeoDataFrame:
     return gpd.GeoDataFrame(
         geometry=shapely.polygons(triangles.coords[triangles.triangles]), crs=28992
@@ -0,0 +1,249 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import NamedTuple
+
+import numpy as np
+
+_ACTIVE_SESSION = ContextVar("overlap_session", default=None)
+
+
+class SessionInfo(NamedTuple):
+    """
+    Summary of the contents and use of an :class:`OverlapSession`.
+
+    Parameters
+    ----------
+    nkeys : int
+        Number of combinations of grid, engine and options with stored overlaps.
+    npolygons : int
+        Number of polygons with stored overlaps.
+    hits : int
+        Number of polygons for which a stored overlap was reused.
+    misses : int
+        Number of polygons for which the overlap was calculated.
+
+    """
+
+    nkeys: int
+    npolygons: int
+    hits: int
+    misses: int
+
+
+class _StoredOverlaps(NamedTuple):
+    """
+    Overlaps of polygons with a grid grouped per polygon fingerprint. The entries of
+    fingerprint i are at offsets[i]:offsets[i + 1] of cells and area.
+
+    """
+
+    fingerprints: np.ndarray
+    offsets: np.ndarray
+    cells: np.ndarray
+    area: np.ndarray
+
+
+class OverlapSession:
+    """
+    Memoize the overlap of polygons with grid cells within a run. While a session is
+    active, :func:`~lusos.geometry.ops.polygon_area_in_grid` stores the overlap of each
+    polygon by its fingerprint (see :func:`~lusos.geometry.cache.polygon_fingerprints`)
+    and reuses it when the same geometry is overlapped with the same grid again, using
+    the same engine and options. Only the polygons that were not seen before are
+    passed to the overlap engine. The session applies to the context (thread) it is
+    entered in and to the chunks of a lazy
+    :func:`~lusos.area_statistics.calc_areal_percentage_in_cells` result created
+    within it, also when the chunks are computed after the session is exited.
+
+    Examples
+    --------
+    Share the overlap of SOMERS parcels that are also in the BGT "percelen" layer:
+
+    >>> with OverlapSession() as session:
+    ...     coverage = bgt_soilmap_coverage(bgt, soilmap, grid)
+    ...     flux = calculate_somers_emissions(somers, grid)
+    >>> session.info()
+    SessionInfo(nkeys=1, npolygons=..., hits=..., misses=...)
+
+    """
+
+    def __init__(self):
+        self._overlaps = {}
+        self._tokens = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.info()})"
+
+    def __enter__(self) -> "OverlapSession":
+        self._tokens.append(_ACTIVE_SESSION.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        _ACTIVE_SESSION.reset(self._tokens.pop())
+
+    def lookup(self, key: tuple, fingerprints: np.ndarray) -> tuple:
+        """
+        Find the stored overlaps of polygons.
+
+        Parameters
+        ----------
+        key : tuple
+            Key of the grid, engine and options the overlaps are calculated with.
+        fingerprints : np.ndarray
+            Fingerprints of the polygons to find.
+
+        Returns
+        -------
+        tuple
+            Boolean array indicating which polygons were found and the cell indices,
+            polygon positions in `fingerprints` and areas of the stored overlaps.
+
+        """
+        with self._lock:
+            stored = self._overlaps.get(key, _empty_overlaps())
+        found = np.zeros(len(fingerprints), dtype=bool)
+        pos = np.searchsorted(stored.fingerprints, fingerprints)
+        inside = pos < len(stored.fingerprints)
+        found[inside] = stored.fingerprints[pos[inside]] == fingerprints[inside]
+
+        entries, counts = _group_entries(stored, pos[found])
+        polygon = np.repeat(np.flatnonzero(found), counts)
+
+        nfound = int(found.sum())
+        with self._lock:
+            self.hits += nfound
+            self.misses += len(fingerprints) - nfound
+        return found, stored.cells[entries], polygon, stored.area[entries]
+
+    def store(
+        self,
+        key: tuple,
+        fingerprints: np.ndarray,
+        cells: np.ndarray,
+        polygon: np.ndarray,
+        area: np.ndarray,
+    ):
+        """
+        Store the overlaps of polygons.
+
+        Parameters
+        ----------
+        key : tuple
+            Key of the grid, engine and options the overlaps are calculated with.
+        fingerprints : np.ndarray
+            Fingerprints of the polygons.
+        cells, polygon, area : np.ndarray
+            Cell index, position of the polygon in `fingerprints` and area of each
+            overlap.
+
+        """
+        order = np.argsort(polygon, kind="stable")
+        counts = np.bincount(polygon, minlength=len(fingerprints))
+        new = _StoredOverlaps(
+            fingerprints,
+            np.concatenate([[0], np.cumsum(counts)]),
+            cells[order].astype(np.int64),
+            area[order].astype(np.float64),
+        )
+
+        with self._lock:
+            stored = self._overlaps.get(key, _empty_overlaps())
+            self._overlaps[key] = _merge(stored, new)
+
+    def info(self) -> SessionInfo:
+        """
+        Summary of the stored overlaps and the number of reused polygons.
+
+        Returns
+        -------
+        SessionInfo
+
+        """
+        npolygons = sum(len(o.fingerprints) for o in self._overlaps.values())
+        return SessionInfo(len(self._overlaps), npolygons, self.hits, self.misses)
+
+    def clear(self):
+        """
+        Remove all stored overlaps and reset the counts.
+
+        """
+        with self._lock:
+            self._overlaps.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def active_session() -> OverlapSession | None:
+    """
+    Return the :class:`OverlapSession` that is active in the current context, or None.
+
+    """
+    return _ACTIVE_SESSION.get()
+
+
+@contextmanager
+def _activate(session: OverlapSession | None):
+    """
+    Helper function to make a session active in the current context, for example in a
+    worker thread that computes a chunk of a lazy result created within the session.
+
+    """
+    token = _ACTIVE_SESSION.set(session)
+    try:
+        yield session
+    finally:
+        _ACTIVE_SESSION.reset(token)
+
+
+def _empty_overlaps() -> _StoredOverlaps:
+    """
+    Helper function to create an empty set of stored overlaps.
+
+    """
+    return _StoredOverlaps(
+        np.array([], dtype="S16"),
+        np.zeros(1, dtype=np.int64),
+        np.array([], dtype=np.int64),
+        np.array([], dtype=np.float64),
+    )
+
+
+def _group_entries(stored: _StoredOverlaps, idx: np.ndarray) -> tuple:
+    """
+    Helper function to get the entry positions of the stored fingerprints at idx and
+    the number of entries of each fingerprint.
+
+    """
+    starts = stored.offsets[idx]
+    counts = stored.offsets[idx + 1] - starts
+    group_starts = np.cumsum(counts) - counts
+    entries = np.repeat(starts - group_starts, counts) + np.arange(counts.sum())
+    return entries, counts
+
+
+def _merge(*overlaps: _StoredOverlaps) -> _StoredOverlaps:
+    """
+    Helper function to combine stored overlaps into a single set sorted by fingerprint.
+    Only the first occurrence of a duplicate fingerprint is kept.
+
+    """
+    counts = np.concatenate([np.diff(o.offsets) for o in overlaps])
+    combined = _StoredOverlaps(
+        np.concatenate([o.fingerprints for o in overlaps]),
+        np.concatenate([[0], np.cumsum(counts)]),
+        np.concatenate([o.cells for o in overlaps]),
+        np.concatenate([o.area for o in overlaps]),
+    )
+
+    fingerprints, first = np.unique(combined.fingerprints, return_index=True)
+    entries, counts = _group_entries(combined, first)
+    return _StoredOverlaps(
+        fingerprints,
+        np.concatenate([[0], np.cumsum(counts)]),
+        combined.cells[entries],
+        combined.area[entries],
+    )
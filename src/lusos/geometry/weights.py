@@ -0,0 +1,256 @@
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import xarray as xr
+from scipy import sparse
+
+from lusos.geometry.cache import geometry_hash
+from lusos.geometry.ops import (
+    GridDefinition,
+    PolygonGridArea,
+    _grid_definition,
+    polygon_area_in_grid,
+)
+
+
+class OverlapWeights:
+    """
+    Sparse cell x polygon matrix with the area of each polygon in each cell of a regular
+    grid. The weights can be calculated once for a set of polygons and a grid, stored to
+    disk and re-applied to any attribute of the polygons, for example the emissions of
+    different SOMERS scenarios for the same parcels.
+
+    Parameters
+    ----------
+    area : PolygonGridArea
+        Area of the polygons in the cells of the grid.
+    grid : GridDefinition
+        Definition of the grid the areas are calculated for.
+    npolygons : int
+        Number of polygons the areas are calculated for.
+    geometry_hash : str, optional
+        Content hash of the polygons the areas are calculated for. See
+        :func:`~lusos.geometry.cache.geometry_hash`. The default is None.
+
+    Examples
+    --------
+    Calculate the weights once and apply to the emissions of different scenarios:
+
+    >>> weights = OverlapWeights.from_polygons(parcels, grid.dataarray())
+    >>> weights.save("parcel_weights.npz")
+    >>> weights = OverlapWeights.load("parcel_weights.npz")
+    >>> flux = weights.apply(scenario["flux_m2"].values, normalize=True)
+
+    """
+
+    def __init__(
+        self,
+        area: PolygonGridArea,
+        grid: GridDefinition,
+        npolygons: int,
+        geometry_hash: str = None,
+    ):
+        self.area = area
+        self.grid = grid
+        self.npolygons = npolygons
+        self.geometry_hash = geometry_hash
+
+    def __repr__(self):
+        name = self.__class__.__name__
+        return f"{name}(shape={self.shape}, nnz={len(self.area.area)})"
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """
+        Shape (ncells, npolygons) of the weight matrix.
+
+        """
+        return self.grid.nx * self.grid.ny, self.npolygons
+
+    @classmethod
+    def from_polygons(
+        cls, polygons: gpd.GeoDataFrame, grid: xr.DataArray, **kwargs
+    ) -> "OverlapWeights":
+        """
+        Calculate the overlap weights of polygons with a grid.
+
+        Parameters
+        ----------
+        polygons : gpd.GeoDataFrame
+            Polygons to calculate the weights for.
+        grid : xr.DataArray
+            2D DataArray of the target grid with dimensions ("y", "x").
+        **kwargs
+            Keyword arguments for :func:`~lusos.geometry.ops.polygon_area_in_grid`.
+
+        Returns
+        -------
+        OverlapWeights
+
+        """
+        area = polygon_area_in_grid(polygons, grid, **kwargs)
+        return cls(area, _grid_definition(grid), len(polygons), geometry_hash(polygons))
+
+    @classmethod
+    def from_scipy(
+        cls,
+        matrix: sparse.sparray | sparse.spmatrix,
+        grid: GridDefinition,
+        geometry_hash: str = None,
+    ) -> "OverlapWeights":
+        """
+        Create overlap weights from a SciPy sparse matrix with shape (ncells, npolygons).
+
+        Parameters
+        ----------
+        matrix : sparse.sparray | sparse.spmatrix
+            Sparse matrix with the area of each polygon (columns) in each cell (rows).
+        grid : GridDefinition
+            Definition of the grid the matrix is calculated for.
+        geometry_hash : str, optional
+            Content hash of the polygons the matrix is calculated for. The default is
+            None.
+
+        Returns
+        -------
+        OverlapWeights
+
+        """
+        ncells, npolygons = matrix.shape
+        if ncells != grid.nx * grid.ny:
+            raise ValueError(
+                f"Number of matrix rows ({ncells}) does not match the number of grid "
+                f"cells ({grid.nx * grid.ny})."
+            )
+
+        matrix = sparse.csr_array(matrix)
+        nitems = np.diff(matrix.indptr)
+        cell_idx = np.flatnonzero(nitems)
+        area = PolygonGridArea(
+            cell_idx,
+            nitems[cell_idx].astype(np.int64),
+            matrix.indices.astype(np.int64),
+            matrix.data.astype(np.float64),
+        )
+        return cls(area, grid, npolygons, geometry_hash)
+
+    def to_scipy(self) -> sparse.csr_array:
+        """
+        Convert to a SciPy sparse CSR array with shape (ncells, npolygons). Duplicate
+        entries for the same polygon in a cell are summed.
+
+        Returns
+        -------
+        sparse.csr_array
+
+        """
+        indptr = np.zeros(self.shape[0] + 1, dtype=np.int64)
+        indptr[self.area.cell_idx + 1] = self.area.nitems
+        np.cumsum(indptr, out=indptr)
+
+        # Copy, the areas may be read-only and SciPy sorts the indices in place
+        data = np.array(self.area.area, dtype=np.float64)
+        indices = np.array(self.area.polygon, dtype=np.int64)
+        matrix = sparse.csr_array((data, indices, indptr), shape=self.shape)
+        matrix.sum_duplicates()
+        return matrix
+
+    def apply(self, values: np.ndarray, normalize: bool = False) -> np.ndarray:
+        """
+        Apply the weights to an attribute of the polygons as a sparse matrix-vector
+        product.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            1D array with a value for each polygon.
+        normalize : bool, optional
+            If True, divide the result by the total area of the polygons in each cell
+            to get the area-weighted average value. Cells without polygons are NaN. The
+            default is False, which returns the area-weighted sum of the values.
+
+        Returns
+        -------
+        np.ndarray
+            2D array with shape (ny, nx) with the result for each cell.
+
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape != (self.npolygons,):
+            raise ValueError(
+                f"Expected a value for each of the {self.npolygons} polygons, got "
+                f"array of shape {values.shape}."
+            )
+
+        cells = np.repeat(self.area.cell_idx, self.area.nitems)
+        weighted = self.area.area * values[self.area.polygon]
+        result = np.bincount(cells, weighted, minlength=self.shape[0])
+
+        if normalize:
+            total = np.bincount(cells, self.area.area, minlength=self.shape[0])
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result = np.where(total > 0, result / total, np.nan)
+
+        return result.reshape(self.grid.ny, self.grid.nx)
+
+    def matches(self, polygons: gpd.GeoDataFrame) -> bool:
+        """
+        Check if the weights were calculated for the same polygons using the geometry
+        hash.
+
+        Parameters
+        ----------
+        polygons : gpd.GeoDataFrame
+            Polygons to check.
+
+        Returns
+        -------
+        bool
+
+        """
+        return self.geometry_hash == geometry_hash(polygons)
+
+    def save(self, path: str | Path):
+        """
+        Save the weights to an uncompressed binary `.npz` file, including the grid
+        definition and geometry hash.
+
+        Parameters
+        ----------
+        path : str | Path
+            Path to save the weights to.
+
+        """
+        np.savez(
+            path,
+            cell_idx=self.area.cell_idx,
+            nitems=self.area.nitems,
+            polygon=self.area.polygon,
+            area=self.area.area,
+            grid=np.array(self.grid[:4], dtype=np.float64),
+            shape=np.array([self.grid.ny, self.grid.nx, self.npolygons]),
+            geometry_hash=np.array(self.geometry_hash or ""),
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "OverlapWeights":
+        """
+        Load weights saved with :meth:`OverlapWeights.save`.
+
+        Parameters
+        ----------
+        path : str | Path
+            Path to the `.npz` file.
+
+        Returns
+        -------
+        OverlapWeights
+
+        """
+        with np.load(path, allow_pickle=False) as f:
+            area = PolygonGridArea(f["cell_idx"], f["nitems"], f["polygon"], f["area"])
+            ny, nx, npolygons = (int(n) for n in f["shape"])
+            grid = GridDefinition(*(float(v) for v in f["grid"]), nx, ny)
+            hash_ = str(f["geometry_hash"]) or None
+        return cls(area, grid, npolygons, hash_)
@@ -1,7 +1,11 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 
 BGT_LAYERS_FOR_LUSOS = {
     "pand_polygon": "bgt_functie",
@@ -81,26 +85,25 @@ BGT_MAPPING = {
 }
 
 
-def _read_layers(bgt_gpkg: str | Path, layers: dict):
+def _read_layer(bgt_gpkg: str | Path, layer: str, column: str) -> gpd.GeoDataFrame:
     """
-    Helper function for combine_bgt_layers to read the BGT layers and add the required
-    information for LULUCF. Returns a generator with GeoDataFrames for each layer.
+    Helper function for combine_bgt_layers to read a single BGT layer with the Arrow
+    interface of pyogrio, reading only the column with the BGT type and the geometry.
 
     """
-    for layer in layers:
-        print(f"Read layer: {layer}")
-        layer_gdf = gpd.read_file(
-            bgt_gpkg, layer=layer, columns=[layers[layer], "geometry"]
-        )
-        layer_gdf.rename(columns={layers[layer]: "bgt_type"}, inplace=True)
-        layer_gdf["layer"] = layer.replace("_polygon", "")
-        yield layer_gdf
+    layer_gdf = gpd.read_file(
+        bgt_gpkg, layer=layer, columns=[column], engine="pyogrio", use_arrow=True
+    )
+    return layer_gdf.rename(columns={column: "bgt_type"})
 
 
-def combine_bgt_layers(bgt_gpkg: str | Path, layers: dict = None) -> gpd.GeoDataFrame:
+def combine_bgt_layers(
+    bgt_gpkg: str | Path, layers: dict = None, n_workers: int = None
+) -> gpd.GeoDataFrame:
     """
     Combine layers from a BGT (Basisregistratie Grootschalige Topografie) geopackage into
-    a single GeoDataFrame.
+    a single GeoDataFrame. The layers are read concurrently and the "layer" and
+    "bgt_type" columns are stored as categoricals.
 
     Parameters
     ----------
@@ -108,30 +111,75 @@ def combine_bgt_layers(bgt_gpkg: str | Path, layers: dict = None) -> gpd.GeoData
         Path to the geopackage (.gpkg file) to combine the layers from.
     layers : dict
         Layers in the geopackage to combine.
+    n_workers : int, optional
+        Number of threads to read the layers with. Use -1 to read all layers at once.
+        The default is None, which uses one thread per layer up to the number of CPU
+        cores.
 
     Returns
     -------
     gpd.GeoDataFrame
         GeoDataFrame of the combined layers.
 
+    Raises
+    ------
+    ValueError
+        If `layers` is empty or `n_workers` is invalid.
+
     """
     if layers is None:
         layers = BGT_LAYERS_FOR_LUSOS
-    combined = pd.concat(_read_layers(bgt_gpkg, layers), ignore_index=True)
-    return combined
-
-
-def group_bgt_units(bgt: gpd.GeoDataFrame):
+    if len(layers) == 0:
+        raise ValueError("No layers given to combine.")
+    if n_workers is None:
+        n_workers = min(len(layers), os.cpu_count() or 1)
+    elif n_workers == -1:
+        n_workers = len(layers)
+    if n_workers < 1:
+        raise ValueError(f"n_workers must be -1 or larger than 0, got: {n_workers}")
+
+    with ThreadPoolExecutor(n_workers) as pool:
+        futures = {
+            pool.submit(_read_layer, bgt_gpkg, layer, column): layer
+            for layer, column in layers.items()
+        }
+        # Report progress from the main thread as each layer is read
+        for future in as_completed(futures):
+            future.result()
+            print(f"Read layer: {futures[future]}")
+    layer_gdfs = [future.result() for future in futures]
+
+    bgt_type = union_categoricals(
+        [gdf["bgt_type"].astype("string").astype("category") for gdf in layer_gdfs]
+    )
+    layer = pd.Categorical.from_codes(
+        np.repeat(np.arange(len(layers)), [len(gdf) for gdf in layer_gdfs]),
+        categories=[layer.replace("_polygon", "") for layer in layers],
+    )
+    geometry = np.concatenate([gdf.geometry.values for gdf in layer_gdfs])
+    crs = layer_gdfs[0].crs
+    return gpd.GeoDataFrame(
+        {"bgt_type": bgt_type, "layer": layer}, geometry=geometry, crs=crs
+    )
+
+
+def group_bgt_units(bgt: gpd.GeoDataFrame, units: list = None):
     """
     Add a column to the BGT GeoDataFrame containing main BGT groups based on the ids of
     the combined IDs of the "layer" and "bgt_type" columns in the BGT geodataframe. The
     main groups will be the "layer" dimension in the DataArray to calculate areal
-    statistics with.
+    statistics with. The "layer" and "bgt_type" columns are converted to categoricals
+    and the category codes are mapped to the groups in a single pass with a lookup
+    table.
 
     Parameters
     ----------
     bgt : gpd.GeoDataFrame
         GeoDataFrame containing the BGT data and relevant information.
+    units : list, optional
+        Ordered list of main BGT groups. If given, an integer column "idx" is added with
+        the position of the group of each row in `units`, or -1 if the row could not be
+        grouped or the group is not in `units`. The default is None.
 
     Returns
     -------
@@ -139,11 +187,52 @@ def group_bgt_units(bgt: gpd.GeoDataFrame):
         GeoDataFrame of the BGT data with the added column.
 
     """
-    bgt["bgt_type"] = bgt["bgt_type"].fillna("")
-    combined_layers = bgt["layer"] + "_" + bgt["bgt_type"]
-
-    for group in set(BGT_MAPPING.values()):
-        units = [key for key in BGT_MAPPING.keys() if BGT_MAPPING[key] == group]
-        bgt.loc[combined_layers.isin(units), "layer"] = group
+    bgt_type = bgt["bgt_type"]
+    if (
+        isinstance(bgt_type.dtype, pd.CategoricalDtype)
+        and "" not in bgt_type.cat.categories
+    ):
+        bgt_type = bgt_type.cat.add_categories("")
+    bgt["bgt_type"] = bgt_type.fillna("")
+
+    layers = bgt["layer"].astype("category")
+    bgt_types = bgt["bgt_type"].astype("category")
+
+    groups = np.array(sorted(set(BGT_MAPPING.values())), dtype=object)
+    lookup = _bgt_lookup_table(
+        layers.cat.categories, bgt_types.cat.categories, list(groups)
+    )
+    # Missing values have category code -1, which selects the last row or column of -1
+    codes = lookup[layers.cat.codes.to_numpy(), bgt_types.cat.codes.to_numpy()]
+
+    is_grouped = codes >= 0
+    bgt["layer"] = np.where(is_grouped, groups[codes], bgt["layer"].to_numpy())
+
+    if units is not None:
+        unit_idx = np.array([units.index(g) if g in units else -1 for g in groups])
+        bgt["idx"] = np.where(is_grouped, unit_idx[codes], -1)
 
     return bgt
+
+
+def _bgt_lookup_table(
+    layers: pd.Index, bgt_types: pd.Index, groups: list
+) -> np.ndarray:
+    """
+    Helper function for group_bgt_units to create a lookup table with the index of the
+    main BGT group for each combination of "layer" and "bgt_type" categories. The table
+    has an additional row and column of -1 for missing values. Layers that are already
+    a main group keep their group, so grouping is idempotent.
+
+    """
+    lookup = np.full((len(layers) + 1, len(bgt_types) + 1), -1, dtype=np.int64)
+    for i, layer in enumerate(layers):
+        if layer in groups:
+            lookup[i, :] = groups.index(layer)
+
+    for unit, group in BGT_MAPPING.items():
+        layer, bgt_type = unit.split("_", 1)
+        i, j = layers.get_indexer([layer])[0], bgt_types.get_indexer([bgt_type])[0]
+        if i >= 0 and j >= 0:
+            lookup[i, j] = groups.index(group)
+    return lookup
@@ -1,4 +1,5 @@
 import geopandas as gpd
+import numpy as np
 
 # Below ID's for main groups are based on SOMERS
 PEAT_IDS = [
@@ -90,18 +91,33 @@ BURIED_DEEP_IDS = [
 ]
 
 
-def group_soilmap_units(soilmap: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+SOILMAP_GROUPS = {
+    "peat": PEAT_IDS,
+    "moerig": MOER_IDS,
+    "buried": BURIED_IDS,
+    "buried_deep": BURIED_DEEP_IDS,
+}
+
+
+def group_soilmap_units(
+    soilmap: gpd.GeoDataFrame, units: list = None
+) -> gpd.GeoDataFrame:
     """
     Add a column to the soilmap GeoDataFrame containing main soil groups (i.e. "peat",
     "moerig", "buried" and "buried_deep") based on the ids of the soil units in the BRO
     soilmap. All rows that cannot be included in any of the main groups will be dropped
     from the result. The main groups will be the "layer" dimension in the DataArray to
-    calculate areal statistics with.
+    calculate areal statistics with. The soil unit codes are converted to a categorical
+    and the category codes are mapped to the groups with a single lookup array.
 
     Parameters
     ----------
     soilmap : gpd.GeoDataFrame
         GeoDataFrame containing the BRO soilmap and relevant information.
+    units : list, optional
+        Ordered list of main soil groups. If given, an integer column "idx" is added
+        with the position of the group of each row in `units`, or -1 if the group is
+        not in `units`. The default is None.
 
     Returns
     -------
@@ -109,10 +125,21 @@ def group_soilmap_units(soilmap: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
         GeoDataFrame of the BRO soilmap with the added column.
 
     """
-    id_ = "soilunit_code"
-    soilmap.loc[soilmap[id_].isin(PEAT_IDS), "layer"] = "peat"
-    soilmap.loc[soilmap[id_].isin(MOER_IDS), "layer"] = "moerig"
-    soilmap.loc[soilmap[id_].isin(BURIED_IDS), "layer"] = "buried"
-    soilmap.loc[soilmap[id_].isin(BURIED_DEEP_IDS), "layer"] = "buried_deep"
+    codes = soilmap["soilunit_code"].astype("category")
+    categories = codes.cat.categories
+
+    # Missing values have category code -1, which selects the last element of -1
+    lookup = np.full(len(categories) + 1, -1, dtype=np.int64)
+    for i, ids in enumerate(SOILMAP_GROUPS.values()):
+        idx = categories.get_indexer(ids)
+        lookup[idx[idx >= 0]] = i
+    group = lookup[codes.cat.codes.to_numpy()]
+
+    groups = np.array(list(SOILMAP_GROUPS), dtype=object)
+    soilmap["layer"] = np.where(group >= 0, groups[group], None)
+
+    if units is not None:
+        unit_idx = np.array([units.index(g) if g in units else -1 for g in groups])
+        soilmap["idx"] = np.where(group >= 0, unit_idx[group], -1)
 
-    return soilmap[soilmap["layer"].notna()]
+    return soilmap[group >= 0]
@@ -5,7 +5,9 @@ from lusos.validation import validate_somers
 
 
 @validate_somers
-def calc_somers_emission_per_m2(somers: gpd.GeoDataFrame) -> pd.Series:
+def calc_somers_emission_per_m2(
+    somers: gpd.GeoDataFrame, columns: str | list[str] = "median"
+) -> pd.Series | pd.DataFrame:
     """
     Divide median emission factor (EF; ton/ha) by parcel area to calculate EF per m2.
     The input GeoDataFrame must have a column "median" present.
@@ -14,12 +16,15 @@ def calc_somers_emission_per_m2(somers: gpd.GeoDataFrame) -> pd.Series:
     ----------
     somers : gpd.GeoDataFrame
         Input SOMERS data with emission factors in ton/ha.
+    columns : str | list[str], optional
+        Column or list of columns with emission factors (e.g. percentiles) to convert.
+        The default is "median".
 
     Returns
     -------
-    pd.Series
-        Pandas Series with EF per m2.
+    pd.Series | pd.DataFrame
+        Pandas Series with EF per m2, or a DataFrame for a list of columns.
 
     """
     to_m2 = 10_000
-    return somers["median"] / to_m2
+    return somers[columns] / to_m2
@@ -0,0 +1,245 @@
+from typing import TypeVar
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy import sparse
+
+LassoGrid = TypeVar("LassoGrid")
+
+
+class SparseLayerGrid:
+    """
+    Sparse 3D grid with dimensions ("y", "x", "layer") stored as a CSR cell x layer
+    matrix. Only the layers that occur in a cell are stored, which is much smaller
+    than a dense 3D array when most cells only contain a few of the layers. Reductions
+    over the layers and multiplication by a factor per layer work without densifying.
+
+    Parameters
+    ----------
+    matrix : sparse.csr_array
+        Sparse matrix with shape (ncells, nlayers) where cell = row * nx + col.
+    grid : LassoGrid
+        LassoGrid instance of the 2D grid the matrix is calculated for.
+    layers : list
+        Coordinates of the "layer" dimension.
+
+    Examples
+    --------
+    Calculate the areal percentages of the BGT units and the weighted emission factor
+    in each cell:
+
+    >>> area = calc_areal_percentage_in_cells(bgt, grid, units, sparse=True)
+    >>> area.sum()  # Total percentage covered in each cell
+    >>> area.dot(emission_factors)  # Emission factor per unit as a pd.Series
+
+    """
+
+    def __init__(self, matrix: sparse.csr_array, grid: LassoGrid, layers: list):
+        ny, nx = len(grid.ycoordinates()), len(grid.xcoordinates())
+        if matrix.shape != (ny * nx, len(layers)):
+            raise ValueError(
+                f"Matrix of shape {matrix.shape} does not match the grid and layers "
+                f"({ny * nx}, {len(layers)})."
+            )
+        self.matrix = sparse.csr_array(matrix)
+        self.grid = grid
+        self.layers = list(layers)
+
+    def __repr__(self):
+        name = self.__class__.__name__
+        return f"{name}(shape={self.shape}, nnz={self.matrix.nnz})"
+
+    def __mul__(self, other: float) -> "SparseLayerGrid":
+        return self.__class__(self.matrix * other, self.grid, self.layers)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other: float) -> "SparseLayerGrid":
+        return self.__class__(self.matrix / other, self.grid, self.layers)
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        """
+        Shape (ny, nx, nlayers) of the dense grid.
+
+        """
+        ny, nx = len(self.grid.ycoordinates()), len(self.grid.xcoordinates())
+        return ny, nx, len(self.layers)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Number of bytes used by the sparse matrix.
+
+        """
+        matrix = self.matrix
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+    @classmethod
+    def from_coo(
+        cls,
+        cells: np.ndarray,
+        layer_idx: np.ndarray,
+        values: np.ndarray,
+        grid: LassoGrid,
+        layers: list,
+    ) -> "SparseLayerGrid":
+        """
+        Create a sparse grid from cell indices, layer indices and values. Values for
+        duplicate combinations of cell and layer are summed.
+
+        Parameters
+        ----------
+        cells : np.ndarray
+            1D array with the flat cell index (row * nx + col) of each value.
+        layer_idx : np.ndarray
+            1D array with the layer index of each value.
+        values : np.ndarray
+            1D array with the values.
+        grid : LassoGrid
+            LassoGrid instance of the 2D grid.
+        layers : list
+            Coordinates of the "layer" dimension.
+
+        Returns
+        -------
+        SparseLayerGrid
+
+        """
+        ny, nx = len(grid.ycoordinates()), len(grid.xcoordinates())
+        matrix = sparse.coo_array(
+            (values, (cells, layer_idx)), shape=(ny * nx, len(layers))
+        ).tocsr()
+        matrix.sum_duplicates()
+        return cls(matrix, grid, layers)
+
+    @classmethod
+    def from_dataarray(cls, da: xr.DataArray, grid: LassoGrid) -> "SparseLayerGrid":
+        """
+        Create a sparse grid from a dense 3D DataArray with dimensions ("y", "x",
+        "layer"). Zero and NaN values are not stored.
+
+        Parameters
+        ----------
+        da : xr.DataArray
+            3D DataArray to convert.
+        grid : LassoGrid
+            LassoGrid instance of the 2D grid of the DataArray.
+
+        Returns
+        -------
+        SparseLayerGrid
+
+        """
+        da = da.transpose("y", "x", "layer")
+        ny, nx, nlayers = da.shape
+        values = np.nan_to_num(da.values.reshape(ny * nx, nlayers))
+        return cls(sparse.csr_array(values), grid, da["layer"].values)
+
+    def to_dataarray(self) -> xr.DataArray:
+        """
+        Convert to a dense 3D DataArray with dimensions ("y", "x", "layer").
+
+        Returns
+        -------
+        xr.DataArray
+
+        """
+        dense = self.matrix.toarray().reshape(self.shape)
+        return self.grid.empty_array(self.layers, False).copy(data=dense)
+
+    def sel(self, layer) -> xr.DataArray:
+        """
+        Select a single layer as a dense 2D DataArray.
+
+        Parameters
+        ----------
+        layer
+            Coordinate of the layer to select.
+
+        Returns
+        -------
+        xr.DataArray
+
+        """
+        column = self.matrix[:, [self.layers.index(layer)]].toarray()
+        return self._to_grid(column)
+
+    def sum(self) -> xr.DataArray:
+        """
+        Sum the values over the layers.
+
+        Returns
+        -------
+        xr.DataArray
+            2D DataArray with the sum in each cell.
+
+        """
+        return self._to_grid(self.matrix.sum(axis=1))
+
+    def dot(self, factors: np.ndarray | pd.Series | xr.DataArray) -> xr.DataArray:
+        """
+        Sum of the values multiplied by a factor per layer in each cell, for example the
+        weighted emission factor based on the areal percentage of each unit.
+
+        Parameters
+        ----------
+        factors : np.ndarray | pd.Series | xr.DataArray
+            Factor per layer. A pd.Series or xr.DataArray is aligned with the layers by
+            its index or "layer" coordinate, otherwise the order of the layers is used.
+
+        Returns
+        -------
+        xr.DataArray
+            2D DataArray with the result in each cell.
+
+        """
+        return self._to_grid(self.matrix @ self._layer_factors(factors))
+
+    def multiply(
+        self, factors: np.ndarray | pd.Series | xr.DataArray
+    ) -> "SparseLayerGrid":
+        """
+        Multiply the values with a factor per layer and keep the layers.
+
+        Parameters
+        ----------
+        factors : np.ndarray | pd.Series | xr.DataArray
+            Factor per layer. See :meth:`SparseLayerGrid.dot`.
+
+        Returns
+        -------
+        SparseLayerGrid
+
+        """
+        matrix = self.matrix.copy()
+        matrix.data = matrix.data * self._layer_factors(factors)[matrix.indices]
+        return self.__class__(matrix, self.grid, self.layers)
+
+    def _layer_factors(self, factors) -> np.ndarray:
+        """
+        Helper function to align factors with the layers.
+
+        """
+        if isinstance(factors, xr.DataArray):
+            factors = factors.sel(layer=self.layers).values
+        elif isinstance(factors, pd.Series):
+            factors = factors.loc[self.layers].values
+
+        factors = np.asarray(factors, dtype=np.float64)
+        if factors.shape != (len(self.layers),):
+            raise ValueError(
+                f"Expected a factor for each of the {len(self.layers)} layers, got "
+                f"array of shape {factors.shape}."
+            )
+        return factors
+
+    def _to_grid(self, values: np.ndarray) -> xr.DataArray:
+        """
+        Helper function to reshape values per cell to a 2D DataArray.
+
+        """
+        ny, nx, _ = self.shape
+        values = np.asarray(values, dtype=np.float64).reshape(ny, nx)
+        return self.grid.dataarray(np.nan).copy(data=values)
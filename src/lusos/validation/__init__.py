@@ -1,2 +1,2 @@
 from .validate import validate_somers
-from .validators import LassoValidator
+from .validators import LassoValidator, NestedGridValidator
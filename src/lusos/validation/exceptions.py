@@ -6,3 +6,8 @@ class InvalidLassoError(Exception):
 class InvalidBoundsError(Exception):
     def __init__(self, message):
         self.message = message
+
+
+class InvalidNestingError(Exception):
+    def __init__(self, message, errors=None):
+        self.message = f"{message}\n{'\n'.join(errors)}"
@@ -9,7 +9,7 @@ def validate_somers(func):
     """
 
     @wraps(func)
-    def wrapper(gdf):
+    def wrapper(gdf, *args, **kwargs):
         expected_columns = ["parcel_id", "median"]
         missing_columns = [c for c in expected_columns if c not in gdf.columns]
         if missing_columns:
@@ -22,6 +22,6 @@ def validate_somers(func):
                 "this crs in calculations with area. This may impact the results."
             )
 
-        return func(gdf)
+        return func(gdf, *args, **kwargs)
 
     return wrapper
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 
-from .exceptions import InvalidBoundsError, InvalidLassoError
+from .exceptions import InvalidBoundsError, InvalidLassoError, InvalidNestingError
 
 
 class AbstractValidator(ABC):
@@ -40,3 +40,44 @@ class LassoValidator(AbstractValidator):
             raise InvalidBoundsError(
                 f"Invalid bounds with ymin >= ymax, {ymin=}, {ymax=}"
             )
+
+
+class NestedGridValidator(AbstractValidator):
+    def validate(self, grid, coarse_grid):
+        errors = []
+        xsize, ysize = grid.xsize, abs(grid.ysize)
+        coarse_xsize, coarse_ysize = coarse_grid.xsize, abs(coarse_grid.ysize)
+
+        if not self._is_multiple(coarse_xsize, xsize):
+            errors.append(
+                f"Coarse xsize is not a multiple of the fine xsize, {coarse_xsize=}, "
+                f"{xsize=}"
+            )
+        if not self._is_multiple(coarse_ysize, ysize):
+            errors.append(
+                f"Coarse ysize is not a multiple of the fine ysize, {coarse_ysize=}, "
+                f"{ysize=}"
+            )
+        if not (
+            self._is_multiple(coarse_grid.xmin - grid.xmin, xsize)
+            and self._is_multiple(grid.ymax - coarse_grid.ymax, ysize)
+        ):
+            errors.append("Coarse grid cells are not aligned with the fine grid cells")
+
+        coarse_xmax = coarse_grid.xmin + len(coarse_grid.xcoordinates()) * coarse_xsize
+        coarse_ymin = coarse_grid.ymax - len(coarse_grid.ycoordinates()) * coarse_ysize
+        if (
+            coarse_grid.xmin < grid.xmin
+            or coarse_grid.ymax > grid.ymax
+            or coarse_xmax > grid.xmin + len(grid.xcoordinates()) * xsize
+            or coarse_ymin < grid.ymax - len(grid.ycoordinates()) * ysize
+        ):
+            errors.append("Coarse grid extends beyond the fine grid")
+
+        if errors:
+            raise InvalidNestingError("Coarse grid does not nest in the grid:", errors)
+
+    @staticmethod
+    def _is_multiple(value: int | float, size: int | float) -> bool:
+        ratio = value / size
+        return ratio >= 0 and abs(ratio - round(ratio)) < 1e-9
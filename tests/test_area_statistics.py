@@ -1,15 +1,25 @@
+import dask.array as da
 import numpy as np
 import pytest
-from numpy.testing import assert_array_almost_equal, assert_array_equal
+from numpy.testing import (
+    assert_allclose,
+    assert_array_almost_equal,
+    assert_array_equal,
+)
 
 from lusos.area_statistics import (
     _weighted_average,
     area_to_grid3d,
     calc_areal_percentage_in_cells,
+    coarsen_to_grid,
+    flux_to_grid,
 )
 from lusos.constants import MAIN_BGT_UNITS
-from lusos.geometry.ops import PolygonGridArea
+from lusos.geometry.ops import PolygonGridArea, polygon_area_in_grid
+from lusos.lasso import LassoGrid
+from lusos.sparse_grid import SparseLayerGrid
 from lusos.utils import _add_layer_idx_column
+from lusos.validation.exceptions import InvalidNestingError
 
 
 @pytest.fixture
@@ -66,6 +76,61 @@ def test_calc_areal_percentage_in_cells(grouped_bgt, lasso_grid):
     assert_array_almost_equal(result[3, 2], [0.1, 0, 0, 0, 0.9, 0, 0, 0, 0])
 
 
+@pytest.mark.unittest
+def test_calc_areal_percentage_in_cells_tiled(grouped_bgt, lasso_grid):
+    expected = calc_areal_percentage_in_cells(grouped_bgt, lasso_grid, MAIN_BGT_UNITS)
+    result = calc_areal_percentage_in_cells(
+        grouped_bgt, lasso_grid, MAIN_BGT_UNITS, engine="clip", tile_size=2
+    )
+    assert_array_almost_equal(result, expected)
+
+
+@pytest.mark.unittest
+def test_calc_areal_percentage_in_cells_sparse(grouped_bgt, lasso_grid):
+    expected = calc_areal_percentage_in_cells(grouped_bgt, lasso_grid, MAIN_BGT_UNITS)
+    result = calc_areal_percentage_in_cells(
+        grouped_bgt, lasso_grid, MAIN_BGT_UNITS, tile_size=2, sparse=True
+    )
+    assert isinstance(result, SparseLayerGrid)
+    assert result.shape == expected.shape
+    assert result.matrix.nnz == (expected > 0).sum()
+    assert_array_almost_equal(result.to_dataarray(), expected)
+
+
+@pytest.mark.unittest
+def test_calc_areal_percentage_in_cells_lazy(grouped_bgt, lasso_grid):
+    expected = calc_areal_percentage_in_cells(grouped_bgt, lasso_grid, MAIN_BGT_UNITS)
+    result = calc_areal_percentage_in_cells(
+        grouped_bgt, lasso_grid, MAIN_BGT_UNITS, tile_size=2, lazy=True
+    )
+    assert isinstance(result.data, da.Array)
+    assert result.chunks == ((2, 2), (2, 2), (9,))
+    assert_array_almost_equal(result.compute(), expected)
+
+    with pytest.raises(ValueError, match="cannot be combined"):
+        calc_areal_percentage_in_cells(
+            grouped_bgt, lasso_grid, MAIN_BGT_UNITS, sparse=True, lazy=True
+        )
+
+
+@pytest.mark.unittest
+def test_coarsen_to_grid(lasso_grid):
+    da = lasso_grid.dataarray(1.0).copy(data=np.arange(16.0).reshape(4, 4))
+
+    result = coarsen_to_grid(da, lasso_grid, LassoGrid(0, 0, 4, 4, 2, 2))
+    assert_array_equal(result["x"], [1, 3])
+    assert_array_equal(result["y"], [3, 1])
+    assert_array_equal(result, [[10, 18], [42, 50]])
+
+    result = coarsen_to_grid(da, lasso_grid, LassoGrid(1, 0, 3, 2, 2, 2), how="mean")
+    assert_array_equal(result, [[11.5]])
+
+    with pytest.raises(InvalidNestingError):
+        coarsen_to_grid(da, lasso_grid, LassoGrid(0, 0, 4, 4, 1.5, 1.5))
+    with pytest.raises(InvalidNestingError):
+        coarsen_to_grid(da, lasso_grid, LassoGrid(0, 0, 6, 4, 2, 2))
+
+
 @pytest.mark.unittest
 def test_area_to_grid3d(area_tuple):
     nan = np.nan
@@ -81,6 +146,40 @@ def test_area_to_grid3d(area_tuple):
     assert_array_equal(grid, expected_grid)
 
 
+@pytest.mark.unittest
+def test_area_to_grid3d_float32():
+    # Small areas added to a large area in float32 are lost without float64 accumulation
+    nentries = 1001
+    area = PolygonGridArea(
+        np.array([0]),
+        np.array([nentries]),
+        np.zeros(nentries, dtype=np.int64),
+        np.array([1e4] + [1e-4] * (nentries - 1)),
+    )
+    grid = area_to_grid3d(area, np.zeros((2, 2, 1), dtype="float32"))
+    assert grid.dtype == np.float32
+    assert_allclose(grid[0, 0, 0], 1e4 + 0.1, rtol=1e-7)
+
+
+@pytest.mark.unittest
+def test_area_to_grid3d_compact(bgt_gdf, lasso_grid):
+    area = polygon_area_in_grid(bgt_gdf, lasso_grid.dataarray(), engine="clip")
+    compact = area.compact()
+    assert compact.cell_idx.dtype == np.int32
+    assert compact.polygon.dtype == np.int32
+    assert compact.area.dtype == np.float32
+
+    grid = np.zeros((4, 4, len(bgt_gdf)))
+    expected = area_to_grid3d(area, grid.copy())
+    result = area_to_grid3d(compact, grid.copy())
+    assert_allclose(result, expected, rtol=1e-6, atol=1e-7)
+
+    flux = np.arange(len(compact.polygon), dtype=float)
+    expected = flux_to_grid(flux, area, np.full((4, 4), np.nan))
+    result = flux_to_grid(flux, compact, np.full((4, 4), np.nan))
+    assert_allclose(result, expected, rtol=1e-6)
+
+
 @pytest.mark.unittest
 def test_weighted_average():
     values = np.array([1, 2])
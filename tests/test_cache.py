@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from lusos.geometry import ops
+from lusos.geometry.cache import TriangulationCache, geometry_hash
+
+
+@pytest.mark.unittest
+def test_geometry_hash(bgt_gdf):
+    assert geometry_hash(bgt_gdf) == geometry_hash(bgt_gdf.geometry.values)
+    assert geometry_hash(bgt_gdf) != geometry_hash(bgt_gdf.iloc[:-1])
+    assert geometry_hash(bgt_gdf) != geometry_hash(bgt_gdf.translate(1))
+
+
+@pytest.mark.unittest
+def test_triangulate_cached(bgt_gdf, tmp_path):
+    cache = TriangulationCache(tmp_path)
+    tri = ops.triangulate(bgt_gdf, cache=cache)
+    assert f"batch-{geometry_hash(bgt_gdf)}" in cache
+    assert cache.info().nentries == 1
+
+    cached = ops.triangulate(bgt_gdf, cache=cache)
+    assert isinstance(cached.coords, np.memmap)
+    assert not cached.coords.flags.writeable
+    for result, expected in zip(cached, tri):
+        assert_array_equal(result, expected)
+
+    ops.triangulate(bgt_gdf, engine="mapbox", cache=cache)
+    assert f"mapbox-{geometry_hash(bgt_gdf)}" in cache
+    assert cache.info().nentries == 2
+
+    cache.clear()
+    assert cache.info().nentries == 0
+
+
+@pytest.mark.unittest
+def test_cache_eviction(tmp_path):
+    cache = TriangulationCache(tmp_path, max_size=2000)
+    for key in ["a", "b", "c"]:
+        cache.save(key, data=np.zeros(100))
+        cache.load("a")  # Keep "a" as most recently used
+
+    info = cache.info()
+    assert info.nentries == 2
+    assert info.size <= 2000
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
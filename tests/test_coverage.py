@@ -1,9 +1,23 @@
+import geopandas as gpd
+import netCDF4
 import numpy as np
+import pandas as pd
 import pytest
 import xarray as xr
 from numpy.testing import assert_array_almost_equal, assert_array_equal
 
-from lusos import bgt_soilmap_coverage
+from lusos import (
+    bgt_soilmap_coverage,
+    bgt_soilmap_coverage_multiresolution,
+    bgt_soilmap_emissions,
+    update_bgt_soilmap_coverage,
+)
+from lusos import preprocessing as pr
+from lusos.area_statistics import calc_areal_percentage_in_cells
+from lusos.constants import MAIN_BGT_UNITS, MAIN_SOILMAP_UNITS
+from lusos.coverage import _coverage_tile_size, _prepare_bgt, _prepare_soilmap
+from lusos.lasso import LassoGrid
+from lusos.validation.exceptions import InvalidNestingError
 
 
 @pytest.mark.unittest
@@ -69,3 +83,276 @@ def test_bgt_soilmap_coverage(bgt_gdf, simple_soilmap, lasso_grid):
         + [0] * 11
     )
     assert_array_almost_equal(coverage[2, 1], expected_idx1)
+
+
+@pytest.mark.unittest
+def test_bgt_soilmap_coverage_multiresolution(bgt_gdf, simple_soilmap, lasso_grid):
+    simple_soilmap["soilunit_sequencenumber"] = 1  # Add for _prepare_soilmap
+    coarse_grid = LassoGrid(0, 0, 4, 4, 2, 2)
+    coarse, fine = bgt_soilmap_coverage_multiresolution(
+        bgt_gdf, simple_soilmap, [coarse_grid, lasso_grid]
+    )
+    assert coarse.sizes == {"y": 2, "x": 2, "layer": 36}
+    assert_array_almost_equal(
+        fine, bgt_soilmap_coverage(bgt_gdf, simple_soilmap, lasso_grid)
+    )
+    assert_array_almost_equal(
+        coarse, bgt_soilmap_coverage(bgt_gdf, simple_soilmap, coarse_grid)
+    )
+
+    with pytest.raises(InvalidNestingError):
+        shifted_grid = LassoGrid(0.5, 0, 4.5, 4, 2, 2)
+        bgt_soilmap_coverage_multiresolution(
+            bgt_gdf, simple_soilmap, [shifted_grid, lasso_grid]
+        )
+
+
+@pytest.mark.unittest
+def test_bgt_soilmap_emissions(bgt_gdf, simple_soilmap, lasso_grid):
+    simple_soilmap["soilunit_sequencenumber"] = 1
+    coverage = bgt_soilmap_coverage(bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid)
+
+    rng = np.random.default_rng(0)
+    ef = pd.DataFrame(
+        rng.uniform(0, 2, (36, 2)),
+        index=pd.Index(coverage["layer"].values[::-1], name="layer"),
+        columns=["co2_uit", "ch4_uit"],
+    )
+    result = bgt_soilmap_emissions(bgt_gdf, simple_soilmap, lasso_grid, ef)
+
+    assert isinstance(result, xr.Dataset)
+    assert list(result.data_vars) == ["co2_uit", "ch4_uit"]
+    for gas in ef.columns:
+        factors = xr.DataArray(ef[gas])
+        expected = (coverage * factors.sel(layer=coverage["layer"])).sum("layer")
+        assert_array_almost_equal(result[gas], expected)
+
+
+@pytest.mark.unittest
+def test_bgt_soilmap_coverage_to_file(bgt_gdf, simple_soilmap, lasso_grid, tmp_path):
+    simple_soilmap["soilunit_sequencenumber"] = 1
+    expected = bgt_soilmap_coverage(bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid)
+
+    out = tmp_path / "coverage.nc"
+    result = bgt_soilmap_coverage(
+        bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid, tile_size=2, out=out
+    )
+    assert_array_almost_equal(result, expected)
+    assert_array_equal(result["layer"], expected["layer"])
+
+    # Resume an interrupted run where the last tile was not written
+    with netCDF4.Dataset(out, "a") as nc:
+        nc["tile_done"][1, 1] = 0
+        nc["coverage"][2:, 2:, :] = np.nan
+    result = bgt_soilmap_coverage(
+        bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid, tile_size=2, out=out
+    )
+    assert_array_almost_equal(result, expected)
+
+    # Resume with the tile size stored in the file
+    result = bgt_soilmap_coverage(
+        bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid, out=out
+    )
+    assert_array_almost_equal(result, expected)
+
+    with pytest.raises(ValueError, match="does not match the grid and tile size"):
+        bgt_soilmap_coverage(
+            bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid, tile_size=4, out=out
+        )
+
+    shifted_grid = LassoGrid(1, 0, 5, 4, 1, 1)
+    with pytest.raises(ValueError, match="does not match the grid coordinates"):
+        bgt_soilmap_coverage(
+            bgt_gdf.copy(), simple_soilmap.copy(), shifted_grid, tile_size=2, out=out
+        )
+
+    with pytest.raises(ValueError, match="does not match the engine 'clip'"):
+        bgt_soilmap_coverage(
+            bgt_gdf.copy(),
+            simple_soilmap.copy(),
+            lasso_grid,
+            engine="clip",
+            tile_size=2,
+            out=out,
+        )
+
+    with pytest.raises(ValueError, match="does not match the method 'exact'"):
+        bgt_soilmap_coverage(
+            bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid, out=out, method="exact"
+        )
+
+
+@pytest.mark.unittest
+def test_coverage_tile_size(bgt_gdf, simple_soilmap):
+    grid = LassoGrid(0, 0, 10_000, 10_000, 1, 1)
+    small = _coverage_tile_size(bgt_gdf, simple_soilmap, grid, memory_budget=10**6)
+    large = _coverage_tile_size(bgt_gdf, simple_soilmap, grid)
+    assert small < large
+
+    # The coverage of all combinations and the areal percentages fit in the budget
+    nlayers = 36 + 9 + 4
+    assert small**2 * nlayers * 8 <= 10**6
+    assert large**2 * nlayers * 8 <= 256 * 1024**2
+
+
+@pytest.mark.unittest
+def test_update_bgt_soilmap_coverage(bgt_gdf, simple_soilmap, lasso_grid, tmp_path):
+    simple_soilmap["soilunit_sequencenumber"] = 1
+    out = tmp_path / "coverage.nc"
+    bgt_soilmap_coverage(
+        bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid, tile_size=2, out=out
+    )
+    assert (tmp_path / "coverage.bgt.parquet").exists()
+
+    # Change the BGT unit of a polygon in the top right tile only
+    new_bgt = bgt_gdf.copy()
+    new_bgt.loc[11, ["layer", "bgt_type"]] = ["pand", ""]
+    expected = bgt_soilmap_coverage(new_bgt.copy(), simple_soilmap.copy(), lasso_grid)
+
+    with netCDF4.Dataset(out, "a") as nc:
+        nc["coverage"][:] = -1  # Tiles that are not recalculated keep this value
+
+    result = update_bgt_soilmap_coverage(
+        new_bgt.copy(), simple_soilmap.copy(), lasso_grid, out
+    )
+    assert_array_almost_equal(result[:2, 2:], expected[:2, 2:])
+    assert np.all(result[2:] == -1)
+    assert np.all(result[:, :2] == -1)
+
+    with pytest.raises(FileNotFoundError):
+        update_bgt_soilmap_coverage(
+            new_bgt, simple_soilmap, lasso_grid, tmp_path / "missing.nc"
+        )
+
+
+@pytest.mark.unittest
+def test_update_bgt_soilmap_coverage_exact(
+    bgt_gdf, simple_soilmap, lasso_grid, tmp_path
+):
+    simple_soilmap["soilunit_sequencenumber"] = 1
+    out = tmp_path / "coverage.nc"
+    bgt_soilmap_coverage(
+        bgt_gdf.copy(),
+        simple_soilmap.copy(),
+        lasso_grid,
+        engine="clip",
+        tile_size=2,
+        out=out,
+        method="exact",
+    )
+    with netCDF4.Dataset(out) as nc:
+        assert nc.engine == "clip"
+        assert nc.method == "exact"
+
+    new_bgt = bgt_gdf.copy()
+    new_bgt.loc[11, ["layer", "bgt_type"]] = ["pand", ""]
+    expected = bgt_soilmap_coverage(
+        new_bgt.copy(), simple_soilmap.copy(), lasso_grid, engine="clip", method="exact"
+    )
+
+    # The engine and method of the file are used by default
+    result = update_bgt_soilmap_coverage(
+        new_bgt.copy(), simple_soilmap.copy(), lasso_grid, out
+    )
+    assert_array_almost_equal(result, expected)
+
+    with pytest.raises(ValueError, match="got engine 'clip' and method 'product'"):
+        update_bgt_soilmap_coverage(
+            new_bgt.copy(), simple_soilmap.copy(), lasso_grid, out, method="product"
+        )
+
+
+@pytest.mark.unittest
+def test_bgt_soilmap_coverage_reopen(bgt_gdf, simple_soilmap, lasso_grid, tmp_path):
+    simple_soilmap["soilunit_sequencenumber"] = 1
+    out = tmp_path / "coverage.nc"
+
+    # The returned coverage does not keep the file open for resuming or updating
+    first = bgt_soilmap_coverage(
+        bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid, tile_size=2, out=out
+    )
+    resumed = bgt_soilmap_coverage(
+        bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid, tile_size=2, out=out
+    )
+    updated = update_bgt_soilmap_coverage(
+        bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid, out
+    )
+    assert_array_equal(resumed, first)
+    assert_array_equal(updated, first)
+
+
+@pytest.mark.unittest
+def test_update_bgt_soilmap_coverage_duplicates(
+    bgt_gdf, simple_soilmap, lasso_grid, tmp_path
+):
+    simple_soilmap["soilunit_sequencenumber"] = 1
+    out = tmp_path / "coverage.nc"
+
+    # Remove one of two identical objects in the top right tile
+    duplicated = pd.concat([bgt_gdf, bgt_gdf.iloc[[11]]], ignore_index=True)
+    bgt_soilmap_coverage(
+        duplicated, simple_soilmap.copy(), lasso_grid, tile_size=2, out=out
+    )
+    expected = bgt_soilmap_coverage(bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid)
+
+    with netCDF4.Dataset(out, "a") as nc:
+        nc["coverage"][:] = -1  # Tiles that are not recalculated keep this value
+
+    result = update_bgt_soilmap_coverage(
+        bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid, out
+    )
+    assert_array_almost_equal(result[:2, 2:], expected[:2, 2:])
+    assert np.all(result[2:] == -1)
+    assert np.all(result[:, :2] == -1)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize("engine", ["xugrid", "clip"])
+def test_bgt_soilmap_coverage_exact(bgt_gdf, simple_soilmap, lasso_grid, engine):
+    simple_soilmap["soilunit_sequencenumber"] = 1
+    result = bgt_soilmap_coverage(
+        bgt_gdf.copy(), simple_soilmap.copy(), lasso_grid, engine=engine, method="exact"
+    )
+
+    bgt = _prepare_bgt(bgt_gdf.copy(), MAIN_BGT_UNITS)
+    soilmap = _prepare_soilmap(simple_soilmap.copy(), MAIN_SOILMAP_UNITS)
+    overlay = gpd.overlay(
+        bgt[["idx", "geometry"]], soilmap[["idx", "geometry"]], keep_geom_type=True
+    )
+    overlay["idx"] = overlay["idx_2"] * len(MAIN_BGT_UNITS) + overlay["idx_1"]
+    expected = calc_areal_percentage_in_cells(overlay, lasso_grid, result["layer"])
+
+    assert result.dims == ("y", "x", "layer")
+    assert_array_equal(result["layer"], expected["layer"])
+    assert_array_almost_equal(result, expected)
+
+    with pytest.raises(ValueError, match="Unknown coverage method"):
+        bgt_soilmap_coverage(bgt_gdf, simple_soilmap, lasso_grid, method="overlay")
+
+
+@pytest.mark.unittest
+def test_prepare_soilmap(simple_soilmap):
+    simple_soilmap["maparea_id"] = [3, 3, 1, 1, 2, 2, 2, 4, 4, 5, 5, 6, 6, 7]
+    simple_soilmap["soilunit_sequencenumber"] = [
+        2,
+        1,
+        1,
+        2,
+        3,
+        1,
+        2,
+        1,
+        2,
+        2,
+        1,
+        1,
+        2,
+        1,
+    ]
+    result = _prepare_soilmap(simple_soilmap.copy(), MAIN_SOILMAP_UNITS)
+
+    expected = pr.group_soilmap_units(simple_soilmap.copy(), MAIN_SOILMAP_UNITS)
+    expected = expected.sort_values(by=["maparea_id", "soilunit_sequencenumber"])
+    expected = expected.drop_duplicates(subset="maparea_id")
+    assert_array_equal(result.index, expected.index)
+    assert_array_equal(result["idx"], expected["idx"])
@@ -1,13 +1,20 @@
 import numpy as np
 import pytest
+import xarray as xr
 from numpy.testing import assert_array_almost_equal
 
-from lusos import calculate_somers_emissions
+from lusos import (
+    calculate_somers_emissions,
+    calculate_somers_emissions_multiresolution,
+)
+from lusos.lasso import LassoGrid
 
 
 @pytest.mark.unittest
 def test_calculate_emissions(somers_parcels, lasso_grid):
+    columns = list(somers_parcels.columns)
     flux = calculate_somers_emissions(somers_parcels, lasso_grid)
+    assert list(somers_parcels.columns) == columns
     nan = np.nan
     expected_flux = [
         [0.15130456, 0.25254545, 0.27000692, 0.225],
@@ -16,3 +23,31 @@ def test_calculate_emissions(somers_parcels, lasso_grid):
         [0.48014338, 0.7, 0.358, 0.42597532],
     ]
     assert_array_almost_equal(flux, expected_flux)
+
+
+@pytest.mark.unittest
+def test_calculate_emissions_multiple_columns(somers_parcels, lasso_grid):
+    somers_parcels["p90"] = somers_parcels["median"] * 2
+    columns = list(somers_parcels.columns)
+    flux = calculate_somers_emissions(
+        somers_parcels, lasso_grid, columns=["median", "p90"]
+    )
+    assert list(somers_parcels.columns) == columns
+    expected = calculate_somers_emissions(somers_parcels.copy(), lasso_grid)
+
+    assert isinstance(flux, xr.Dataset)
+    assert list(flux.data_vars) == ["median", "p90"]
+    assert_array_almost_equal(flux["median"], expected)
+    assert_array_almost_equal(flux["p90"], expected * 2)
+
+
+@pytest.mark.unittest
+def test_calculate_emissions_multiresolution(somers_parcels, lasso_grid):
+    coarse_grid = LassoGrid(0, 0, 4, 4, 2, 2)
+    fine, coarse = calculate_somers_emissions_multiresolution(
+        somers_parcels.copy(), [lasso_grid, coarse_grid]
+    )
+    expected_fine = calculate_somers_emissions(somers_parcels.copy(), lasso_grid)
+    expected_coarse = calculate_somers_emissions(somers_parcels.copy(), coarse_grid)
+    assert_array_almost_equal(fine, expected_fine)
+    assert_array_almost_equal(coarse, expected_coarse)
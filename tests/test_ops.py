@@ -1,10 +1,13 @@
 import geopandas as gpd
 import numpy as np
+import pandas as pd
 import pytest
+import shapely
 from numpy.testing import assert_array_almost_equal, assert_array_equal
 from shapely.geometry import box
 
 from lusos.geometry import ops
+from lusos.lasso import LassoGrid
 
 
 @pytest.fixture
@@ -15,6 +18,66 @@ def polygon_gdf():
     return gpd.GeoDataFrame(geometry=[inner, outer])
 
 
+@pytest.mark.unittest
+def test_simplify_for_grid(lasso_grid):
+    circles = shapely.buffer(
+        shapely.points([[0.5, 0.5], [2.5, 2.5]]), 0.4, quad_segs=64
+    )
+    polygons = gpd.GeoDataFrame(geometry=circles, crs=28992)
+
+    result = ops.simplify_for_grid(polygons, lasso_grid, fraction=0.01)
+    assert isinstance(result.polygons, gpd.GeoDataFrame)
+    assert result.polygons.crs == 28992
+    assert np.all(shapely.is_valid(result.polygons.geometry))
+    assert np.all(
+        shapely.get_num_coordinates(result.polygons.geometry)
+        < shapely.get_num_coordinates(circles)
+    )
+    assert result.max_area_error == result.area_error.max()
+    assert np.isclose(result.total_area_error, result.area_error.sum())
+    assert 0 < result.max_area_error < shapely.length(circles).max() * 0.01
+
+    result = ops.simplify_for_grid(circles, lasso_grid, fraction=0)
+    assert result.total_area_error == 0
+
+    with pytest.raises(ValueError, match="fraction must be 0 or larger"):
+        ops.simplify_for_grid(circles, lasso_grid, fraction=-1)
+
+
+@pytest.mark.unittest
+def test_simplify_for_grid_adjacent(lasso_grid):
+    x = np.linspace(0, 4, 201)
+    shared = np.column_stack([x, 2 + 0.02 * np.sin(40 * x)])
+    lower = shapely.Polygon([(0, 0), (4, 0), *shared[::-1]])
+    upper = shapely.Polygon([*shared, (4, 4), (0, 4)])
+    polygons = np.array([lower, upper])
+
+    result = ops.simplify_for_grid(polygons, lasso_grid, fraction=0.04)
+    assert np.all(shapely.get_num_coordinates(result.polygons) < 205)
+    assert np.isclose(shapely.area(result.polygons).sum(), 16)
+    assert np.isclose(shapely.area(shapely.union_all(result.polygons)), 16)
+
+    result = ops.simplify_for_grid(polygons, lasso_grid, 0.04, coverage=False)
+    assert not np.isclose(shapely.area(result.polygons).sum(), 16)
+
+    result = ops.simplify_for_grid(np.array([lower, None]), lasso_grid, 0.04)
+    assert result.polygons[1] is None
+
+
+@pytest.mark.unittest
+def test_explode_polygons(polygon_gdf):
+    multi = shapely.MultiPolygon([box(1, 1, 2, 2), box(3, 3, 4, 4)])
+    polygons = gpd.GeoDataFrame(
+        {"idx": [5, 7]}, geometry=[polygon_gdf.geometry[0], multi]
+    )
+
+    parts, parent = ops.explode_polygons(polygons)
+    expected = polygons.explode()
+    assert_array_equal(parent, [0, 1, 1])
+    assert_array_equal(polygons["idx"].values[parent], expected["idx"])
+    assert np.all(shapely.equals(parts, expected.geometry.values))
+
+
 @pytest.mark.unittest
 def test_triangulate(polygon_gdf):
     tri = ops.triangulate(polygon_gdf)
@@ -57,6 +120,72 @@ def test_triangulate(polygon_gdf):
     )
 
 
+@pytest.mark.unittest
+def test_triangles_compact(bgt_gdf):
+    # Polygons at the far end of a national grid to test the worst case precision.
+    grid = LassoGrid(0, 300_000, 280_000, 625_000, 25, 25)
+    polygons = bgt_gdf.translate(grid.xmax - 4, grid.ymax - 4)
+    tri = ops.triangulate(polygons)
+
+    compact = tri.compact(grid)
+    assert compact.triangles.dtype == np.int32
+    assert compact.index.dtype == np.int32
+    assert compact.coords.dtype == np.float32
+
+    expanded = compact.expand()
+    assert_array_equal(expanded.triangles, tri.triangles)
+    assert np.abs(expanded.coords - tri.coords).max() < 0.02
+
+    area = shapely.area(shapely.polygons(tri.coords[tri.triangles]))
+    expanded_area = shapely.area(shapely.polygons(expanded.coords[tri.triangles]))
+    assert np.isclose(expanded_area.sum(), area.sum(), rtol=1e-3)
+
+
+@pytest.mark.unittest
+def test_triangulate_engines_equal(polygon_gdf, bgt_gdf):
+    for polygons in [polygon_gdf, bgt_gdf]:
+        batch = ops.triangulate(polygons, engine="batch")
+        mapbox = ops.triangulate(polygons, engine="mapbox")
+        assert_array_equal(batch.triangles, mapbox.triangles)
+        assert_array_equal(batch.index, mapbox.index)
+        assert_array_equal(batch.coords, mapbox.coords)
+
+    with pytest.raises(ValueError, match="Unknown triangulation engine"):
+        ops.triangulate(polygon_gdf, engine="invalid")
+
+
+@pytest.mark.unittest
+def test_triangulate_parallel(bgt_gdf):
+    serial = ops.triangulate(bgt_gdf)
+    parallel = ops.triangulate(bgt_gdf, n_workers=4)
+    assert_array_equal(parallel.triangles, serial.triangles)
+    assert_array_equal(parallel.index, serial.index)
+    assert_array_equal(parallel.coords, serial.coords)
+
+
+@pytest.mark.unittest
+def test_partition_work():
+    bounds = ops._partition_work(np.array([5, 1, 1, 1, 1, 1, 5]), 3)
+    assert_array_equal(bounds, [0, 1, 6, 7])
+
+    bounds = ops._partition_work(np.ones(2), 4)
+    assert_array_equal(bounds, [0, 1, 2])
+
+    with pytest.raises(ValueError, match="n_workers must be"):
+        ops._partition_work(np.ones(2), 0)
+
+
+@pytest.mark.unittest
+def test_triangulate_multipolygon(polygon_gdf):
+    multipolygon = gpd.GeoDataFrame(
+        geometry=[shapely.multipolygons(polygon_gdf.geometry)]
+    )
+    tri = ops.triangulate(multipolygon)
+    assert_array_equal(tri.index, np.zeros(10))
+    area = shapely.area(shapely.polygons(tri.coords[tri.triangles]))
+    assert np.isclose(area.sum(), 1)
+
+
 @pytest.mark.unittest
 def test_polygon_area_in_grid(polygon_gdf, lasso_grid):
     area = ops.polygon_area_in_grid(polygon_gdf, lasso_grid.dataarray())
@@ -69,6 +198,144 @@ def test_polygon_area_in_grid(polygon_gdf, lasso_grid):
     assert np.isclose(area.area.sum(), 1)
 
 
+@pytest.mark.unittest
+def test_polygon_area_in_grid_clip(polygon_gdf, bgt_gdf, lasso_grid):
+    grid = lasso_grid.dataarray()
+    area = ops.polygon_area_in_grid(polygon_gdf, grid, engine="clip")
+    assert_array_equal(area.cell_idx, [12])
+    assert_array_equal(area.nitems, [2])
+    assert_array_equal(area.polygon, [0, 1])
+    assert_array_almost_equal(area.area, [0.16, 0.84])
+
+    def per_cell_polygon(area):
+        cells = np.repeat(area.cell_idx, area.nitems)
+        key = cells * len(bgt_gdf) + area.polygon
+        return np.bincount(key, area.area, minlength=grid.size * len(bgt_gdf))
+
+    xugrid_area = ops.polygon_area_in_grid(bgt_gdf, grid)
+    clip_area = ops.polygon_area_in_grid(bgt_gdf, grid, n_workers=3, engine="clip")
+    assert_array_almost_equal(
+        per_cell_polygon(clip_area), per_cell_polygon(xugrid_area)
+    )
+
+    with pytest.raises(ValueError, match="Unknown overlap engine"):
+        ops.polygon_area_in_grid(polygon_gdf, grid, engine="invalid")
+
+
+@pytest.mark.unittest
+def test_polygon_area_in_grid_structured(polygon_gdf, bgt_gdf, lasso_grid):
+    grid = lasso_grid.dataarray()
+    area = ops.polygon_area_in_grid(polygon_gdf, grid, engine="structured")
+    assert_array_equal(area.cell_idx, [12])
+    assert_array_equal(area.nitems, [10])
+    assert_array_almost_equal(
+        np.sort(area.area), [0.06, 0.06, 0.06, 0.06, 0.08, 0.08, 0.15, 0.15, 0.15, 0.15]
+    )
+
+    xugrid_area = ops.polygon_area_in_grid(bgt_gdf, grid)
+    structured_area = ops.polygon_area_in_grid(
+        bgt_gdf, grid, n_workers=2, engine="structured"
+    )
+    assert_array_equal(structured_area.cell_idx, xugrid_area.cell_idx)
+    assert_array_equal(structured_area.nitems, xugrid_area.nitems)
+    for cell, n in zip(xugrid_area.nitems.cumsum(), xugrid_area.nitems):
+        expected = xugrid_area.area[cell - n : cell]
+        result = structured_area.area[cell - n : cell]
+        assert_array_almost_equal(np.sort(result), np.sort(expected))
+
+
+@pytest.mark.unittest
+def test_polygon_area_in_grid_fast_path(polygon_gdf, bgt_gdf, lasso_grid):
+    grid = lasso_grid.dataarray()
+    area = ops.polygon_area_in_grid(polygon_gdf, grid, fast_path=True)
+    assert_array_equal(area.cell_idx, [12])
+    assert_array_equal(area.nitems, [2])
+    assert_array_equal(area.polygon, [0, 1])
+    assert_array_almost_equal(area.area, [0.16, 0.84])
+
+    small = gpd.GeoDataFrame(
+        geometry=[box(0.1, 0.1, 0.2, 0.2), box(3.5, 3.5, 3.8, 3.9)], crs=28992
+    )
+    polygons = pd.concat([bgt_gdf, small], ignore_index=True)
+    expected = ops.polygon_area_in_grid(polygons, grid, engine="clip")
+    for engine in ["xugrid", "clip"]:
+        result = ops.polygon_area_in_grid(polygons, grid, engine=engine, fast_path=True)
+        assert_array_equal(result.cell_idx, expected.cell_idx)
+        assert np.isclose(result.area.sum(), expected.area.sum())
+        cells = np.repeat(result.cell_idx, result.nitems)
+        assert_array_equal(cells[result.polygon >= 14], [3, 12])
+        assert_array_almost_equal(result.area[result.polygon >= 14], [0.12, 0.01])
+
+        # Compare the total area of each polygon in each cell
+        npolygons = len(polygons)
+        expected_cells = np.repeat(expected.cell_idx, expected.nitems)
+        assert_array_almost_equal(
+            np.bincount(
+                cells * npolygons + result.polygon, result.area, 16 * npolygons
+            ),
+            np.bincount(
+                expected_cells * npolygons + expected.polygon,
+                expected.area,
+                16 * npolygons,
+            ),
+        )
+
+
+@pytest.mark.unittest
+def test_polygon_area_in_grid_hybrid_overlapping():
+    polygons = gpd.GeoDataFrame(
+        geometry=[box(10, 10, 240, 240), box(10, 10, 240, 240), box(60, 60, 110, 110)]
+    )
+    grid = LassoGrid(0, 0, 250, 250, 25, 25).dataarray()
+
+    expected = ops.polygon_area_in_grid(polygons, grid, engine="clip")
+    result = ops.polygon_area_in_grid(polygons, grid, engine="hybrid")
+    assert np.isclose(result.area.sum(), 2 * 230**2 + 50**2)
+    assert_array_equal(result.cell_idx, expected.cell_idx)
+    assert_array_equal(result.nitems, expected.nitems)
+    assert_array_equal(result.polygon, expected.polygon)
+    assert_array_almost_equal(result.area, expected.area)
+
+
+@pytest.mark.unittest
+def test_polygon_area_in_grid_hybrid():
+    center = shapely.points(50.3, 49.6)
+    ring = shapely.difference(shapely.buffer(center, 30), shapely.buffer(center, 10))
+    polygons = gpd.GeoDataFrame(
+        geometry=[
+            ring,
+            shapely.buffer(center, 10),
+            box(0, 0, 12.5, 100).difference(box(2.2, 20.5, 8.7, 30.1)),
+        ]
+    )
+    grid = LassoGrid(0, 0, 100, 100, 1, 1).dataarray()
+
+    expected = ops.polygon_area_in_grid(polygons, grid, engine="clip")
+    result = ops.polygon_area_in_grid(polygons, grid, n_workers=2, engine="hybrid")
+    assert_array_equal(result.cell_idx, expected.cell_idx)
+    assert_array_equal(result.nitems, expected.nitems)
+    assert_array_equal(result.polygon, expected.polygon)
+    assert_array_almost_equal(result.area, expected.area)
+
+
+@pytest.mark.unittest
+def test_iter_polygon_area_in_grid(bgt_gdf, lasso_grid):
+    grid = lasso_grid.dataarray()
+    tiles = list(ops.iter_polygon_area_in_grid(bgt_gdf, grid, tile_size=2))
+    assert len(tiles) == 4
+    assert_array_equal(tiles[1].cell_idx, [2, 3, 6, 7])
+
+    expected = ops.polygon_area_in_grid(bgt_gdf, grid, engine="clip")
+    result = ops.polygon_area_in_grid(bgt_gdf, grid, engine="clip", memory_budget=1e4)
+    assert_array_equal(result.cell_idx, expected.cell_idx)
+    assert_array_equal(result.nitems, expected.nitems)
+    assert_array_equal(result.polygon, expected.polygon)
+    assert_array_almost_equal(result.area, expected.area)
+
+    with pytest.raises(ValueError, match="tile_size must be larger than 0"):
+        next(ops.iter_polygon_area_in_grid(bgt_gdf, grid, tile_size=0))
+
+
 @pytest.mark.unittest
 def test_triangles_to_geodataframe(polygon_gdf):
     tri = ops.triangulate(polygon_gdf)
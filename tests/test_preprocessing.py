@@ -1,8 +1,10 @@
 import pandas as pd
 import pytest
+from geopandas.testing import assert_geodataframe_equal
 from numpy.testing import assert_array_equal
 
 from lusos import preprocessing as pr
+from lusos.constants import MAIN_BGT_UNITS
 
 
 @pytest.mark.unittest
@@ -53,3 +55,69 @@ def test_group_bgt_units(bgt_gdf):
         "overig",
     ]
     assert_array_equal(bgt_gdf["layer"], expected_groups)
+
+
+@pytest.mark.unittest
+def test_group_bgt_units_idx(bgt_gdf):
+    bgt_gdf.loc[0, "bgt_type"] = "unknown"
+    bgt_gdf.loc[1, "bgt_type"] = None
+    bgt_gdf = pr.group_bgt_units(bgt_gdf, MAIN_BGT_UNITS)
+
+    assert bgt_gdf["layer"].iloc[0] == "begroeidterreindeel"
+    assert bgt_gdf["layer"].iloc[1] == "onbegroeidterreindeel"
+    assert bgt_gdf["idx"].dtype == "int64"
+    assert_array_equal(bgt_gdf["idx"], [-1, -1, 2, 3, 6, 4, 0, 1, 6, 2, 0, 8, 1, 8])
+    pd.testing.assert_frame_equal(
+        pr.group_bgt_units(bgt_gdf.copy(), MAIN_BGT_UNITS), bgt_gdf
+    )
+
+
+@pytest.mark.unittest
+def test_group_soilmap_units_idx(simple_soilmap):
+    simple_soilmap.loc[0, "soilunit_code"] = None
+    result = pr.group_soilmap_units(simple_soilmap, ["peat", "moerig", "buried"])
+    assert len(result) == 12
+    assert result["idx"].dtype == "int64"
+    assert_array_equal(result["idx"], [0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2])
+
+
+@pytest.mark.unittest
+def test_combine_bgt_layers(bgt_gdf, tmp_path, capsys):
+    bgt_gpkg = tmp_path / "bgt.gpkg"
+    layers = {}
+    for layer, gdf in bgt_gdf.groupby("layer", sort=False):
+        column = "bgt_functie" if layer == "pand" else "bgt_type"
+        gdf = gdf.rename(columns={"bgt_type": column})
+        gdf[[column, "geometry"]].to_file(bgt_gpkg, layer=f"{layer}_polygon")
+        layers[f"{layer}_polygon"] = column
+
+    result = pr.bgt.combine_bgt_layers(bgt_gpkg, layers, n_workers=-1)
+    output = capsys.readouterr().out.splitlines()
+    assert sorted(output) == sorted(f"Read layer: {layer}" for layer in layers)
+    expected = pd.concat([gdf for _, gdf in bgt_gdf.groupby("layer", sort=False)])
+
+    assert len(result) == 14
+    assert result.crs == bgt_gdf.crs
+    assert isinstance(result["layer"].dtype, pd.CategoricalDtype)
+    assert isinstance(result["bgt_type"].dtype, pd.CategoricalDtype)
+    assert_array_equal(result["layer"].astype(object), expected["layer"])
+    assert_array_equal(result["bgt_type"].astype(object), expected["bgt_type"])
+
+    grouped = pr.group_bgt_units(result, MAIN_BGT_UNITS)
+    expected = pr.group_bgt_units(expected, MAIN_BGT_UNITS)
+    assert_array_equal(grouped["idx"], expected["idx"])
+
+    # Reading the layers concurrently gives the same order and categories
+    sequential = pr.bgt.combine_bgt_layers(bgt_gpkg, layers, n_workers=1)
+    for n_workers in [None, 2, 3]:
+        concurrent = pr.bgt.combine_bgt_layers(bgt_gpkg, layers, n_workers=n_workers)
+        assert_geodataframe_equal(concurrent, sequential)
+        for column in ["layer", "bgt_type"]:
+            assert_array_equal(
+                concurrent[column].cat.categories, sequential[column].cat.categories
+            )
+
+    with pytest.raises(ValueError, match="n_workers"):
+        pr.bgt.combine_bgt_layers(bgt_gpkg, layers, n_workers=0)
+    with pytest.raises(ValueError, match="No layers"):
+        pr.bgt.combine_bgt_layers(bgt_gpkg, {})
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+
+from lusos.area_statistics import calc_areal_percentage_in_cells
+from lusos.geometry import ops
+from lusos.geometry.cache import polygon_fingerprints
+from lusos.geometry.session import OverlapSession, active_session
+
+
+def sorted_entries(area):
+    cells = np.repeat(area.cell_idx, area.nitems)
+    order = np.lexsort((area.area, area.polygon, cells))
+    return cells[order], area.polygon[order], area.area[order]
+
+
+@pytest.mark.unittest
+def test_polygon_fingerprints(bgt_gdf):
+    fingerprints = polygon_fingerprints(bgt_gdf)
+    assert fingerprints.dtype == "S16"
+    assert len(np.unique(fingerprints)) == len(bgt_gdf)
+    assert_array_equal(polygon_fingerprints(bgt_gdf.iloc[::-1]), fingerprints[::-1])
+    assert not np.any(polygon_fingerprints(bgt_gdf.translate(1e-6)) == fingerprints)
+    assert len(polygon_fingerprints(bgt_gdf.iloc[:0])) == 0
+
+    # The extra value is hashed together with the geometry
+    codes = np.arange(len(bgt_gdf)) % 2
+    with_codes = polygon_fingerprints(bgt_gdf, extra=codes)
+    assert_array_equal(polygon_fingerprints(bgt_gdf, extra=codes), with_codes)
+    assert not np.any(polygon_fingerprints(bgt_gdf, extra=1 - codes) == with_codes)
+    assert not np.any(with_codes == fingerprints)
+
+
+@pytest.mark.unittest
+def test_overlap_session(bgt_gdf, lasso_grid):
+    grid = lasso_grid.dataarray()
+    expected = ops.polygon_area_in_grid(bgt_gdf, grid, engine="clip")
+
+    assert active_session() is None
+    with OverlapSession() as session:
+        assert active_session() is session
+        first = ops.polygon_area_in_grid(bgt_gdf.iloc[:10], grid, engine="clip")
+        result = ops.polygon_area_in_grid(bgt_gdf, grid, engine="clip")
+    assert active_session() is None
+
+    info = session.info()
+    assert info.nkeys == 1
+    assert info.npolygons == 14
+    assert info.hits == 10
+    assert info.misses == 14
+
+    subset = ops.polygon_area_in_grid(bgt_gdf.iloc[:10], grid, engine="clip")
+    for res, exp in zip(sorted_entries(first), sorted_entries(subset)):
+        assert_array_almost_equal(res, exp)
+    for res, exp in zip(sorted_entries(result), sorted_entries(expected)):
+        assert_array_almost_equal(res, exp)
+
+    session.clear()
+    assert session.info() == (0, 0, 0, 0)
+
+
+@pytest.mark.unittest
+def test_overlap_session_lazy(bgt_gdf, lasso_grid):
+    bgt_gdf["idx"] = 0
+    with OverlapSession() as session:
+        lazy = calc_areal_percentage_in_cells(
+            bgt_gdf, lasso_grid, ["percelen"], engine="clip", tile_size=2, lazy=True
+        )
+
+    # Chunks computed in worker threads after the session is exited use the session
+    expected = lazy.compute()
+    info = session.info()
+    assert info.hits == 0
+    assert info.misses > 0
+
+    result = lazy.compute()
+    assert session.info().hits == info.misses
+    assert_array_almost_equal(result, expected)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+
+from lusos.sparse_grid import SparseLayerGrid
+
+
+@pytest.fixture
+def dense(lasso_grid):
+    values = np.zeros((4, 4, 3), dtype="float32")
+    values[..., 0] = 0.5
+    values[0, :, 1] = 0.5
+    values[1:, :, 2] = 0.25
+    return lasso_grid.empty_array(["a", "b", "c"], False).copy(data=values)
+
+
+@pytest.fixture
+def sparse_grid(dense, lasso_grid):
+    return SparseLayerGrid.from_dataarray(dense, lasso_grid)
+
+
+@pytest.mark.unittest
+def test_from_to_dataarray(sparse_grid, dense):
+    assert sparse_grid.shape == (4, 4, 3)
+    assert sparse_grid.matrix.nnz == 32
+    assert_array_equal(sparse_grid.to_dataarray(), dense)
+    assert_array_equal(sparse_grid.to_dataarray()["layer"], ["a", "b", "c"])
+
+
+@pytest.mark.unittest
+def test_from_coo(lasso_grid):
+    result = SparseLayerGrid.from_coo(
+        np.array([0, 0, 15]), np.array([1, 1, 0]), np.ones(3), lasso_grid, ["a", "b"]
+    )
+    assert result.matrix.nnz == 2
+    assert result.sel("b")[0, 0] == 2
+    assert result.sel("a")[3, 3] == 1
+
+    with pytest.raises(ValueError, match="does not match the grid and layers"):
+        SparseLayerGrid(result.matrix, lasso_grid, ["a", "b", "c"])
+
+
+@pytest.mark.unittest
+def test_reductions(sparse_grid, dense):
+    assert_array_almost_equal(sparse_grid.sum(), dense.sum(dim="layer"))
+    assert_array_almost_equal(sparse_grid.sel("c"), dense.sel(layer="c"))
+    assert_array_almost_equal((sparse_grid * 2).to_dataarray(), dense * 2)
+
+    factors = xr.DataArray([1.0, 2.0, 4.0], coords={"layer": ["a", "b", "c"]})
+    expected = (dense * factors).sum(dim="layer")
+    assert_array_almost_equal(sparse_grid.dot(factors), expected)
+    assert_array_almost_equal(sparse_grid.dot(factors.values), expected)
+
+    series = pd.Series([4.0, 1.0, 2.0], index=["c", "a", "b"])
+    assert_array_almost_equal(sparse_grid.dot(series), expected)
+    assert_array_almost_equal(
+        sparse_grid.multiply(series).to_dataarray(), dense * factors
+    )
+
+    with pytest.raises(ValueError, match="Expected a factor for each"):
+        sparse_grid.dot([1.0, 2.0])
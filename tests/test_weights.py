@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+from scipy import sparse
+
+from lusos.geometry.weights import OverlapWeights
+
+
+@pytest.fixture
+def weights(bgt_gdf, lasso_grid):
+    return OverlapWeights.from_polygons(bgt_gdf, lasso_grid.dataarray())
+
+
+@pytest.mark.unittest
+def test_from_polygons(weights, bgt_gdf):
+    assert weights.shape == (16, 14)
+    assert weights.grid.nx == 4
+    assert weights.grid.ny == 4
+    assert weights.matches(bgt_gdf)
+    assert not weights.matches(bgt_gdf.iloc[:-1])
+
+
+@pytest.mark.unittest
+def test_to_from_scipy(weights):
+    matrix = weights.to_scipy()
+    assert isinstance(matrix, sparse.csr_array)
+    assert matrix.shape == (16, 14)
+    assert np.isclose(matrix.sum(), weights.area.area.sum())
+
+    result = OverlapWeights.from_scipy(matrix, weights.grid)
+    assert_array_equal(result.area.cell_idx, weights.area.cell_idx)
+    assert (result.to_scipy() != matrix).nnz == 0
+
+    with pytest.raises(ValueError, match="does not match the number of grid cells"):
+        OverlapWeights.from_scipy(matrix[:4], weights.grid)
+
+
+@pytest.mark.unittest
+def test_apply(weights):
+    values = np.arange(14, dtype=float)
+    result = weights.apply(values)
+    assert result.shape == (4, 4)
+    assert_array_almost_equal(result.ravel(), weights.to_scipy() @ values)
+
+    result = weights.apply(np.ones(14), normalize=True)
+    assert_array_almost_equal(result, np.ones((4, 4)))
+
+    with pytest.raises(ValueError, match="Expected a value for each"):
+        weights.apply(np.ones(3))
+
+
+@pytest.mark.unittest
+def test_save_load(weights, tmp_path):
+    path = tmp_path / "weights.npz"
+    weights.save(path)
+    result = OverlapWeights.load(path)
+
+    assert result.grid == weights.grid
+    assert result.npolygons == weights.npolygons
+    assert result.geometry_hash == weights.geometry_hash
+    for loaded, expected in zip(result.area, weights.area):
+        assert_array_equal(loaded, expected)